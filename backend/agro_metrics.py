@@ -0,0 +1,141 @@
+import numpy as np
+
+# Per-crop thresholds: GDD base and cap temperature, daily max that counts as heat
+# stress, and typical daily water use (mm/day) for the rainfall deficit
+CROP_PARAMETERS = {
+    'wheat': {'base_temp_c': 0.0, 'cap_temp_c': 30.0, 'heat_stress_c': 32.0, 'water_need_mm': 4.5},
+    'corn': {'base_temp_c': 10.0, 'cap_temp_c': 30.0, 'heat_stress_c': 35.0, 'water_need_mm': 5.5},
+    'rice': {'base_temp_c': 10.0, 'cap_temp_c': 35.0, 'heat_stress_c': 35.0, 'water_need_mm': 7.0},
+    'soybean': {'base_temp_c': 10.0, 'cap_temp_c': 30.0, 'heat_stress_c': 35.0, 'water_need_mm': 5.0},
+    'tomato': {'base_temp_c': 10.0, 'cap_temp_c': 30.0, 'heat_stress_c': 32.0, 'water_need_mm': 5.0},
+    'potato': {'base_temp_c': 7.0, 'cap_temp_c': 30.0, 'heat_stress_c': 30.0, 'water_need_mm': 5.0},
+}
+DEFAULT_CROP_PARAMETERS = {'base_temp_c': 10.0, 'cap_temp_c': 30.0, 'heat_stress_c': 35.0, 'water_need_mm': 5.0}
+
+# Hours between 0 and 7.2 C count towards winter chill
+CHILL_RANGE_C = (0.0, 7.2)
+WET_DAY_MM = 1.0
+MIN_WET_SPELL_DAYS = 3
+DEFICIT_WINDOW_DAYS = 30
+
+# How strongly heat stress and the worst rainfall deficit reduce yield (see yield_adjustment)
+HEAT_STRESS_PENALTY = 0.5
+DROUGHT_PENALTY = 0.2
+YIELD_ADJUSTMENT_RANGE = (0.5, 1.0)
+
+
+def crop_parameters(crop_types):
+    """Look up CROP_PARAMETERS for an array of crop names; returns a dict of float arrays"""
+    crop_types = np.asarray(crop_types, dtype=str)
+    unique, inverse = np.unique(np.char.lower(crop_types), return_inverse=True)
+    rows = [CROP_PARAMETERS.get(name, DEFAULT_CROP_PARAMETERS) for name in unique.tolist()]
+    return {name: np.array([row[name] for row in rows])[inverse] for name in DEFAULT_CROP_PARAMETERS}
+
+
+def growing_degree_days(tmax, tmin, base_temp_c, cap_temp_c):
+    """Season GDD per row (method 2: both temperatures clamped to [base, cap] before averaging)"""
+    base = np.asarray(base_temp_c, dtype=np.float64)[:, None]
+    cap = np.asarray(cap_temp_c, dtype=np.float64)[:, None]
+    daily = (np.clip(tmax, base, cap) + np.clip(tmin, base, cap)) / 2 - base
+    return daily.sum(axis=1)
+
+
+def chill_hours(tmax, tmin, low=CHILL_RANGE_C[0], high=CHILL_RANGE_C[1]):
+    """Hours in [low, high] per row, assuming temperature follows a cosine between each day's min and max.
+
+    With T = mid - amp * cos(phase) the share of the day at or below x is
+    arccos((mid - x) / amp) / pi, so no hourly series is needed.
+    """
+    mid = (tmax + tmin) / 2
+    amp = np.maximum((tmax - tmin) / 2, 1e-6)
+
+    def share_below(x):
+        return np.arccos(np.clip((mid - x) / amp, -1.0, 1.0)) / np.pi
+
+    return (24.0 * (share_below(high) - share_below(low))).sum(axis=1)
+
+
+def rolling_sums(values, window):
+    """Sums over every `window`-day stretch of each row, from one cumulative sum"""
+    totals = np.zeros((values.shape[0], values.shape[1] + 1))
+    np.cumsum(values, axis=1, out=totals[:, 1:])
+    return totals[:, window:] - totals[:, :-window]
+
+
+def run_lengths(flags):
+    """For each day, how many consecutive flagged days end there (0 on unflagged days)"""
+    counts = np.cumsum(flags, axis=1)
+    # The count at the last unflagged day, carried forward, is subtracted to restart each run
+    reset = np.maximum.accumulate(np.where(flags, 0, counts), axis=1)
+    return counts - reset
+
+
+def compute_metrics(tmax, tmin, precip, crop_types, window_days=DEFICIT_WINDOW_DAYS, wet_day_mm=WET_DAY_MM,
+                    min_wet_spell_days=MIN_WET_SPELL_DAYS):
+    """
+    Agro-meteorological metrics for many (location, crop) rows at once.
+
+    Args:
+        tmax, tmin, precip: Daily series, shape (rows, days)
+        crop_types: Crop name per row, selects CROP_PARAMETERS
+        window_days: Length of the rolling rainfall deficit window
+        wet_day_mm: Precipitation that makes a day wet
+        min_wet_spell_days: Consecutive wet days that count as a wet spell
+
+    Returns:
+        dict of arrays with one value per row
+    """
+    tmax = np.asarray(tmax, dtype=np.float64)
+    tmin = np.asarray(tmin, dtype=np.float64)
+    precip = np.asarray(precip, dtype=np.float64)
+    params = crop_parameters(crop_types)
+    days = tmax.shape[1]
+    window = min(window_days, days)
+
+    # Worst and most recent shortfall of rain against crop water use over the rolling window
+    demand = params['water_need_mm'] * window
+    window_rain = rolling_sums(precip, window)
+    deficits = np.maximum(demand[:, None] - window_rain, 0.0)
+
+    wet = precip >= wet_day_mm
+    wet_runs = run_lengths(wet)
+    dry_runs = run_lengths(~wet)
+
+    metrics = {
+        'period_days': np.full(len(tmax), days),
+        'growing_degree_days': growing_degree_days(tmax, tmin, params['base_temp_c'], params['cap_temp_c']),
+        'heat_stress_days': (tmax >= params['heat_stress_c'][:, None]).sum(axis=1),
+        'chill_hours': chill_hours(tmax, tmin),
+        'total_precipitation_mm': precip.sum(axis=1),
+        'water_need_mm': params['water_need_mm'] * days,
+        'max_rainfall_deficit_mm': deficits.max(axis=1),
+        'latest_rainfall_deficit_mm': deficits[:, -1],
+        'deficit_window_days': np.full(len(tmax), window),
+        # A spell of length >= min_wet_spell_days passes through exactly min_wet_spell_days once
+        'wet_spells': (wet_runs == min_wet_spell_days).sum(axis=1),
+        'longest_wet_spell_days': wet_runs.max(axis=1),
+        'longest_dry_spell_days': dry_runs.max(axis=1),
+    }
+    metrics['yield_adjustment_factor'] = yield_adjustment(metrics['heat_stress_days'], days,
+                                                          metrics['max_rainfall_deficit_mm'], demand)
+    return metrics
+
+
+def yield_adjustment(heat_stress_days, period_days, max_rainfall_deficit_mm, window_demand_mm):
+    """Yield factor for heat stress and drought the season averages miss; 1.0 means no penalty"""
+    heat_share = np.asarray(heat_stress_days, dtype=np.float64) / np.maximum(period_days, 1)
+    drought_share = np.asarray(max_rainfall_deficit_mm, dtype=np.float64) / np.maximum(window_demand_mm, 1e-9)
+    return np.clip(1.0 - HEAT_STRESS_PENALTY * heat_share - DROUGHT_PENALTY * drought_share, *YIELD_ADJUSTMENT_RANGE)
+
+
+def metric_rows(metrics):
+    """Turn compute_metrics() output into one rounded dict per row"""
+    counts = ('period_days', 'heat_stress_days', 'deficit_window_days', 'wet_spells',
+              'longest_wet_spell_days', 'longest_dry_spell_days')
+    columns = {}
+    for name, values in metrics.items():
+        if name in counts:
+            columns[name] = np.asarray(values).astype(np.int64).tolist()
+        else:
+            columns[name] = np.round(values, 3 if name == 'yield_adjustment_factor' else 1).tolist()
+    return [dict(zip(columns, row)) for row in zip(*columns.values())]
@@ -1,31 +1,64 @@
 # Add this at the top of your app.py file before any other imports
 import os
+import time
+STARTUP_STARTED = time.perf_counter()
 # Suppress gRPC shutdown warnings
 os.environ['GRPC_ENABLE_FORK_SUPPORT'] = '0'
 os.environ['GRPC_POLL_STRATEGY'] = 'epoll1'
 
 import json
 import numpy as np
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
-import tensorflow as tf
-from PIL import Image
-import requests
 from dotenv import load_dotenv
 import traceback
 from pathlib import Path
 from datetime import datetime, timedelta
 import random
 import sys
+import threading
+import hashlib
+import io
+import zipfile
+import zlib
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from inference_batcher import MicroBatcher, BatcherOutput
+from caching import PredictionCache
+from image_preprocessing import IMG_SIZE, BatchBuffer, decode_image, prepare_encoded
+from tflite_serving import TFLiteServingModel, TFLITE_MODEL_FILES
+from inference_server import InferenceClient, RemoteModel, DEFAULT_SOCKET_PATH
+from weather_client import (OpenWeatherMapClient, CircuitBreaker, WeatherServiceError,
+                            WeatherUnavailableError, DEFAULT_BASE_URL as DEFAULT_WEATHER_BASE_URL)
+from weather_cache import WeatherCache, grid_cell
+from historical_weather import HistoricalWeatherStore, summary_rows
+from agro_metrics import DEFICIT_WINDOW_DAYS, WET_DAY_MM, MIN_WET_SPELL_DAYS, compute_metrics, metric_rows
+from yield_model import (IDEAL_MAX_TEMP_C, IDEAL_PRECIPITATION_MM, HIGH_YIELD_RATIO, LOW_YIELD_RATIO, STORAGE_FLAGS,
+                         predict_yields, simulate_yield)
 
-# Add these imports for the chatbot
-try:
-    from gemini_chatbot import chatbot as gemini_chatbot
-    from simple_chatbot import simple_chatbot
-    CHATBOT_ENABLED = True
-except ImportError as e:
-    print(f"Warning: Chatbot modules not available: {e}")
-    CHATBOT_ENABLED = False
+# Add these imports for the chatbot. The Gemini client itself is only
+# imported when the chatbot is first initialized.
+from simple_chatbot import simple_chatbot
+from gemini_chatbot import GENAI_AVAILABLE, get_chatbot, chatbot_status
+from knowledge_base import knowledge_base
+from treatment_plan import treatment_phases, expand_phases, phases_to_ical
+from response_encoding import OrjsonProvider, ResponseEncoder
+from chat_cache import SemanticChatCache
+from chat_orchestrator import ChatOrchestrator
+from chat_streaming import SSE_HEADERS, ChatStreamStats, sse_event, stream_answer
+CHATBOT_ENABLED = GENAI_AVAILABLE
+if not CHATBOT_ENABLED:
+    print("Warning: Chatbot modules not available: google-generativeai is not installed")
+
+# Seconds spent in each startup phase, logged and reported by /ready
+startup_timings = {'imports': time.perf_counter() - STARTUP_STARTED}
+startup_errors = {}
+
+# STARTUP_MODE=background loads TensorFlow, both models and the chatbot in
+# background threads as soon as the process starts; "lazy" (default) waits for
+# the first request that needs them, or the first call to /ready. Either way
+# /health answers immediately.
+STARTUP_MODE = os.environ.get('STARTUP_MODE', 'lazy').lower()
 
 # Load environment variables
 load_dotenv()
@@ -33,6 +66,20 @@ load_dotenv()
 app = Flask(__name__)
 CORS(app)
 
+# JSON is encoded with orjson. Text responses of at least
+# RESPONSE_COMPRESSION_MIN_BYTES are compressed with brotli (if installed) or
+# gzip, as the client accepts. Views marked @response_encoder.etag get a
+# strong ETag and answer a matching If-None-Match with 304 Not Modified.
+if os.environ.get('FAST_JSON', '1') == '1':
+    app.json = OrjsonProvider(app)
+response_encoder = ResponseEncoder(
+    min_bytes=int(os.environ.get('RESPONSE_COMPRESSION_MIN_BYTES', 500)),
+    gzip_level=int(os.environ.get('GZIP_LEVEL', 6)),
+    brotli_quality=int(os.environ.get('BROTLI_QUALITY', 5)),
+    compression_enabled=os.environ.get('RESPONSE_COMPRESSION', '1') == '1'
+)
+response_encoder.init_app(app)
+
 # Print startup message for debugging
 print("Starting Flask application...")
 print(f"Python version: {sys.version}")
@@ -50,11 +97,106 @@ def root():
     return jsonify({"status": "AgroIntel API is running"}), 200
 
 # Model paths
-CROP_MODEL_PATH = os.path.join(os.path.dirname(__file__), "models", "crop_health_model")
-SOIL_MODEL_PATH = os.path.join(os.path.dirname(__file__), "models", "soil_classification_model")
+CROP_MODEL_PATH = os.environ.get('CROP_MODEL_PATH', os.path.join(os.path.dirname(__file__), "models", "crop_health_model"))
+SOIL_MODEL_PATH = os.environ.get('SOIL_MODEL_PATH', os.path.join(os.path.dirname(__file__), "models", "soil_classification_model"))
+
+# Micro-batching settings: requests wait up to INFERENCE_MAX_WAIT_MS for others
+# to arrive so that concurrent uploads share one forward pass
+INFERENCE_MAX_BATCH_SIZE = int(os.environ.get('INFERENCE_MAX_BATCH_SIZE', 16))
+INFERENCE_MAX_WAIT_MS = float(os.environ.get('INFERENCE_MAX_WAIT_MS', 5))
+
+# Inference backend: "compiled" serves pre-traced graphs for a few fixed batch
+# sizes, "keras" uses Model.predict, "tflite-fp16" / "tflite-int8" run the
+# quantized models written by export_tflite.py
+INFERENCE_BACKEND = os.environ.get('INFERENCE_BACKEND', 'compiled').lower()
+TFLITE_NUM_THREADS = int(os.environ['TFLITE_NUM_THREADS']) if os.environ.get('TFLITE_NUM_THREADS') else None
+# Parsed when a model is loaded: TensorFlow is only imported by processes that serve models
+SERVING_BATCH_BUCKETS = os.environ.get('SERVING_BATCH_BUCKETS')
+SERVING_WARMUP_ROUNDS = int(os.environ.get('SERVING_WARMUP_ROUNDS', 1))
+
+# INFERENCE_INPUT=bytes hands the uploaded file itself to the model, which
+# decodes and resizes it inside the graph on TensorFlow's thread pool rather
+# than in Python under the GIL. Only the compiled backend supports it.
+INFERENCE_INPUT = os.environ.get('INFERENCE_INPUT', 'pixels').lower()
+if INFERENCE_INPUT == 'bytes' and INFERENCE_BACKEND != 'compiled':
+    print(f"INFERENCE_INPUT=bytes needs INFERENCE_BACKEND=compiled; decoding in Python for {INFERENCE_BACKEND}")
+    INFERENCE_INPUT = 'pixels'
+
+# INFERENCE_SERVER=1 moves the models into a fixed pool of replica processes
+# (inference_server.py) shared by all gunicorn workers. Workers hand decoded
+# images over through shared memory and never import TensorFlow themselves.
+INFERENCE_SERVER = os.environ.get('INFERENCE_SERVER', '0') == '1'
+INFERENCE_SERVER_SOCKET = os.environ.get('INFERENCE_SERVER_SOCKET', DEFAULT_SOCKET_PATH)
+INFERENCE_REPLICAS = int(os.environ.get('INFERENCE_REPLICAS', 1))
+INFERENCE_SERVER_TIMEOUT = float(os.environ.get('INFERENCE_SERVER_TIMEOUT', 60))
+inference_client = None
+
+# Both models put their heads on the same frozen ImageNet MobileNetV2. With
+# SHARED_BACKBONE on, they are served as one model that runs the backbone
+# once and returns [crop probabilities, soil probabilities].
+SHARED_BACKBONE = os.environ.get('SHARED_BACKBONE', '1') == '1'
+SHARED_OUTPUTS = {"crop": 0, "soil": 1}
+shared_model = None
+shared_batcher = None
+shared_backbone_status = "not loaded"
+
+# Predictions are cached by image hash + model version, so a re-uploaded photo
+# costs neither a decode nor a forward pass
+prediction_cache = PredictionCache(
+    max_entries=int(os.environ.get('PREDICTION_CACHE_MAX_ENTRIES', 10000)),
+    max_bytes=int(os.environ.get('PREDICTION_CACHE_MAX_MB', 16)) * 1024 * 1024,
+    ttl_seconds=float(os.environ.get('PREDICTION_CACHE_TTL', 3600)),
+    enabled=os.environ.get('PREDICTION_CACHE_ENABLED', '1') == '1'
+)
+model_versions = {}
+
+# OpenWeatherMap is called through one pooled client per worker. Every call
+# has a connect/read timeout and an overall deadline, transient failures are
+# retried with jittered backoff, and a circuit breaker fails fast (503) while
+# the upstream keeps failing. OPENWEATHERMAP_BASE_URL can point at a local
+# stand-in server for testing.
+weather_client = OpenWeatherMapClient(
+    api_key=os.environ.get('OPENWEATHERMAP_API_KEY', "0ed298208193505d5deb394d1ab181bd"),
+    base_url=os.environ.get('OPENWEATHERMAP_BASE_URL', DEFAULT_WEATHER_BASE_URL),
+    connect_timeout=float(os.environ.get('WEATHER_CONNECT_TIMEOUT', 3.05)),
+    read_timeout=float(os.environ.get('WEATHER_READ_TIMEOUT', 5)),
+    deadline=float(os.environ.get('WEATHER_DEADLINE', 8)),
+    max_retries=int(os.environ.get('WEATHER_MAX_RETRIES', 2)),
+    breaker=CircuitBreaker(
+        failure_threshold=int(os.environ.get('WEATHER_BREAKER_THRESHOLD', 5)),
+        reset_timeout=float(os.environ.get('WEATHER_BREAKER_COOLDOWN', 30))
+    )
+)
+
+# Weather is cached per geohash grid cell (precision 5 is about 5 x 5 km), so
+# nearby users share one upstream fetch. Current conditions and the forecast
+# expire separately; concurrent misses for a cell share one fetch.
+weather_cache = WeatherCache(
+    precision=int(os.environ.get('WEATHER_GRID_PRECISION', 5)),
+    current_ttl=float(os.environ.get('WEATHER_CURRENT_TTL', 600)),
+    forecast_ttl=float(os.environ.get('WEATHER_FORECAST_TTL', 1800)),
+    max_entries=int(os.environ.get('WEATHER_CACHE_MAX_ENTRIES', 20000)),
+    enabled=os.environ.get('WEATHER_CACHE_ENABLED', '1') == '1'
+)
+
+# Historical daily weather per grid cell, kept as memory-mapped arrays with
+# precomputed prefix sums (see historical_weather.py). Until a historical
+# weather API is wired in, each cell gets deterministic synthetic data.
+HISTORICAL_GRID_PRECISION = int(os.environ.get('HISTORICAL_GRID_PRECISION', 4))
+historical_store = HistoricalWeatherStore(
+    directory=os.environ.get('HISTORICAL_WEATHER_DIR', os.path.join(tempfile.gettempdir(), 'agrointel-historical-weather')),
+    start=datetime.strptime(os.environ.get('HISTORICAL_WEATHER_START', '2000-01-01'), "%Y-%m-%d").date()
+)
+
+# Guards lazy model loading now that requests are served from several threads
+model_load_lock = threading.Lock()
+# Set under model_load_lock, last, once a model, its batcher and its class files have all loaded.
+# /ready reads these without the lock, so it never waits behind a load in progress.
+models_loaded = {'crop': False, 'soil': False}
 
 # Check if model exists, if not, we'll load it on demand
 model = None
+crop_batcher = None
 class_indices = None
 health_categories = {
     "healthy": ["healthy"],
@@ -81,17 +223,140 @@ recommendations = {
     }
 }
 
+def create_predictor(keras_model, name):
+    """Build the batch inference function used to serve a loaded model"""
+    from model_serving import ServingModel, BytesServingModel, parse_batch_buckets
+    
+    if INFERENCE_BACKEND == 'keras':
+        return lambda batch: keras_model.predict(batch, verbose=0)
+    
+    if INFERENCE_INPUT == 'bytes':
+        serving_model = BytesServingModel(keras_model, name=name)
+        serving_model.warmup(SERVING_WARMUP_ROUNDS)
+        return serving_model.predict
+    
+    # Trace and warm up every batch-size bucket now so no user request pays for it
+    serving_model = ServingModel(keras_model, name=name, batch_buckets=parse_batch_buckets(SERVING_BATCH_BUCKETS))
+    serving_model.warmup(SERVING_WARMUP_ROUNDS)
+    return serving_model.predict
+
+def load_inference_model(model_path, name):
+    """Load a model for the configured backend and return (model, batch predict function)"""
+    if INFERENCE_BACKEND in TFLITE_MODEL_FILES:
+        tflite_path = os.path.join(model_path, TFLITE_MODEL_FILES[INFERENCE_BACKEND])
+        if not os.path.exists(tflite_path):
+            raise FileNotFoundError(f"{tflite_path} not found. Run export_tflite.py first.")
+        tflite_model = TFLiteServingModel(tflite_path, name=name, num_threads=TFLITE_NUM_THREADS)
+        tflite_model.warmup(SERVING_WARMUP_ROUNDS)
+        return tflite_model, tflite_model.predict
+    
+    import tensorflow as tf
+    keras_model = tf.keras.models.load_model(model_path)
+    return keras_model, create_predictor(keras_model, name)
+
+def create_batcher(predict_fn, name):
+    """Put a micro-batching scheduler in front of a loaded model"""
+    return MicroBatcher(
+        predict_fn,
+        name=name,
+        max_batch_size=INFERENCE_MAX_BATCH_SIZE,
+        max_wait_ms=INFERENCE_MAX_WAIT_MS,
+        # Encoded files are batched as a plain list of bytes
+        collate_fn=list if INFERENCE_INPUT == 'bytes' else BatchBuffer()
+    )
+
+def load_shared_model():
+    """Build the combined crop + soil model once. Returns False if it can't be used."""
+    global shared_model, shared_batcher, shared_backbone_status
+    
+    if shared_batcher is not None:
+        return True
+    if not SHARED_BACKBONE or INFERENCE_BACKEND in TFLITE_MODEL_FILES:
+        shared_backbone_status = "disabled"
+        return False
+    if shared_backbone_status.startswith("unavailable"):
+        return False
+    if not os.path.exists(CROP_MODEL_PATH) or not os.path.exists(SOIL_MODEL_PATH):
+        shared_backbone_status = "unavailable: both models are required"
+        return False
+    
+    import tensorflow as tf
+    from model_serving import build_shared_model
+    
+    print("Building shared-backbone model from crop and soil models")
+    combined = build_shared_model([
+        tf.keras.models.load_model(CROP_MODEL_PATH),
+        tf.keras.models.load_model(SOIL_MODEL_PATH)
+    ])
+    if combined is None:
+        shared_backbone_status = "unavailable: backbone weights differ"
+        print("Crop and soil backbones differ; serving the models separately")
+        return False
+    
+    shared_model = combined
+    shared_batcher = create_batcher(create_predictor(combined, "shared"), "shared")
+    shared_backbone_status = "active"
+    return True
+
+def model_version(model_path):
+    """Identify the model files being served, so cached predictions die with a redeploy"""
+    digest = hashlib.blake2b(f"{INFERENCE_BACKEND}:{INFERENCE_INPUT}".encode(), digest_size=8)
+    for name in ("fingerprint.pb", "saved_model.pb", TFLITE_MODEL_FILES.get(INFERENCE_BACKEND)):
+        path = os.path.join(model_path, name) if name else None
+        if path and os.path.isfile(path):
+            stat = os.stat(path)
+            digest.update(f"{name}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()
+
+def load_remote_head(name):
+    """Connect to the inference server for one model and return (model, batcher)"""
+    global inference_client, shared_batcher, shared_backbone_status
+    
+    if inference_client is None:
+        inference_client = InferenceClient(
+            INFERENCE_SERVER_SOCKET,
+            replicas=INFERENCE_REPLICAS,
+            timeout=INFERENCE_SERVER_TIMEOUT,
+            connect_timeout=INFERENCE_SERVER_TIMEOUT
+        )
+    remote = RemoteModel(inference_client, name)
+    remote.ensure_loaded()
+    
+    # The replicas answer 'all' from their shared model if they have one
+    shared_batcher = RemoteModel(inference_client, 'all')
+    shared_backbone_status = "see inference_server"
+    return remote, remote
+
+def load_inference_head(model_path, name):
+    """Load what serves one endpoint and return (model, batcher)"""
+    model_versions[name] = model_version(model_path)
+    if 'crop' in model_versions and 'soil' in model_versions:
+        model_versions['all'] = model_versions['crop'] + model_versions['soil']
+    
+    if INFERENCE_SERVER:
+        return load_remote_head(name)
+    
+    if load_shared_model():
+        return shared_model, BatcherOutput(shared_batcher, SHARED_OUTPUTS[name])
+    
+    loaded_model, predict_fn = load_inference_model(model_path, name)
+    return loaded_model, create_batcher(predict_fn, name)
+
 def load_model_if_needed():
     """Load the TensorFlow model and class mappings if not already loaded"""
-    global model, class_indices, health_categories
+    with model_load_lock:
+        return _load_model()
+
+def _load_model():
+    global model, class_indices, health_categories, crop_batcher
     
-    if model is None:
+    if not models_loaded['crop']:
         if not os.path.exists(CROP_MODEL_PATH):
             return False, "Model not found. Please train the model first."
         
         try:
             print(f"Loading model from {CROP_MODEL_PATH}")
-            model = tf.keras.models.load_model(CROP_MODEL_PATH)
+            model, crop_batcher = load_inference_head(CROP_MODEL_PATH, "crop")
             
             # Load class indices
             class_indices_path = os.path.join(CROP_MODEL_PATH, "class_indices.json")
@@ -106,7 +371,8 @@ def load_model_if_needed():
             if os.path.exists(health_categories_path):
                 with open(health_categories_path, "r") as f:
                     health_categories = json.load(f)
-                
+            
+            models_loaded['crop'] = True
             return True, "Model loaded successfully"
         except Exception as e:
             return False, f"Error loading model: {str(e)}"
@@ -115,20 +381,25 @@ def load_model_if_needed():
 
 # Global variables for soil model caching
 soil_model = None
+soil_batcher = None
 soil_classes = None
 soil_characteristics = None
 
 def load_soil_model_if_needed():
     """Load the soil classification model and related data if not already loaded"""
-    global soil_model, soil_classes, soil_characteristics
+    with model_load_lock:
+        return _load_soil_model()
+
+def _load_soil_model():
+    global soil_model, soil_batcher, soil_classes, soil_characteristics
     
-    if soil_model is None:
+    if not models_loaded['soil']:
         if not os.path.exists(SOIL_MODEL_PATH):
             return False, "Soil classification model not found. Please train the model first."
         
         try:
             print(f"Loading soil model from {SOIL_MODEL_PATH}")
-            soil_model = tf.keras.models.load_model(SOIL_MODEL_PATH)
+            soil_model, soil_batcher = load_inference_head(SOIL_MODEL_PATH, "soil")
             
             # Load class indices and characteristics
             soil_classes_path = os.path.join(SOIL_MODEL_PATH, "soil_class_indices.json")
@@ -146,12 +417,109 @@ def load_soil_model_if_needed():
             with open(soil_characteristics_path) as f:
                 soil_characteristics = json.load(f)
             
+            models_loaded['soil'] = True
             return True, "Soil model and data loaded successfully"
         except Exception as e:
             return False, f"Error loading soil model: {str(e)}"
     
     return True, "Soil model already loaded"
 
+ALLOWED_IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg'}
+
+def is_allowed_image(filename):
+    """Check that an uploaded file name has one of the accepted image extensions"""
+    return bool(filename) and '.' in filename and \
+        filename.rsplit('.', 1)[1].lower() in ALLOWED_IMAGE_EXTENSIONS
+
+def preprocess_image(stream):
+    """Decode an uploaded image into a 224x224x3 uint8 array.
+
+    Scaling to float32 happens later, directly into the batch buffer.
+    """
+    return decode_image(stream, size=IMG_SIZE)
+
+def prepare_input(image_bytes):
+    """Turn an uploaded file into a batcher input: the checked file itself or a decoded array"""
+    if INFERENCE_INPUT == 'bytes':
+        return prepare_encoded(image_bytes, size=IMG_SIZE)
+    return preprocess_image(io.BytesIO(image_bytes))
+
+def ensure_decoded(predictions):
+    """Raise ValueError for an image the model could not decode.
+
+    With in-graph preprocessing, a file that fails to decode gets NaN outputs
+    instead of failing the other images in its batch.
+    """
+    outputs = predictions if isinstance(predictions, tuple) else (predictions,)
+    if any(np.isnan(output).any() for output in outputs):
+        raise ValueError('Could not decode image')
+    return predictions
+
+def predict_cached(kind, predict, image_bytes):
+    """Run one uploaded image through a model, answering repeat uploads from the prediction cache.
+
+    predict is a batcher (or any callable taking one preprocessed image).
+    """
+    key = PredictionCache.key_for(kind, model_versions[kind], image_bytes)
+    predict = getattr(predict, 'predict', predict)
+    return prediction_cache.get_or_compute(key, lambda: ensure_decoded(predict(prepare_input(image_bytes))))
+
+def describe_soil_prediction(predictions):
+    """Turn soil model probabilities into the /api/analyze-soil response body"""
+    predicted_class_idx = np.argmax(predictions)
+    confidence = float(np.max(predictions))
+    
+    # Get class name and characteristics
+    class_name = next((k for k, v in soil_classes.items() if v == predicted_class_idx), None)
+    if not class_name:
+        print(f"Available soil_classes: {soil_classes}")
+        raise LookupError(f'Could not find class name for index {predicted_class_idx}')
+    
+    # Get characteristics and recommendations from the soil_characteristics.json file
+    soil_info = soil_characteristics.get(class_name, {})
+    characteristics = soil_info.get('characteristics', [])
+    soil_recommendations = soil_info.get('recommendations', [
+        f"Apply {class_name}-specific fertilizer",
+        "Maintain proper irrigation schedule",
+        "Monitor soil pH levels regularly"
+    ])
+    
+    return {
+        'class': class_name,
+        'confidence': confidence,
+        'characteristics': characteristics,
+        'recommendations': soil_recommendations
+    }
+
+def describe_crop_prediction(predictions):
+    """Turn crop model probabilities into the /api/analyze response body"""
+    predicted_class_idx = np.argmax(predictions)
+    confidence = float(np.max(predictions))
+    
+    # Get class name
+    predicted_class = next((k for k, v in class_indices.items() if v == predicted_class_idx), None)
+    if predicted_class is None:
+        print(f"Available class_indices: {class_indices}")
+        raise LookupError(f'Could not find class name for index {predicted_class_idx}')
+    
+    # Determine health category
+    health_category = None
+    for category, classes in health_categories.items():
+        if any(cls in predicted_class.lower() for cls in classes):
+            health_category = category
+            break
+    
+    if not health_category:
+        health_category = 'unknown'
+        print(f"Could not determine health category for class: {predicted_class}")
+    
+    return {
+        'class': predicted_class,
+        'confidence': confidence,
+        'health_category': health_category,
+        'recommendations': recommendations.get(health_category, recommendations['healthy'])
+    }
+
 @app.route('/api/analyze-soil', methods=['POST'])
 def analyze_soil():
     # Load model if needed
@@ -176,57 +544,27 @@ def analyze_soil():
         print(f"Received soil image: {image_file.filename}")
         
         # Validate file format
-        allowed_extensions = {'png', 'jpg', 'jpeg'}
-        if not image_file.filename or '.' not in image_file.filename or \
-           image_file.filename.rsplit('.', 1)[1].lower() not in allowed_extensions:
+        if not is_allowed_image(image_file.filename):
             print(f"Invalid image format: {image_file.filename}")
             return jsonify({'error': 'Invalid image format. Allowed formats: PNG, JPG, JPEG'}), 400
         
-        img = Image.open(image_file.stream).convert('RGB')
-        print(f"Opened image with size: {img.size}")
-        
-        # Validate image dimensions
-        if img.size[0] < 50 or img.size[1] < 50:
-            print(f"Image dimensions too small: {img.size}")
-            return jsonify({'error': 'Image dimensions too small. Minimum size: 50x50 pixels'}), 400
+        # Make prediction (repeat uploads of the same photo come from the cache)
+        print("Making soil prediction...")
+        try:
+            predictions = predict_cached('soil', soil_batcher, image_file.read())
+        except ValueError as e:
+            print(f"Rejected soil image: {e}")
+            return jsonify({'error': str(e)}), 400
+        print(f"Raw prediction results: {predictions}")
         
-        # Preprocess image
-        img = img.resize((224, 224))
-        img_array = np.array(img) / 255.0
-        img_array = np.expand_dims(img_array, axis=0)
-        print(f"Preprocessed image shape: {img_array.shape}")
+        try:
+            result = describe_soil_prediction(predictions)
+        except LookupError as e:
+            print(str(e))
+            return jsonify({'error': str(e)}), 500
 
-        # Make prediction
-        print("Making soil prediction...")
-        predictions = soil_model.predict(img_array)
-        predicted_class_idx = np.argmax(predictions[0])
-        confidence = float(np.max(predictions[0]))
-        print(f"Raw prediction results: {predictions[0]}")
-        print(f"Predicted class index: {predicted_class_idx}, confidence: {confidence}")
-        
-        # Get class name and characteristics
-        class_name = next((k for k, v in soil_classes.items() if v == predicted_class_idx), None)
-        if not class_name:
-            print(f"Could not find class name for index {predicted_class_idx}")
-            print(f"Available soil_classes: {soil_classes}")
-            return jsonify({'error': f'Could not find class name for index {predicted_class_idx}'}), 500
-            
-        # Get characteristics and recommendations from the soil_characteristics.json file
-        soil_info = soil_characteristics.get(class_name, {})
-        characteristics = soil_info.get('characteristics', [])
-        recommendations = soil_info.get('recommendations', [
-            f"Apply {class_name}-specific fertilizer",
-            "Maintain proper irrigation schedule",
-            "Monitor soil pH levels regularly"
-        ])
-
-        print(f"Soil analysis complete. Identified as {class_name} with {confidence:.2f} confidence")
-        return jsonify({
-            'class': class_name,
-            'confidence': confidence,
-            'characteristics': characteristics,
-            'recommendations': recommendations
-        })
+        print(f"Soil analysis complete. Identified as {result['class']} with {result['confidence']:.2f} confidence")
+        return jsonify(result)
 
     except Exception as e:
         print(f"Error in soil analysis: {str(e)}")
@@ -260,72 +598,342 @@ def analyze_crop():
         print(f"Received crop image: {image_file.filename}")
         
         # Validate file format
-        allowed_extensions = {'png', 'jpg', 'jpeg'}
-        file_ext = image_file.filename.rsplit('.', 1)[1].lower() if '.' in image_file.filename else ''
-        if not file_ext or file_ext not in allowed_extensions:
+        if not is_allowed_image(image_file.filename):
             print(f"Invalid image format: {image_file.filename}")
             return jsonify({'error': 'Please upload a PNG, JPG, or JPEG image'}), 400
         
-        img = Image.open(image_file.stream).convert('RGB')
-        print(f"Opened image with size: {img.size}")
+        # Make prediction (repeat uploads of the same photo come from the cache)
+        print("Making crop health prediction...")
+        try:
+            predictions = predict_cached('crop', crop_batcher, image_file.read())
+        except ValueError as e:
+            print(f"Rejected crop image: {e}")
+            return jsonify({'error': str(e)}), 400
+        print(f"Raw prediction results: {predictions}")
         
-        # Validate image dimensions
-        if img.size[0] < 50 or img.size[1] < 50:
-            print(f"Image dimensions too small: {img.size}")
-            return jsonify({'error': 'Image dimensions too small. Minimum size: 50x50 pixels'}), 400
+        try:
+            result = describe_crop_prediction(predictions)
+        except LookupError as e:
+            print(str(e))
+            return jsonify({'error': str(e)}), 500
         
-        # Preprocess image
-        img = img.resize((224, 224))
-        img_array = np.array(img) / 255.0
-        img_array = np.expand_dims(img_array, axis=0)
-        print(f"Preprocessed image shape: {img_array.shape}")
+        print(f"Crop analysis complete. Class: {result['class']}, Health: {result['health_category']}, Confidence: {result['confidence']:.2f}")
+        return jsonify(result)
 
-        # Make prediction
-        print("Making crop health prediction...")
-        predictions = model.predict(img_array)
-        predicted_class_idx = np.argmax(predictions[0])
-        confidence = float(np.max(predictions[0]))
-        print(f"Raw prediction results: {predictions[0]}")
-        print(f"Predicted class index: {predicted_class_idx}, confidence: {confidence}")
+    except Exception as e:
+        print(f"Error in crop analysis: {str(e)}")
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/analyze-all', methods=['POST'])
+def analyze_all():
+    """Run crop-health and soil analysis on one image with a single backbone pass"""
+    try:
+        for load in (load_model_if_needed, load_soil_model_if_needed):
+            success, message = load()
+            if not success:
+                print(f"Error loading models: {message}")
+                return jsonify({'error': 'Failed to initialize analysis model. Please try again later.'}), 500
+        
+        if 'image' not in request.files:
+            return jsonify({'error': 'No image provided'}), 400
+        
+        image_file = request.files['image']
+        if not is_allowed_image(image_file.filename):
+            print(f"Invalid image format: {image_file.filename}")
+            return jsonify({'error': 'Please upload a PNG, JPG, or JPEG image'}), 400
+        
+        def run_both_models(img_array):
+            if shared_batcher is not None:
+                return shared_batcher.predict(img_array)
+            return crop_batcher.predict(img_array), soil_batcher.predict(img_array)
         
-        # Get class name
         try:
-            predicted_class = next(k for k, v in class_indices.items() if v == predicted_class_idx)
-            print(f"Predicted class: {predicted_class}")
-        except StopIteration:
-            print(f"Could not find class name for index {predicted_class_idx}")
-            print(f"Available class_indices: {class_indices}")
-            return jsonify({'error': f'Could not find class name for index {predicted_class_idx}'}), 500
-        
-        # Determine health category
-        health_category = None
-        for category, classes in health_categories.items():
-            if any(cls in predicted_class.lower() for cls in classes):
-                health_category = category
-                break
-        
-        if not health_category:
-            health_category = 'unknown'
-            print(f"Could not determine health category for class: {predicted_class}")
-        else:
-            print(f"Determined health category: {health_category}")
+            crop_predictions, soil_predictions = predict_cached('all', run_both_models, image_file.read())
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        # Get recommendations
-        category_recommendations = recommendations.get(health_category, recommendations['healthy'])
+        try:
+            result = {
+                'crop': describe_crop_prediction(crop_predictions),
+                'soil': describe_soil_prediction(soil_predictions)
+            }
+        except LookupError as e:
+            print(str(e))
+            return jsonify({'error': str(e)}), 500
         
-        print(f"Crop analysis complete. Class: {predicted_class}, Health: {health_category}, Confidence: {confidence:.2f}")
-        return jsonify({
-            'class': predicted_class,
-            'confidence': confidence,
-            'health_category': health_category,
-            'recommendations': category_recommendations
-        })
-
+        print(f"Combined analysis complete. Crop: {result['crop']['class']}, Soil: {result['soil']['class']}")
+        return jsonify(result)
+    
     except Exception as e:
-        print(f"Error in crop analysis: {str(e)}")
+        print(f"Error in combined analysis: {str(e)}")
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+# Bulk analysis settings. At most BULK_MAX_IN_FLIGHT images are decoded or
+# waiting for inference at any time, so memory stays flat however many
+# images a request carries.
+BULK_BATCH_SIZE = int(os.environ.get('BULK_BATCH_SIZE', 32))
+BULK_DECODE_WORKERS = int(os.environ.get('BULK_DECODE_WORKERS', 4))
+BULK_MAX_IN_FLIGHT = max(1, int(os.environ.get('BULK_MAX_IN_FLIGHT', BULK_BATCH_SIZE * 2)))
+BULK_MAX_IMAGES = int(os.environ.get('BULK_MAX_IMAGES', 500))
+# Largest single image accepted, checked before a zip entry is decompressed
+BULK_MAX_IMAGE_MB = float(os.environ.get('BULK_MAX_IMAGE_MB', 20))
+BULK_MAX_IMAGE_BYTES = int(BULK_MAX_IMAGE_MB * 1024 * 1024)
+
+bulk_decode_pool = ThreadPoolExecutor(max_workers=BULK_DECODE_WORKERS, thread_name_prefix="bulk-decode")
+
+def read_capped(stream):
+    """Read at most BULK_MAX_IMAGE_BYTES; returns (bytes, None), or (None, error) if the file is larger"""
+    data = stream.read(BULK_MAX_IMAGE_BYTES + 1)
+    if len(data) > BULK_MAX_IMAGE_BYTES:
+        return None, f'Image too large. Maximum size: {BULK_MAX_IMAGE_MB:g} MB'
+    return data, None
+
+def iter_bulk_uploads():
+    """Yield (filename, image bytes, error) from a multi-file upload or a zip archive; oversized files carry an error instead of bytes"""
+    archive = request.files.get('archive')
+    if archive and archive.filename:
+        with zipfile.ZipFile(archive.stream) as zf:
+            for info in zf.infolist():
+                if info.is_dir():
+                    continue
+                # The declared size rejects most zip bombs without inflating anything;
+                # the capped read catches entries whose header understates it
+                if info.file_size > BULK_MAX_IMAGE_BYTES:
+                    yield info.filename, None, f'Image too large. Maximum size: {BULK_MAX_IMAGE_MB:g} MB'
+                    continue
+                # Members are read one at a time; ZipFile is not safe to share across decode threads
+                try:
+                    with zf.open(info) as member:
+                        image_bytes, error = read_capped(member)
+                except (zipfile.BadZipFile, zlib.error, EOFError, NotImplementedError) as e:
+                    # e.g. a CRC mismatch from an entry whose header lies about its size
+                    print(f"Could not read {info.filename} from archive: {e}")
+                    image_bytes, error = None, 'Could not read file from archive'
+                yield info.filename, image_bytes, error
+    
+    for image_file in request.files.getlist('images'):
+        yield (image_file.filename, *read_capped(image_file))
+
+def stream_bulk_analysis(kind, batcher, describe):
+    """Decode uploads in a thread pool, run batched inference and yield one NDJSON line per image"""
+    in_flight = {}
+    ready = []
+    
+    def emit(line):
+        return json.dumps(line) + '\n'
+    
+    def run_ready():
+        inputs = [item for _, _, _, item in ready]
+        lines = []
+        try:
+            outputs = batcher.predict_many(inputs)
+            for (index, filename, key, _), predictions in zip(ready, outputs):
+                try:
+                    ensure_decoded(predictions)
+                    prediction_cache.put(key, predictions)
+                    lines.append(emit({'index': index, 'filename': filename, 'result': describe(predictions)}))
+                except (ValueError, LookupError) as e:
+                    lines.append(emit({'index': index, 'filename': filename, 'error': str(e)}))
+        except Exception as e:
+            print(f"Error in bulk inference: {e}")
+            lines = [emit({'index': index, 'filename': filename, 'error': str(e)}) for index, filename, _, _ in ready]
+        ready.clear()
+        return lines
+    
+    def collect(done):
+        lines = []
+        for future in done:
+            index, filename, key = in_flight.pop(future)
+            try:
+                ready.append((index, filename, key, future.result()))
+            except ValueError as e:
+                lines.append(emit({'index': index, 'filename': filename, 'error': str(e)}))
+            except Exception as e:
+                print(f"Could not decode {filename}: {e}")
+                lines.append(emit({'index': index, 'filename': filename, 'error': 'Could not decode image'}))
+            if len(ready) >= BULK_BATCH_SIZE:
+                lines.extend(run_ready())
+        return lines
+    
+    count = 0
+    for index, (filename, image_bytes, error) in enumerate(iter_bulk_uploads()):
+        if index >= BULK_MAX_IMAGES:
+            yield emit({'index': index, 'filename': filename, 'error': f'Too many images. Maximum per request: {BULK_MAX_IMAGES}'})
+            break
+        count += 1
+        if error:
+            yield emit({'index': index, 'filename': filename, 'error': error})
+            continue
+        if not is_allowed_image(filename):
+            yield emit({'index': index, 'filename': filename, 'error': 'Invalid image format. Allowed formats: PNG, JPG, JPEG'})
+            continue
+        
+        # Photos seen before skip decoding and inference entirely
+        key = PredictionCache.key_for(kind, model_versions[kind], image_bytes)
+        cached = prediction_cache.get(key)
+        if cached is not None:
+            yield emit({'index': index, 'filename': filename, 'result': describe(cached)})
+            continue
+        
+        # Apply back-pressure before reading the next upload
+        while len(in_flight) + len(ready) >= BULK_MAX_IN_FLIGHT:
+            if in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for line in collect(done):
+                    yield line
+            if len(in_flight) + len(ready) >= BULK_MAX_IN_FLIGHT and ready:
+                for line in run_ready():
+                    yield line
+        
+        in_flight[bulk_decode_pool.submit(prepare_input, image_bytes)] = (index, filename, key)
+    
+    while in_flight:
+        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+        for line in collect(done):
+            yield line
+    if ready:
+        for line in run_ready():
+            yield line
+    
+    print(f"Bulk analysis complete: {count} images")
+
+def bulk_upload_error():
+    """Return an error message if the request carries no usable images, else None"""
+    archive = request.files.get('archive')
+    if archive and archive.filename:
+        is_zip = zipfile.is_zipfile(archive.stream)
+        archive.stream.seek(0)
+        if not is_zip:
+            return "The 'archive' upload is not a valid zip file"
+        return None
+    
+    if not any(image_file.filename for image_file in request.files.getlist('images')):
+        return "No images provided. Send files in 'images' or a zip file in 'archive'"
+    return None
+
+@app.route('/api/analyze/batch', methods=['POST'])
+def analyze_crop_batch():
+    """Analyze many crop images and stream one JSON line per image"""
+    success, message = load_model_if_needed()
+    if not success:
+        print(f"Error loading crop model: {message}")
+        return jsonify({'error': 'Failed to initialize analysis model. Please try again later.'}), 500
+    
+    error = bulk_upload_error()
+    if error:
+        return jsonify({'error': error}), 400
+    
+    return Response(stream_with_context(stream_bulk_analysis('crop', crop_batcher, describe_crop_prediction)),
+                    mimetype='application/x-ndjson')
+
+@app.route('/api/analyze-soil/batch', methods=['POST'])
+def analyze_soil_batch():
+    """Analyze many soil images and stream one JSON line per image"""
+    success, message = load_soil_model_if_needed()
+    if not success:
+        print(f"Error loading soil model: {message}")
+        return jsonify({'error': message}), 500
+    
+    error = bulk_upload_error()
+    if error:
+        return jsonify({'error': error}), 400
+    
+    return Response(stream_with_context(stream_bulk_analysis('soil', soil_batcher, describe_soil_prediction)),
+                    mimetype='application/x-ndjson')
+
+def format_current_weather(current_data):
+    """Convert an OpenWeatherMap current weather payload to the location and current parts of our response"""
+    # Extract city name, country code from response
+    return {
+        "location": {
+            "name": current_data.get('name', 'Unknown Location'),
+            "country": current_data.get('sys', {}).get('country', ''),
+            "region": ""
+        },
+        "current": {
+            "temp_c": current_data.get('main', {}).get('temp'),
+            "condition": {
+                "text": current_data.get('weather', [{}])[0].get('description', 'Unknown'),
+                "icon": f"https://openweathermap.org/img/wn/{current_data.get('weather', [{}])[0].get('icon', '01d')}@2x.png",
+                "code": current_data.get('weather', [{}])[0].get('id', 800)
+            },
+            "wind_kph": current_data.get('wind', {}).get('speed', 0) * 3.6,  # Convert m/s to km/h
+            "humidity": current_data.get('main', {}).get('humidity', 0),
+            "feelslike_c": current_data.get('main', {}).get('feels_like'),
+            "uv": 0,  # OpenWeatherMap doesn't provide UV in the basic API
+        }
+    }
+
+def format_forecast(forecast_data):
+    """Convert an OpenWeatherMap 5 day / 3 hour forecast to the forecast part of our response"""
+    forecast = {"forecastday": []}
+    
+    # Process forecast data - extract one forecast per day
+    processed_dates = set()
+    for item in forecast_data.get('list', []):
+        # Get date from the forecast timestamp
+        forecast_date = datetime.fromtimestamp(item.get('dt', 0)).strftime("%Y-%m-%d")
+        
+        # Skip if we already have this date
+        if forecast_date in processed_dates:
+            continue
+        
+        processed_dates.add(forecast_date)
+        
+        # Create a forecast day entry
+        day_forecast = {
+            "date": forecast_date,
+            "day": {
+                "maxtemp_c": item.get('main', {}).get('temp_max'),
+                "mintemp_c": item.get('main', {}).get('temp_min'),
+                "condition": {
+                    "text": item.get('weather', [{}])[0].get('description', 'Unknown'),
+                    "icon": f"https://openweathermap.org/img/wn/{item.get('weather', [{}])[0].get('icon', '01d')}@2x.png",
+                    "code": item.get('weather', [{}])[0].get('id', 800)
+                }
+            }
+        }
+        
+        forecast["forecastday"].append(day_forecast)
+        
+        # Limit to 3 days as in the frontend
+        if len(forecast["forecastday"]) >= 3:
+            break
+    
+    return forecast
+
+def fetch_cell_weather(cell):
+    """Return the formatted (current, forecast) parts for a grid cell, from the cache where possible"""
+    def fetch_current():
+        return format_current_weather(weather_client.current(cell.lat, cell.lon))
+    
+    def fetch_forecast():
+        return format_forecast(weather_client.forecast(cell.lat, cell.lon))
+    
+    forecast = weather_cache.get('forecast', cell)
+    if forecast is not None:
+        return weather_cache.get_or_fetch('current', cell, fetch_current), forecast
+    
+    # The forecast is missing, so fetch it alongside current conditions
+    forecast_future = weather_client.submit(weather_cache.get_or_fetch, 'forecast', cell, fetch_forecast)
+    try:
+        current = weather_cache.get_or_fetch('current', cell, fetch_current)
+    finally:
+        forecast_future.exception()
+    return current, forecast_future.result()
+
+def build_weather_response(current, forecast, lat, lon):
+    """Assemble the /api/weather payload; the cached parts are shared, so they are not modified"""
+    location = dict(current["location"])
+    location.update({
+        "lat": float(lat),
+        "lon": float(lon),
+        "localtime": datetime.now().strftime("%Y-%m-%d %H:%M")
+    })
+    return {"location": location, "current": current["current"], "forecast": forecast}
+
 @app.route('/api/weather', methods=['GET'])
 def get_weather():
     lat = request.args.get('lat')
@@ -337,105 +945,34 @@ def get_weather():
         print("Error: Missing latitude or longitude parameters")
         return jsonify({'error': 'Latitude and longitude required'}), 400
     
-    # Use the user's provided OpenWeatherMap API key
-    api_key = "0ed298208193505d5deb394d1ab181bd"  # User's API key
+    try:
+        cell = weather_cache.cell(lat, lon)
+    except ValueError as e:
+        return jsonify({'error': f'Invalid coordinates: {e}'}), 400
     
     try:
-        # Get current weather from OpenWeatherMap
-        current_url = f"https://api.openweathermap.org/data/2.5/weather?lat={lat}&lon={lon}&appid={api_key}&units=metric"
-        print(f"Requesting current weather from: {current_url}")
-        current_response = requests.get(current_url)
-        print(f"Current weather API response status: {current_response.status_code}")
-        current_data = current_response.json()
-        
-        if 'cod' in current_data and current_data['cod'] != 200:
-            error_msg = current_data.get('message', 'Error fetching weather data')
-            print(f"OpenWeatherMap current weather API error: {error_msg}")
-            return jsonify({'error': error_msg}), 400
-        
-        # Get forecast from OpenWeatherMap
-        forecast_url = f"https://api.openweathermap.org/data/2.5/forecast?lat={lat}&lon={lon}&appid={api_key}&units=metric"
-        print(f"Requesting forecast from: {forecast_url}")
-        forecast_response = requests.get(forecast_url)
-        print(f"Forecast API response status: {forecast_response.status_code}")
-        forecast_data = forecast_response.json()
-        
-        if 'cod' in forecast_data and forecast_data['cod'] != '200':
-            error_msg = forecast_data.get('message', 'Error fetching forecast data')
-            print(f"OpenWeatherMap forecast API error: {error_msg}")
-            return jsonify({'error': error_msg}), 400
-        
-        # Convert OpenWeatherMap data to the format expected by our frontend
-        # Extract city name, country code from response
-        location_name = current_data.get('name', 'Unknown Location')
-        country_code = current_data.get('sys', {}).get('country', '')
-        
-        # Create formatted response
-        formatted_response = {
-            "location": {
-                "name": location_name,
-                "country": country_code,
-                "region": "",
-                "lat": float(lat),
-                "lon": float(lon),
-                "localtime": datetime.now().strftime("%Y-%m-%d %H:%M")
-            },
-            "current": {
-                "temp_c": current_data.get('main', {}).get('temp'),
-                "condition": {
-                    "text": current_data.get('weather', [{}])[0].get('description', 'Unknown'),
-                    "icon": f"https://openweathermap.org/img/wn/{current_data.get('weather', [{}])[0].get('icon', '01d')}@2x.png",
-                    "code": current_data.get('weather', [{}])[0].get('id', 800)
-                },
-                "wind_kph": current_data.get('wind', {}).get('speed', 0) * 3.6,  # Convert m/s to km/h
-                "humidity": current_data.get('main', {}).get('humidity', 0),
-                "feelslike_c": current_data.get('main', {}).get('feels_like'),
-                "uv": 0,  # OpenWeatherMap doesn't provide UV in the basic API
-            },
-            "forecast": {
-                "forecastday": []
-            }
-        }
-        
-        # Process forecast data - extract one forecast per day
-        processed_dates = set()
-        for item in forecast_data.get('list', []):
-            # Get date from the forecast timestamp
-            forecast_date = datetime.fromtimestamp(item.get('dt', 0)).strftime("%Y-%m-%d")
-            
-            # Skip if we already have this date
-            if forecast_date in processed_dates:
-                continue
-            
-            processed_dates.add(forecast_date)
-            
-            # Create a forecast day entry
-            day_forecast = {
-                "date": forecast_date,
-                "day": {
-                    "maxtemp_c": item.get('main', {}).get('temp_max'),
-                    "mintemp_c": item.get('main', {}).get('temp_min'),
-                    "condition": {
-                        "text": item.get('weather', [{}])[0].get('description', 'Unknown'),
-                        "icon": f"https://openweathermap.org/img/wn/{item.get('weather', [{}])[0].get('icon', '01d')}@2x.png",
-                        "code": item.get('weather', [{}])[0].get('id', 800)
-                    }
-                }
-            }
-            
-            formatted_response["forecast"]["forecastday"].append(day_forecast)
-            
-            # Limit to 3 days as in the frontend
-            if len(formatted_response["forecast"]["forecastday"]) >= 3:
-                break
-        
-        return jsonify(formatted_response)
+        current, forecast = fetch_cell_weather(cell)
+        return jsonify(build_weather_response(current, forecast, lat, lon))
+    except WeatherUnavailableError as e:
+        print(f"OpenWeatherMap unavailable: {e}")
+        return jsonify({'error': str(e)}), 503
+    except WeatherServiceError as e:
+        print(f"OpenWeatherMap API error: {e}")
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"Error fetching weather data: {e}")
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/weather-stats', methods=['GET'])
+def weather_stats():
+    """Report OpenWeatherMap client counters and weather cache statistics"""
+    stats = weather_client.stats()
+    stats["cache"] = weather_cache.stats()
+    return jsonify(stats)
+
 @app.route('/api/model-info', methods=['GET'])
+@response_encoder.etag
 def model_info():
     success, message = load_model_if_needed()
     if not success:
@@ -449,81 +986,401 @@ def model_info():
         'health_categories': health_categories
     })
 
+@app.route('/api/inference-stats', methods=['GET'])
+def inference_stats():
+    """Report queue depth and batch-size statistics of the inference schedulers"""
+    if INFERENCE_SERVER:
+        return jsonify({
+            'inference_server': inference_client.stats() if inference_client is not None else None,
+            'input': INFERENCE_INPUT,
+            'prediction_cache': prediction_cache.stats()
+        })
+    return jsonify({
+        'crop': crop_batcher.stats() if crop_batcher is not None else None,
+        'soil': soil_batcher.stats() if soil_batcher is not None else None,
+        'shared_backbone': shared_backbone_status,
+        'input': INFERENCE_INPUT,
+        'prediction_cache': prediction_cache.stats()
+    })
+
+@app.route('/api/response-stats', methods=['GET'])
+def response_stats():
+    """Report how much response compression is saving and how often clients revalidate with 304"""
+    return jsonify(response_encoder.stats())
+
+# Gemini answers are reused for later questions that mean the same thing:
+# TF-IDF cosine similarity of at least CHAT_CACHE_SIMILARITY (see chat_cache.py)
+chat_cache = SemanticChatCache(
+    max_entries=int(os.environ.get('CHAT_CACHE_MAX_ENTRIES', 20000)),
+    ttl_seconds=float(os.environ.get('CHAT_CACHE_TTL', 24 * 3600)),
+    threshold=float(os.environ.get('CHAT_CACHE_SIMILARITY', 0.85)),
+    enabled=os.environ.get('CHAT_CACHE_ENABLED', '1') == '1'
+)
+
+def cache_chat_answer(message, response_data):
+    # Error messages are never cached
+    if response_data.get('source') == 'gemini':
+        chat_cache.put(message, response_data)
+
+# At most CHAT_MAX_CONCURRENCY Gemini calls run at once per worker process.
+# A question not answered within CHAT_LATENCY_BUDGET seconds gets the
+# rule-based answer instead, while the Gemini call finishes in the
+# background and fills the cache (see chat_orchestrator.py)
+chat_orchestrator = ChatOrchestrator(
+    remote_fn=lambda message: get_chatbot().get_response(message),
+    fallback_fn=lambda message: simple_chat_answer(message)['response'],
+    on_result=cache_chat_answer,
+    max_concurrency=int(os.environ.get('CHAT_MAX_CONCURRENCY', 4)),
+    max_queue=int(os.environ.get('CHAT_QUEUE_SIZE', 32)),
+    queue_timeout=float(os.environ.get('CHAT_QUEUE_TIMEOUT', 20)),
+    budget_seconds=float(os.environ.get('CHAT_LATENCY_BUDGET', 5))
+)
+
+def read_chat_message():
+    """The request's chat message, or None unless the body is JSON with a non-empty string message"""
+    data = request.get_json(silent=True)
+    message = data.get('message') if isinstance(data, dict) else None
+    if not isinstance(message, str) or not message.strip():
+        return None
+    return message
+
+def simple_chat_answer(message):
+    """The rule-based answer in the shape every /api/chat path returns: text in 'response', plus 'source'"""
+    return {'response': simple_chatbot.get_response(message)['response'], 'source': 'simple-chatbot'}
+
 @app.route('/api/chat', methods=['POST'])
 def chat_api():
+    message = read_chat_message()
+    if message is None:
+        return jsonify({'error': 'message must be a non-empty string'}), 400
+
     try:
         if not CHATBOT_ENABLED:
-            simple_response = simple_chatbot.get_response(request.json.get('message', ''))
-            return jsonify({
-                'response': simple_response,
-                'source': 'simple-chatbot'
-            })
+            return jsonify(simple_chat_answer(message))
+        
+        cached, similarity = chat_cache.get(message)
+        if cached is not None:
+            return jsonify({**cached, 'source': 'cache', 'similarity': similarity})
             
-        # Try to use Gemini chatbot if available
-        response_data = gemini_chatbot.get_response(request.json.get('message', ''))
-        return jsonify(response_data)
+        # Gemini within the latency budget, the rule-based chatbot otherwise
+        return jsonify(chat_orchestrator.respond(message))
         
     except Exception as e:
         traceback.print_exc()
         # Fallback to simple chatbot if Gemini fails
         try:
-            simple_response = simple_chatbot.get_response(request.json.get('message', ''))
-            return jsonify({
-                'response': simple_response,
-                'source': 'simple-chatbot'
-            })
+            return jsonify(simple_chat_answer(message))
         except:
             return jsonify({
                 'response': f"I'm sorry, I encountered an error: {str(e)}",
                 'source': 'error'
             }), 500
 
+chat_stream_stats = ChatStreamStats()
+
+def chat_stream_events(message):
+    """SSE events for one streamed chat answer, from the cache, Gemini or the fallback chatbot"""
+    started = time.perf_counter()
+
+    def record(source):
+        return lambda text, ttft, duration: chat_stream_stats.record(source, ttft, duration)
+
+    def fallback():
+        return stream_answer('simple-chatbot', simple_chatbot.stream_response(message),
+                             on_complete=record('simple-chatbot'), started=started)
+
+    if not CHATBOT_ENABLED:
+        yield from fallback()
+        return
+
+    cached, similarity = chat_cache.get(message)
+    if cached is not None:
+        yield from stream_answer('cache', [cached['response']], on_complete=record('cache'), started=started)
+        return
+
+    def on_gemini_complete(text, ttft, duration):
+        chat_stream_stats.record('gemini', ttft, duration)
+        if text:
+            chat_cache.put(message, {'response': text, 'source': 'gemini'})
+
+    # Streams count against the same Gemini concurrency limit as /api/chat
+    if not chat_orchestrator.acquire_slot(timeout=chat_orchestrator.budget):
+        yield from fallback()
+        return
+    try:
+        yield from stream_answer('gemini', get_chatbot().stream_response(message),
+                                 on_complete=on_gemini_complete, started=started)
+    except Exception as e:
+        traceback.print_exc()
+        if getattr(e, 'chunks_sent', 0):
+            # Part of the answer is already on screen; the client decides whether to retry
+            chat_stream_stats.record_error()
+            yield sse_event('error', {'message': "The answer was interrupted. Please try again."})
+            return
+        yield from fallback()
+    finally:
+        chat_orchestrator.release_slot()
+
+def guarded_chat_stream(message):
+    """chat_stream_events, ending with an error event instead of a cut-off stream if anything raises"""
+    try:
+        yield from chat_stream_events(message)
+    except Exception:
+        # The 200 status and headers are already sent; the error has to travel as an event
+        traceback.print_exc()
+        chat_stream_stats.record_error()
+        yield sse_event('error', {'message': "I'm sorry, there was an error processing your request."})
+
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream_api():
+    """Stream a chat answer as server-sent events: start, chunk..., then done (or error)"""
+    message = read_chat_message()
+    if message is None:
+        return jsonify({'error': 'message must be a non-empty string'}), 400
+    return Response(stream_with_context(guarded_chat_stream(message)),
+                    mimetype='text/event-stream', headers=SSE_HEADERS)
+
+@app.route('/api/chat-stats', methods=['GET'])
+def chat_stats():
+    """Report chat cache hit rates, the share of answers given by the fallback, and streaming latencies"""
+    return jsonify({'chatbot': chatbot_status(), 'cache': chat_cache.stats(),
+                    'orchestrator': chat_orchestrator.stats(), 'streaming': chat_stream_stats.stats()})
+
+def parse_history_range(args):
+    """Turn start/end or days query parameters into an inclusive (start, end) date range"""
+    today = datetime.now().date()
+    try:
+        end = datetime.strptime(args['end'], "%Y-%m-%d").date() if args.get('end') else today
+        if args.get('start'):
+            start = datetime.strptime(args['start'], "%Y-%m-%d").date()
+        else:
+            start = end - timedelta(days=int(args.get('days', 90)) - 1) # Default to last 90 days
+    except ValueError:
+        raise ValueError('Dates must be YYYY-MM-DD and days a whole number')
+    
+    if start > end:
+        raise ValueError('start must not be after end')
+    if start < historical_store.start or end > today:
+        raise ValueError(f'History is available from {historical_store.start.isoformat()} to {today.isoformat()}')
+    return start, end
+
 @app.route('/api/historical-weather', methods=['GET'])
 def get_historical_weather():
-    """Get historical weather data for a location"""
+    """Get a historical weather summary for a location over a date range"""
     lat = request.args.get('lat')
     lon = request.args.get('lon')
-    days = int(request.args.get('days', 90)) # Default to last 90 days
 
     if not lat or not lon:
         return jsonify({'error': 'Latitude and longitude required'}), 400
 
-    print(f"*** Historical Weather API: Fetching data for lat={lat}, lon={lon}, days={days} ***")
-
-    # --- Mock Implementation ---
-    # In a real app, fetch data from a historical weather API
-    # For now, generate plausible mock data for the last 'days' days
-    historical_data = []
-    end_date = datetime.now()
-    for i in range(days):
-        date = (end_date - timedelta(days=i)).strftime("%Y-%m-%d")
-        # Simulate daily temperature range and precipitation
-        temp_max = round(random.uniform(20, 35) - (i / days * 10), 1) # Cooler further back
-        temp_min = round(temp_max - random.uniform(5, 10), 1)
-        precipitation = round(random.uniform(0, 15) if random.random() < 0.2 else 0, 1) # 20% chance of rain
-        historical_data.append({
-            "date": date,
-            "temp_max_c": temp_max,
-            "temp_min_c": temp_min,
-            "precipitation_mm": precipitation
-        })
-    
-    # Simple summary (e.g., average max temp, total precipitation)
-    avg_max_temp = round(sum(d['temp_max_c'] for d in historical_data) / days, 1) if days > 0 else 0
-    total_precip = round(sum(d['precipitation_mm'] for d in historical_data), 1)
+    try:
+        cell = grid_cell(lat, lon, HISTORICAL_GRID_PRECISION)
+        start, end = parse_history_range(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
-    summary = {
-        "period_days": days,
-        "avg_max_temp_c": avg_max_temp,
-        "total_precipitation_mm": total_precip,
-        "data_points": len(historical_data) 
-        # Avoid sending all points for now, just summary
-    }
-    # --- End Mock Implementation ---
+    print(f"*** Historical Weather API: lat={lat}, lon={lon}, cell={cell.key}, {start} to {end} ***")
+
+    # Window summaries come from prefix sums and sparse tables, so any range
+    # costs the same few lookups
+    summary = historical_store.history(cell).summary(start, end)
+    summary["grid_cell"] = cell.key
     
     print(f"*** Historical Weather API: Returning data: {summary} ***")
     return jsonify(summary)
 
+WEATHER_BATCH_MAX_LOCATIONS = int(os.environ.get('WEATHER_BATCH_MAX_LOCATIONS', 500))
+WEATHER_BATCH_CONCURRENCY = int(os.environ.get('WEATHER_BATCH_CONCURRENCY', 8))
+WEATHER_BATCH_PARTS = ('current', 'forecast', 'historical')
+
+# Shared by all batch requests, so upstream fan-out stays bounded per worker
+weather_batch_pool = ThreadPoolExecutor(max_workers=WEATHER_BATCH_CONCURRENCY, thread_name_prefix="weather-batch")
+
+def fetch_weather_cells(cells):
+    """Fetch formatted weather for distinct grid cells concurrently; returns {cell key: (current, forecast) or error}"""
+    futures = {weather_batch_pool.submit(fetch_cell_weather, cell): cell.key for cell in cells}
+    results = {}
+    for future, key in futures.items():
+        try:
+            results[key] = future.result()
+        except WeatherServiceError as e:
+            results[key] = str(e)
+        except Exception as e:
+            print(f"Error fetching weather for cell {key}: {e}")
+            results[key] = 'Error fetching weather data'
+    return results
+
+@app.route('/api/weather/batch', methods=['POST'])
+def get_weather_batch():
+    """Current weather, forecast and historical summaries for many locations in one call.
+
+    Locations in the same grid cell share one fetch, upstream calls run with
+    bounded concurrency, and all historical windows are computed together.
+    """
+    data = request.get_json(silent=True) or {}
+    locations = data.get('locations')
+    include = data.get('include') or list(WEATHER_BATCH_PARTS)
+    
+    if not isinstance(locations, list) or not locations:
+        return jsonify({'error': 'locations must be a non-empty list of {"lat", "lon"} objects'}), 400
+    if len(locations) > WEATHER_BATCH_MAX_LOCATIONS:
+        return jsonify({'error': f'Too many locations. Maximum per request: {WEATHER_BATCH_MAX_LOCATIONS}'}), 400
+    if not isinstance(include, list) or not set(include) <= set(WEATHER_BATCH_PARTS):
+        return jsonify({'error': f'include must be a list drawn from {list(WEATHER_BATCH_PARTS)}'}), 400
+    
+    want_weather = 'current' in include or 'forecast' in include
+    want_historical = 'historical' in include
+    # Top-level start/end/days apply to every location unless it sets its own
+    default_range = {name: data[name] for name in ('start', 'end', 'days') if name in data}
+    
+    results = []
+    weather_cells = {}
+    history_requests = []
+    for index, location in enumerate(locations):
+        if not isinstance(location, dict):
+            location = {}
+        result = {'index': index, 'id': location.get('id', index), 'lat': location.get('lat'), 'lon': location.get('lon')}
+        results.append(result)
+        try:
+            cell = weather_cache.cell(location['lat'], location['lon'])
+            history_cell = grid_cell(location['lat'], location['lon'], HISTORICAL_GRID_PRECISION)
+        except (KeyError, TypeError, ValueError) as e:
+            result['error'] = f'Invalid coordinates: {e}'
+            continue
+        
+        if want_weather:
+            weather_cells[cell.key] = cell
+            result['_cell'] = cell.key
+        if want_historical:
+            try:
+                start, end = parse_history_range({**default_range, **{name: location[name] for name in ('start', 'end', 'days') if name in location}})
+                history_requests.append((result, history_cell, start, end))
+            except (TypeError, ValueError) as e:
+                result['historical_error'] = str(e)
+    
+    print(f"Weather batch: {len(locations)} locations, {len(weather_cells)} weather cells, "
+          f"{len({cell.key for _, cell, _, _ in history_requests})} historical cells")
+    
+    if weather_cells:
+        weather = fetch_weather_cells(weather_cells.values())
+        for result in results:
+            key = result.pop('_cell', None)
+            if key is None:
+                continue
+            if isinstance(weather[key], str):
+                result['weather_error'] = weather[key]
+                continue
+            response = build_weather_response(*weather[key], result['lat'], result['lon'])
+            for part in ('location', 'current', 'forecast'):
+                if part == 'location' or part in include:
+                    result[part] = response[part]
+    
+    if history_requests:
+        _, cells, starts, ends = zip(*history_requests)
+        stats = historical_store.summaries(cells, starts, ends)
+        for (result, cell, _, _), summary in zip(history_requests, summary_rows(stats, starts, ends)):
+            summary['grid_cell'] = cell.key
+            result['historical'] = summary
+    
+    return jsonify({
+        'results': results,
+        'count': len(results),
+        'weather_cells': len(weather_cells),
+        'historical_cells': len({cell.key for _, cell, _, _ in history_requests})
+    })
+
+AGRO_METRICS_MAX_ROWS = int(os.environ.get('AGRO_METRICS_MAX_ROWS', 5000))
+AGRO_METRICS_MAX_DAYS = int(os.environ.get('AGRO_METRICS_MAX_DAYS', 1096))
+
+def agro_metrics_rows(cells, crop_types, start, end, **options):
+    """Agro metrics for (cell, crop) rows over one date range; each distinct pair is computed once"""
+    pairs = {}
+    for cell, crop_type in zip(cells, crop_types):
+        pairs.setdefault((cell.key, crop_type.lower()), (cell, crop_type))
+    series = historical_store.daily_series([cell for cell, _ in pairs.values()], start, end)
+    rows = metric_rows(compute_metrics(series[:, 0], series[:, 1], series[:, 2],
+                                       [crop_type for _, crop_type in pairs.values()], **options))
+    by_pair = dict(zip(pairs, rows))
+    return [by_pair[(cell.key, crop_type.lower())] for cell, crop_type in zip(cells, crop_types)]
+
+def season_agro_metrics(location, crop_type, weather_summary):
+    """Agro metrics for one crop over the season a weather summary covers (default: the last 90 days), or None"""
+    season = {'start': weather_summary.get('start'), 'end': weather_summary.get('end'),
+              'days': weather_summary.get('period_days')}
+    try:
+        cell = grid_cell(location['lat'], location['lon'], HISTORICAL_GRID_PRECISION)
+        start, end = parse_history_range({name: value for name, value in season.items() if value})
+    except (KeyError, TypeError, ValueError):
+        return None
+    return agro_metrics_rows([cell], [crop_type], start, end)[0]
+
+@app.route('/api/agro-metrics', methods=['POST'])
+def get_agro_metrics():
+    """
+    Growing degree days, heat stress, chill hours, rainfall deficits and wet/dry spells
+    for many locations and crops over one date range.
+    Expected JSON input:
+    {
+        "locations": [{"id": "plot-1", "lat": 12.97, "lon": 77.59, "crop_type": "rice"}, ...],
+        "crops": ["wheat", "corn"],   # optional: every location x every crop
+        "start": "2025-06-01", "end": "2025-10-31",   # or "days"
+        "window_days": 30, "wet_day_mm": 1.0, "min_wet_spell_days": 3
+    }
+    """
+    data = request.get_json(silent=True) or {}
+    locations = data.get('locations')
+    crops = data.get('crops')
+
+    if not isinstance(locations, list) or not locations:
+        return jsonify({'error': 'locations must be a non-empty list of {"lat", "lon"} objects'}), 400
+    if crops is not None and (not isinstance(crops, list) or not crops):
+        return jsonify({'error': 'crops must be a non-empty list'}), 400
+
+    try:
+        start, end = parse_history_range(data)
+        if (end - start).days + 1 > AGRO_METRICS_MAX_DAYS:
+            raise ValueError(f'Date range too long. Maximum: {AGRO_METRICS_MAX_DAYS} days')
+        options = {'window_days': int(data.get('window_days', DEFICIT_WINDOW_DAYS)),
+                   'wet_day_mm': float(data.get('wet_day_mm', WET_DAY_MM)),
+                   'min_wet_spell_days': int(data.get('min_wet_spell_days', MIN_WET_SPELL_DAYS))}
+        if options['window_days'] < 1 or options['min_wet_spell_days'] < 1:
+            raise ValueError('window_days and min_wet_spell_days must be at least 1')
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': str(e)}), 400
+
+    results = []
+    rows = []
+    for index, location in enumerate(locations):
+        if not isinstance(location, dict):
+            location = {}
+        row_crops = crops or [location.get('crop_type')]
+        try:
+            cell = grid_cell(location['lat'], location['lon'], HISTORICAL_GRID_PRECISION)
+            if not all(isinstance(crop_type, str) and crop_type for crop_type in row_crops):
+                raise ValueError('crop_type required (per location or in crops)')
+        except (KeyError, TypeError, ValueError) as e:
+            results.append({'index': index, 'id': location.get('id', index), 'error': str(e)})
+            continue
+        for crop_type in row_crops:
+            result = {'index': index, 'id': location.get('id', index), 'lat': location['lat'], 'lon': location['lon'],
+                      'crop_type': crop_type, 'grid_cell': cell.key}
+            results.append(result)
+            rows.append((result, cell, crop_type))
+
+    if len(rows) > AGRO_METRICS_MAX_ROWS:
+        return jsonify({'error': f'Too many location x crop rows. Maximum per request: {AGRO_METRICS_MAX_ROWS}'}), 400
+
+    if rows:
+        started = time.perf_counter()
+        metrics = agro_metrics_rows([cell for _, cell, _ in rows], [crop_type for _, _, crop_type in rows],
+                                    start, end, **options)
+        for (result, _, _), row in zip(rows, metrics):
+            result.update(row)
+        print(f"Computed agro metrics for {len(rows)} rows over {(end - start).days + 1} days "
+              f"in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    return jsonify({'start': start.isoformat(), 'end': end.isoformat(), 'count': len(results), 'results': results})
+
 @app.route('/api/yield-prediction', methods=['POST'])
 def predict_yield():
     data = request.get_json()
@@ -532,28 +1389,29 @@ def predict_yield():
     health_status = data.get('health_status', 'good') # Example: 'good', 'average', 'poor'
     weather_summary = data.get('weather_summary') # From /api/historical-weather
 
-    if not all([crop_type, location, weather_summary]):
+    if not all([crop_type, location, weather_summary]) or not isinstance(weather_summary, dict):
         return jsonify({'error': 'Missing required data: crop_type, location, weather_summary'}), 400
 
+    try:
+        # Read like one row of the batch endpoint: nulls fall back to the ideal values
+        avg_max_temp = yield_batch_column(weather_summary, 'avg_max_temp_c', 1, IDEAL_MAX_TEMP_C, np.float64)
+        total_precip = yield_batch_column(weather_summary, 'total_precipitation_mm', 1, IDEAL_PRECIPITATION_MM, np.float64)
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': f'Invalid input: {e}'}), 400
+
     print(f"Predicting yield for: Crop={crop_type}, Loc={location}, Health={health_status}, Weather={weather_summary}")
 
     # --- Mock ML Model & Logic ---
-    # Base yield estimate (example values in tons/hectare)
-    base_yields = {'wheat': 4.5, 'corn': 11.0, 'rice': 6.0, 'soybean': 3.0}
-    base_yield = base_yields.get(crop_type.lower(), 5.0) # Default if crop unknown
-
-    # Adjust based on weather (simple example)
-    # Ideal temp ~25C, ideal precip ~300mm for 90 days
-    temp_factor = 1.0 - abs(weather_summary.get('avg_max_temp_c', 25) - 25) / 15 # Penalty for deviation from 25C
-    precip_factor = 1.0 + (weather_summary.get('total_precipitation_mm', 300) - 300) / 500 # Bonus/penalty based on precip
-    
-    weather_adjustment = max(0.5, min(1.5, temp_factor * precip_factor)) # Clamp adjustment
+    # Heat stress and rainfall deficits over the season, which the averages above hide
+    agro_metrics = season_agro_metrics(location, crop_type, weather_summary)
+    agro_factor = agro_metrics['yield_adjustment_factor'] if agro_metrics else 1.0
 
-    # Adjust based on health
-    health_factors = {'good': 1.0, 'average': 0.85, 'poor': 0.6}
-    health_adjustment = health_factors.get(health_status, 0.8)
-
-    predicted_yield = round(base_yield * weather_adjustment * health_adjustment, 2)
+    # Scored with the same vectorized model as the batch endpoint (yield_model.py), as a batch of one
+    scores = predict_yields([crop_type], [health_status], avg_max_temp, total_precip, [agro_factor])
+    base_yield = float(scores['base_yield'][0])
+    weather_factor = float(scores['weather_adjustment'][0])
+    health_adjustment = float(scores['health_adjustment'][0])
+    predicted_yield = float(scores['predicted_yield'][0])
 
     # Estimate harvest window (example logic)
     harvest_start_offset = random.randint(70, 90) # Days from now
@@ -563,9 +1421,9 @@ def predict_yield():
 
     # Storage recommendations (example logic)
     storage_recommendation = f"Requires cool, dry storage. Allocate space for approximately {predicted_yield} tons/hectare."
-    if predicted_yield > base_yields.get(crop_type.lower(), 5.0) * 1.1: # High yield
+    if predicted_yield > base_yield * HIGH_YIELD_RATIO: # High yield
         storage_recommendation += " Consider renting additional storage due to high predicted yield."
-    elif predicted_yield < base_yields.get(crop_type.lower(), 5.0) * 0.8: # Low yield
+    elif predicted_yield < base_yield * LOW_YIELD_RATIO: # Low yield
          storage_recommendation += " Less storage space may be needed than initially planned."
          
     # --- End Mock Logic ---
@@ -580,13 +1438,122 @@ def predict_yield():
         "factors_considered": {
             "crop_type": crop_type,
             "health_status": health_status,
-            "weather_adjustment_factor": round(weather_adjustment, 2),
-            "health_adjustment_factor": round(health_adjustment, 2)
+            "weather_adjustment_factor": round(weather_factor, 2),
+            "health_adjustment_factor": round(health_adjustment, 2),
+            "agro_adjustment_factor": round(agro_factor, 3),
+            "agro_metrics": agro_metrics
         }
     }
     print(f"Yield prediction result: {result}")
     return jsonify(result)
 
+YIELD_BATCH_MAX_ROWS = int(os.environ.get('YIELD_BATCH_MAX_ROWS', 200000))
+
+def yield_batch_column(data, name, count, default, dtype):
+    """Read one input column: a list of count values, a single value for every row, or missing (default)"""
+    values = data.get(name)
+    if values is None:
+        values = default
+    if not isinstance(values, list):
+        # np.full(..., dtype=str) would truncate strings to one character
+        values = [values] * count
+    if len(values) != count:
+        raise ValueError(f'{name} has {len(values)} values, expected {count}')
+    if any(isinstance(value, (list, dict)) for value in values):
+        raise ValueError(f'{name} must be a flat list of values')
+    if dtype is str and not all(isinstance(value, str) for value in values):
+        # np.array(..., dtype=str) would quietly turn numbers into text
+        raise ValueError(f'{name} must contain only strings')
+    column = np.array(values, dtype=dtype)
+    if dtype is np.float64:
+        # Nulls fall back to the default, as missing keys do for a single prediction
+        column[np.isnan(column)] = default
+    return column
+
+@app.route('/api/yield-prediction/batch', methods=['POST'])
+def predict_yield_batch():
+    """
+    Score many crop / health / weather combinations at once.
+    Expected JSON input (columns of equal length; a single value applies to every row):
+    {
+        "crop_type": ["wheat", "rice", ...],
+        "health_status": ["good", "poor", ...],
+        "avg_max_temp_c": [27.5, 31.0, ...],
+        "total_precipitation_mm": [250, 410, ...]
+    }
+    """
+    data = request.get_json(silent=True) or {}
+    crop_types = data.get('crop_type')
+    if not isinstance(crop_types, list) or not crop_types:
+        return jsonify({'error': 'crop_type must be a non-empty list'}), 400
+    count = len(crop_types)
+    if count > YIELD_BATCH_MAX_ROWS:
+        return jsonify({'error': f'Too many rows. Maximum per request: {YIELD_BATCH_MAX_ROWS}'}), 400
+
+    try:
+        crop_types = yield_batch_column(data, 'crop_type', count, None, str)
+        health_statuses = yield_batch_column(data, 'health_status', count, 'good', str)
+        avg_max_temp = yield_batch_column(data, 'avg_max_temp_c', count, IDEAL_MAX_TEMP_C, np.float64)
+        total_precip = yield_batch_column(data, 'total_precipitation_mm', count, IDEAL_PRECIPITATION_MM, np.float64)
+        # yield_adjustment_factor from /api/agro-metrics; 1.0 leaves yields unadjusted
+        agro_factor = yield_batch_column(data, 'agro_adjustment_factor', count, 1.0, np.float64)
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': f'Invalid input: {e}'}), 400
+
+    started = time.perf_counter()
+    results = predict_yields(crop_types, health_statuses, avg_max_temp, total_precip, agro_factor)
+    print(f"Scored {count} yield predictions in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    return jsonify({
+        'count': count,
+        'predicted_yield_tons_per_hectare': results['predicted_yield'].tolist(),
+        'weather_adjustment_factor': np.round(results['weather_adjustment'], 2).tolist(),
+        'health_adjustment_factor': np.round(results['health_adjustment'], 2).tolist(),
+        'agro_adjustment_factor': np.round(results['agro_adjustment'], 3).tolist(),
+        'storage_flag': STORAGE_FLAGS[results['storage_flag']].tolist()
+    })
+
+YIELD_SIMULATION_MAX_SAMPLES = int(os.environ.get('YIELD_SIMULATION_MAX_SAMPLES', 1000000))
+
+@app.route('/api/yield-prediction/simulate', methods=['POST'])
+def simulate_yield_risk():
+    """
+    Monte Carlo yield risk for one crop and location.
+    Expected JSON input: the /api/yield-prediction body, plus optional
+    samples, seed, threshold, bins, temp_sd_c, precipitation_cv and health_decline_probability.
+    With a location, the season's agro metrics adjust every sample as they adjust /api/yield-prediction.
+    """
+    data = request.get_json(silent=True) or {}
+    crop_type = data.get('crop_type')
+    weather_summary = data.get('weather_summary')
+
+    if not crop_type or not isinstance(weather_summary, dict):
+        return jsonify({'error': 'Missing required data: crop_type, weather_summary'}), 400
+
+    try:
+        samples = int(data.get('samples', 100000))
+        bins = int(data.get('bins', 20))
+        if not 1 <= samples <= YIELD_SIMULATION_MAX_SAMPLES:
+            raise ValueError(f'samples must be between 1 and {YIELD_SIMULATION_MAX_SAMPLES}')
+        if not 1 <= bins <= 200:
+            raise ValueError('bins must be between 1 and 200')
+        options = {name: float(data[name]) for name in ('threshold', 'temp_sd_c', 'precipitation_cv', 'health_decline_probability')
+                   if data.get(name) is not None}
+        seed = int(data['seed']) if data.get('seed') is not None else None
+
+        started = time.perf_counter()
+        agro_metrics = season_agro_metrics(data.get('location'), crop_type, weather_summary)
+        agro_factor = agro_metrics['yield_adjustment_factor'] if agro_metrics else 1.0
+        result = simulate_yield(crop_type, data.get('health_status', 'good'),
+                                float(weather_summary.get('avg_max_temp_c', IDEAL_MAX_TEMP_C)),
+                                float(weather_summary.get('total_precipitation_mm', IDEAL_PRECIPITATION_MM)),
+                                samples=samples, seed=seed, bins=bins, agro_adjustment=agro_factor, **options)
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': f'Invalid input: {e}'}), 400
+
+    result['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    return jsonify(result)
+
 @app.route('/api/disease-prediction', methods=['POST'])
 def predict_disease():
     """
@@ -597,27 +1564,35 @@ def predict_disease():
         "image_url": "url_to_image_or_base64",
         "severity": "low/medium/high" (optional)
     }
+    Query parameters:
+        timeline=full: also return the day-by-day treatment_timeline for each disease
+        format=ics: return the treatment phases as an iCalendar file instead of JSON
     """
     try:
         data = request.get_json()
         crop_type = data.get('crop_type', '').lower()
         severity = data.get('severity', 'medium').lower()
+        timeline = request.args.get('timeline', 'compact').lower()
+        export_format = request.args.get('format', 'json').lower()
         
         print(f"Disease prediction request: crop={crop_type}, severity={severity}")
         
         if not crop_type:
             return jsonify({"error": "Crop type is required"}), 400
+        if timeline not in ('compact', 'full'):
+            return jsonify({"error": "timeline must be 'compact' or 'full'"}), 400
+        if export_format not in ('json', 'ics'):
+            return jsonify({"error": "format must be 'json' or 'ics'"}), 400
             
-        # Load crop knowledge
-        with open(os.path.join(os.path.dirname(__file__), "crop_knowledge.json"), 'r') as f:
-            crop_knowledge = json.load(f)
+        # Crop knowledge is parsed once per process and indexed by crop and disease
+        knowledge = knowledge_base.snapshot()
         
-        if crop_type not in crop_knowledge.get('crops', {}):
+        if crop_type not in knowledge.diseases_by_crop:
             return jsonify({"error": f"Unknown crop type: {crop_type}"}), 400
         
         # Mock disease detection - in production, would use image analysis
         # Get possible diseases for this crop
-        possible_diseases = crop_knowledge['crops'][crop_type].get('diseases', [])
+        possible_diseases = knowledge.diseases_by_crop[crop_type]
         if not possible_diseases:
             return jsonify({"error": f"No known diseases for crop: {crop_type}"}), 400
         
@@ -632,75 +1607,21 @@ def predict_disease():
         duration_map = {"low": (3, 7), "medium": (7, 14), "high": (14, 28)}
         treatment_duration_days = random.randint(*duration_map.get(severity, (7, 14)))
         
-        # Generate timeline
-        today = datetime.now()
-        treatments = []
-        
-        # Common treatments indexed by disease
-        treatment_by_disease = {
-            "early blight": ["Apply copper-based fungicide", "Remove affected leaves", "Improve air circulation"],
-            "late blight": ["Apply fungicide with chlorothalonil", "Remove infected plants", "Increase plant spacing"],
-            "leaf mold": ["Apply sulfur fungicide", "Reduce humidity", "Increase ventilation"],
-            "septoria leaf spot": ["Apply copper fungicide", "Remove infected leaves", "Mulch around plants"],
-            "powdery mildew": ["Apply neem oil", "Use potassium bicarbonate spray", "Increase air circulation"],
-            "downy mildew": ["Apply copper-based fungicide", "Avoid overhead watering", "Thin out plants"],
-            "rust": ["Apply sulfur fungicide", "Remove infected plant parts", "Increase spacing"],
-            "bacterial spot": ["Apply copper spray", "Rotate crops", "Avoid overhead irrigation"],
-            "common rust": ["Apply fungicide", "Remove infected leaves", "Plant resistant varieties"],
-            "gray leaf spot": ["Apply fungicide", "Rotate crops", "Improve drainage"],
-            "northern corn leaf blight": ["Apply fungicide", "Rotate crops", "Plant resistant varieties"],
-            "apple scab": ["Apply fungicide", "Remove fallen leaves", "Prune for air circulation"],
-            "fire blight": ["Prune infected branches", "Apply copper spray", "Avoid high-nitrogen fertilizers"],
-            "cedar apple rust": ["Apply fungicide", "Remove galls from cedars", "Plant resistant varieties"],
-            "rice blast": ["Apply fungicide", "Drain fields", "Use resistant varieties"],
-            "bacterial leaf blight": ["Apply copper bactericide", "Drain fields", "Use disease-free seeds"],
-            "sheath blight": ["Apply fungicide", "Reduce nitrogen", "Lower seeding rate"],
-            "anthracnose": ["Apply copper fungicide", "Avoid overhead watering", "Remove infected plants"],
-            "phytophthora blight": ["Improve drainage", "Apply fungicide", "Rotate crops"],
-            "angular leaf spot": ["Apply copper fungicide", "Avoid overhead watering", "Rotate crops"],
-            "fusarium head blight": ["Apply fungicide at flowering", "Plant resistant varieties", "Rotate crops"],
-            "blackleg": ["Use certified seed", "Rotate crops", "Apply fungicide treatment"],
-            "common scab": ["Maintain soil pH below 5.5", "Avoid fresh manure", "Plant resistant varieties"]
-        }
-        
-        # Default treatment actions if disease not found in mapping
-        default_treatments = ["Apply appropriate fungicide", "Remove affected plant parts", "Improve growing conditions"]
+        # Treatment plans are phases (date ranges with one action each); the
+        # day-by-day timeline is only built when asked for
+        today = datetime.now().date()
         
         results = []
+        plans = []
         for i, disease in enumerate(detected_diseases):
-            disease_treatments = treatment_by_disease.get(disease, default_treatments)
-            
-            # Create a day-by-day treatment plan
-            timeline = []
-            for day in range(treatment_duration_days):
-                current_date = today + timedelta(days=day)
-                
-                # Assign appropriate actions for different stages
-                if day == 0:
-                    # First day always diagnose and start treatment
-                    action = "Diagnose and " + disease_treatments[0]
-                elif day < treatment_duration_days // 3:
-                    # First third of treatment period
-                    action = disease_treatments[min(0, len(disease_treatments)-1)]
-                elif day < treatment_duration_days * 2 // 3:
-                    # Middle third of treatment
-                    action = disease_treatments[min(1, len(disease_treatments)-1)]
-                else:
-                    # Final third of treatment
-                    action = disease_treatments[min(2, len(disease_treatments)-1)]
-                
-                timeline.append({
-                    "date": current_date.strftime("%Y-%m-%d"),
-                    "day": day + 1,
-                    "action": action,
-                    "completed": False
-                })
+            phases = treatment_phases(knowledge.treatments(disease), treatment_duration_days, today)
+            plans.append((disease, phases))
             
             results.append({
                 "disease": disease,
                 "confidence": confidence_scores[i],
                 "duration_days": treatment_duration_days,
-                "treatment_timeline": timeline,
+                "treatment_phases": phases,
                 "prevention": [
                     f"Practice crop rotation (avoid planting {crop_type} in the same location for 2-3 years)",
                     "Ensure good air circulation between plants",
@@ -708,12 +1629,19 @@ def predict_disease():
                     "Water at the base of plants to keep foliage dry"
                 ]
             })
+            if timeline == 'full':
+                results[-1]["treatment_timeline"] = expand_phases(phases, today)
+        
+        if export_format == 'ics':
+            print(f"Disease prediction complete: {len(results)} diseases detected (iCalendar)")
+            return Response(phases_to_ical(crop_type, plans), mimetype='text/calendar',
+                            headers={'Content-Disposition': f'attachment; filename="{crop_type}-treatment.ics"'})
         
         response = {
             "crop_type": crop_type,
-            "analysis_date": today.strftime("%Y-%m-%d"),
+            "analysis_date": today.isoformat(),
             "detected_diseases": results,
-            "care_instructions": crop_knowledge['crops'][crop_type].get('care', "Provide proper water and nutrients.")
+            "care_instructions": knowledge.care_by_crop[crop_type]
         }
         
         print(f"Disease prediction complete: {len(results)} diseases detected")
@@ -724,6 +1652,100 @@ def predict_disease():
         traceback.print_exc()
         return jsonify({"error": f"Failed to process request: {str(e)}"}), 500
 
+@app.route('/api/crop-knowledge', methods=['GET'])
+@response_encoder.etag
+def get_crop_knowledge():
+    """
+    Diseases, treatments and care advice from the crop knowledge base.
+    Query parameters:
+        crop: Only return this crop (optional)
+    """
+    knowledge = knowledge_base.snapshot()
+    crop = request.args.get('crop', '').lower()
+    if crop and crop not in knowledge.diseases_by_crop:
+        return jsonify({"error": f"Unknown crop type: {crop}"}), 404
+    
+    crops = [crop] if crop else list(knowledge.diseases_by_crop)
+    response = {
+        "crops": {
+            name: {
+                "care": knowledge.care_by_crop[name],
+                "diseases": [
+                    {"name": disease, "treatments": list(knowledge.treatments(disease)),
+                     "affected_crops": list(knowledge.crops_by_disease[disease])}
+                    for disease in knowledge.diseases_by_crop[name]
+                ]
+            }
+            for name in crops
+        }
+    }
+    if not crop:
+        response["general_care"] = knowledge.general_care
+    return jsonify(response)
+
+def timed_startup_phase(phase, fn):
+    """Run one startup step, recording how long it took and any error"""
+    started = time.perf_counter()
+    try:
+        result = fn()
+        if isinstance(result, tuple) and result and result[0] is False:
+            startup_errors[phase] = result[1]
+    except Exception as e:
+        print(f"Startup phase {phase} failed: {e}")
+        startup_errors[phase] = str(e)
+    startup_timings[phase] = time.perf_counter() - started
+
+def warm_up_models():
+    if not INFERENCE_SERVER:
+        timed_startup_phase('tensorflow_import', lambda: __import__('tensorflow'))
+    timed_startup_phase('crop_model', load_model_if_needed)
+    timed_startup_phase('soil_model', load_soil_model_if_needed)
+    log_startup_timings()
+
+def warm_up_chatbot():
+    timed_startup_phase('chatbot', get_chatbot)
+    timed_startup_phase('chat_cache', chat_cache.load)
+
+warmup_lock = threading.Lock()
+warmup_threads = []
+
+def start_background_warmup():
+    """Start loading the models (and the chatbot) in background threads, once per process"""
+    with warmup_lock:
+        if warmup_threads:
+            return
+        targets = [warm_up_models] + ([warm_up_chatbot] if CHATBOT_ENABLED else [])
+        for target in targets:
+            thread = threading.Thread(target=target, name=target.__name__, daemon=True)
+            thread.start()
+            warmup_threads.append(thread)
+
+def log_startup_timings():
+    breakdown = ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in startup_timings.items())
+    print(f"Startup timings: {breakdown}")
+
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    """Report whether the models are loaded and warm; /health only says the process is up"""
+    start_background_warmup()
+    models = {
+        name: 'ready' if models_loaded[name] else startup_errors.get(f'{name}_model', 'loading')
+        for name in ('crop', 'soil')
+    }
+    ready = all(models_loaded.values())
+    return jsonify({
+        'status': 'ready' if ready else 'warming up',
+        'models': models,
+        'chatbot': chatbot_status() if CHATBOT_ENABLED else 'disabled',
+        'uptime_seconds': round(time.perf_counter() - STARTUP_STARTED, 3),
+        'startup_timings': {phase: round(seconds, 3) for phase, seconds in startup_timings.items()}
+    }), 200 if ready else 503
+
+startup_timings['app_setup'] = time.perf_counter() - STARTUP_STARTED - startup_timings['imports']
+log_startup_timings()
+if STARTUP_MODE == 'background':
+    start_background_warmup()
+
 if __name__ == '__main__':
     # Create model directory if it doesn't exist
     Path(CROP_MODEL_PATH).mkdir(parents=True, exist_ok=True)
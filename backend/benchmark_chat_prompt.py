@@ -0,0 +1,109 @@
+import time
+import argparse
+import statistics
+from chat_prompt import PROMPT_MAX_TOKENS, PromptBuilder, estimate_tokens
+from knowledge_base import knowledge_base
+
+# Typical chat questions, from narrow to open-ended
+QUESTIONS = [
+    "How often should I water my tomatoes?",
+    "My potato leaves have dark spots, is it late blight?",
+    "What is the best fertilizer for corn?",
+    "How do I treat powdery mildew on cucumbers and keep pests away?",
+    "When should I prune apple trees and mulch them?",
+    "What diseases affect pepper plants?",
+    "How do I improve my soil?",
+    "My rice field has rice blast, what should I do?",
+    "Is it too late to plant wheat this season?",
+    "Hello, what can you help me with?",
+]
+
+
+def baseline_prompt(user_input, snapshot):
+    """The original _create_system_prompt: every crop and care topic, rebuilt for every message"""
+    crops_info = "\n".join([
+        f"- {crop}: Diseases: {', '.join(info['diseases'])}. Care: {info['care']}"
+        for crop, info in snapshot.crops.items()
+    ])
+
+    general_care = "\n".join([
+        f"- {topic.replace('_', ' ').title()}: {info}"
+        for topic, info in snapshot.general_care.items()
+    ])
+
+    return f"""You are an agricultural expert assistant for a Crop Monitoring App.
+Your role is to provide helpful advice about crop care, disease identification, and farming practices.
+
+KEY CROP INFORMATION:
+{crops_info}
+
+GENERAL CARE:
+{general_care}
+
+When responding to users:
+1. Be concise and practical in your advice
+2. Suggest relevant tips for crop health based on the user's question
+3. If you don't know something specific, acknowledge it and provide general best practices
+4. Focus on organic and sustainable farming practices when possible
+
+User Question: {user_input}
+
+Your helpful response:"""
+
+
+def time_per_call(build, questions, repeats):
+    """Mean microseconds per prompt"""
+    started = time.perf_counter()
+    for _ in range(repeats):
+        for question in questions:
+            build(question)
+    return (time.perf_counter() - started) * 1e6 / (repeats * len(questions))
+
+
+def benchmark(max_tokens, repeats, show):
+    """
+    Compare prompt size and build time of the full and the relevance-filtered prompt.
+
+    Args:
+        max_tokens: Token budget for the filtered prompt
+        repeats: Timed passes over the sample questions
+        show: Print the filtered prompt for each question
+    """
+    snapshot = knowledge_base.snapshot()
+    started = time.perf_counter()
+    builder = PromptBuilder(snapshot, max_tokens=max_tokens)
+    setup_ms = (time.perf_counter() - started) * 1000
+
+    print(f"{len(snapshot.crops)} crops, {len(snapshot.general_care)} care topics; "
+          f"token budget {max_tokens}; builder set up once in {setup_ms:.2f} ms\n")
+    print(f"{'question':<66}{'before':>8}{'after':>8}  selected")
+    before, after = [], []
+    for question in QUESTIONS:
+        full = estimate_tokens(baseline_prompt(question, snapshot))
+        filtered = builder.build(question)
+        crops, topics, diseases = builder.select(question)
+        before.append(full)
+        after.append(estimate_tokens(filtered))
+        print(f"{question[:64]:<66}{full:>8}{after[-1]:>8}  {', '.join(crops + topics + diseases) or '-'}")
+        if show:
+            print(f"\n{filtered}\n")
+
+    baseline_us = time_per_call(lambda q: baseline_prompt(q, snapshot), QUESTIONS, repeats)
+    filtered_us = time_per_call(builder.build, QUESTIONS, repeats)
+    print(f"\nestimated prompt tokens: mean {statistics.mean(before):.0f} -> {statistics.mean(after):.0f} "
+          f"({1 - sum(after) / sum(before):.0%} smaller), max {max(before)} -> {max(after)}")
+    print(f"build time per prompt: {baseline_us:.1f} us -> {filtered_us:.1f} us")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure chat prompt size and build time before and after relevance filtering")
+    parser.add_argument("--max_tokens", type=int, default=PROMPT_MAX_TOKENS,
+                        help="Token budget for the filtered prompt")
+    parser.add_argument("--repeats", type=int, default=2000,
+                        help="Timed passes over the sample questions")
+    parser.add_argument("--show", action="store_true",
+                        help="Print each filtered prompt")
+
+    args = parser.parse_args()
+
+    benchmark(args.max_tokens, args.repeats, args.show)
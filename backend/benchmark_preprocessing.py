@@ -0,0 +1,148 @@
+import io
+import os
+import time
+import tempfile
+import argparse
+import tracemalloc
+import multiprocessing
+import resource
+import numpy as np
+from PIL import Image
+from image_preprocessing import IMG_SIZE, BatchBuffer, decode_image
+
+# Typical phone camera resolutions (12 MP and 8 MP)
+PHONE_SIZES = [(4032, 3024), (3264, 2448)]
+
+
+def make_photo(width, height, seed):
+    """Build a camera-like JPEG: smooth gradients plus sensor-style noise"""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = np.stack([
+        128 + 90 * np.sin(x / (width / 3.0) + seed),
+        128 + 90 * np.cos(y / (height / 4.0)),
+        128 + 60 * np.sin((x + y) / (width / 5.0)),
+    ], axis=-1)
+    noisy = base + rng.normal(0, 12, base.shape).astype(np.float32)
+    buffer = io.BytesIO()
+    Image.fromarray(np.clip(noisy, 0, 255).astype(np.uint8)).save(buffer, format='JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def baseline_preprocess(data):
+    """The original analyze_crop / analyze_soil preprocessing"""
+    img = Image.open(io.BytesIO(data)).convert('RGB')
+    img = img.resize((IMG_SIZE, IMG_SIZE))
+    img_array = np.array(img) / 255.0
+    return np.expand_dims(img_array, axis=0)
+
+
+def make_optimized_preprocess():
+    collate = BatchBuffer()
+
+    def optimized_preprocess(data):
+        return collate([decode_image(io.BytesIO(data), size=IMG_SIZE)])
+
+    return optimized_preprocess
+
+
+def measure(preprocess, photos, repeats):
+    """Return (mean CPU ms per image, peak traced allocation per image in MB)"""
+    preprocess(photos[0])
+
+    started = time.process_time()
+    for _ in range(repeats):
+        for data in photos:
+            preprocess(data)
+    cpu_ms = (time.process_time() - started) * 1000.0 / (repeats * len(photos))
+
+    peaks = []
+    for data in photos:
+        tracemalloc.start()
+        preprocess(data)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return cpu_ms, max(peaks) / 1e6
+
+
+def _peak_rss_mb():
+    """High-water RSS of this process. VmHWM resets on exec; ru_maxrss would
+    still include the parent's footprint from before the spawn."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def _peak_rss(kind, paths, results):
+    preprocess = baseline_preprocess if kind == "baseline" else make_optimized_preprocess()
+    photos = []
+    for path in paths:
+        with open(path, "rb") as f:
+            photos.append(f.read())
+    before = _peak_rss_mb()
+    for data in photos:
+        preprocess(data)
+    results.put(_peak_rss_mb() - before)
+
+
+def measure_peak_rss(kind, photos):
+    """Peak resident memory growth in a fresh process (includes Pillow's own buffers)"""
+    with tempfile.TemporaryDirectory() as directory:
+        # Hand the photos over as files so building them doesn't inflate the child's peak
+        paths = []
+        for i, data in enumerate(photos):
+            paths.append(os.path.join(directory, f"photo_{i}.jpg"))
+            with open(paths[-1], "wb") as f:
+                f.write(data)
+
+        context = multiprocessing.get_context("spawn")
+        results = context.Queue()
+        process = context.Process(target=_peak_rss, args=(kind, paths, results))
+        process.start()
+        process.join()
+        return results.get() if not results.empty() else float("nan")
+
+
+def benchmark(count, repeats):
+    """
+    Compare per-image CPU time and peak allocation of the old and new preprocessing.
+
+    Args:
+        count: Number of synthetic photos per resolution
+        repeats: Timed passes over the photos
+    """
+    for width, height in PHONE_SIZES:
+        photos = [make_photo(width, height, seed) for seed in range(count)]
+        print(f"\n{width}x{height} JPEG ({len(photos[0]) / 1e6:.1f} MB encoded), {count} photos x {repeats} passes")
+
+        baseline_cpu, baseline_peak = measure(baseline_preprocess, photos, repeats)
+        optimized_cpu, optimized_peak = measure(make_optimized_preprocess(), photos, repeats)
+        baseline_rss = measure_peak_rss("baseline", photos)
+        optimized_rss = measure_peak_rss("optimized", photos)
+
+        print(f"  {'':<12}{'CPU ms/img':>12}{'traced peak MB':>16}{'RSS growth MB':>15}")
+        print(f"  {'before':<12}{baseline_cpu:>12.1f}{baseline_peak:>16.2f}{baseline_rss:>15.1f}")
+        print(f"  {'after':<12}{optimized_cpu:>12.1f}{optimized_peak:>16.2f}{optimized_rss:>15.1f}")
+        print(f"  speed-up {baseline_cpu / optimized_cpu:.1f}x")
+
+        # The two pipelines should agree closely; draft decoding changes pixels slightly
+        difference = np.abs(baseline_preprocess(photos[0]).astype(np.float32) -
+                            make_optimized_preprocess()(photos[0])).mean()
+        print(f"  mean absolute pixel difference: {difference:.4f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Microbenchmark image preprocessing on phone-camera-sized JPEGs")
+    parser.add_argument("--count", type=int, default=5,
+                        help="Synthetic photos per resolution")
+    parser.add_argument("--repeats", type=int, default=3,
+                        help="Timed passes over the photos")
+
+    args = parser.parse_args()
+
+    benchmark(args.count, args.repeats)
@@ -0,0 +1,98 @@
+import os
+import time
+import argparse
+import numpy as np
+import tensorflow as tf
+from image_preprocessing import IMG_SIZE, decode_image, normalize
+from model_serving import ServingModel, DEFAULT_BATCH_BUCKETS
+
+
+def load_images(data_path, limit=None):
+    """Load and preprocess every image under data_path the same way app.py does"""
+    images = []
+    for root, _, files in sorted(os.walk(data_path)):
+        for name in sorted(files):
+            if name.lower().endswith(('.png', '.jpg', '.jpeg')):
+                images.append(normalize(decode_image(os.path.join(root, name), size=IMG_SIZE)))
+    if limit:
+        images = images[:limit]
+    return np.stack(images).astype(np.float32)
+
+
+def time_calls(fn, batches):
+    """Return per-call latencies in milliseconds"""
+    latencies = []
+    for batch in batches:
+        started = time.perf_counter()
+        fn(batch)
+        latencies.append((time.perf_counter() - started) * 1000.0)
+    return np.array(latencies)
+
+
+def summarize(label, latencies, images_per_call):
+    print(f"  {label:<28} p50={np.percentile(latencies, 50):8.2f} ms  "
+          f"p95={np.percentile(latencies, 95):8.2f} ms  "
+          f"mean={latencies.mean():8.2f} ms  "
+          f"images/s={images_per_call * 1000.0 / latencies.mean():8.1f}")
+
+
+def benchmark(model_path, data_path, batch_size, repeats):
+    """
+    Compare Model.predict against the pre-traced serving path on a dataset.
+
+    Args:
+        model_path: Path to a SavedModel directory
+        data_path: Directory of test images (class sub-folders are fine)
+        batch_size: Batch size for the batched comparison
+        repeats: How many passes over the images to time
+    """
+    images = load_images(data_path)
+    print(f"Loaded {len(images)} images from {data_path}")
+
+    # Cold start: first call after loading, including tracing
+    model = tf.keras.models.load_model(model_path)
+    started = time.perf_counter()
+    model.predict(images[:1], verbose=0)
+    keras_cold = (time.perf_counter() - started) * 1000.0
+
+    started = time.perf_counter()
+    serving_model = ServingModel(model, name="benchmark", batch_buckets=DEFAULT_BATCH_BUCKETS)
+    serving_model.warmup()
+    warmup_time = (time.perf_counter() - started) * 1000.0
+    started = time.perf_counter()
+    serving_model.predict(images[:1])
+    serving_cold = (time.perf_counter() - started) * 1000.0
+
+    # Check both paths agree before timing them
+    reference = model.predict(images[:8], verbose=0)
+    max_diff = float(np.max(np.abs(reference - serving_model.predict(images[:8]))))
+
+    singles = [images[i:i + 1] for i in range(len(images))] * repeats
+    batches = [images[i:i + batch_size] for i in range(0, len(images), batch_size)] * repeats
+
+    print("\nFirst request after load:")
+    print(f"  Model.predict                {keras_cold:8.2f} ms")
+    print(f"  ServingModel (pre-warmed)    {serving_cold:8.2f} ms  (tracing + warm-up at load: {warmup_time:.0f} ms)")
+    print(f"\nSingle-image requests ({len(singles)} calls):")
+    summarize("Model.predict", time_calls(lambda b: model.predict(b, verbose=0), singles), 1)
+    summarize("ServingModel.predict", time_calls(serving_model.predict, singles), 1)
+    print(f"\nBatches of {batch_size} ({len(batches)} calls):")
+    summarize("Model.predict", time_calls(lambda b: model.predict(b, verbose=0), batches), batch_size)
+    summarize("ServingModel.predict", time_calls(serving_model.predict, batches), batch_size)
+    print(f"\nMax absolute difference between outputs: {max_diff:.2e}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark Model.predict against the compiled serving path")
+    parser.add_argument("--model_path", type=str, default="models/crop_health_model",
+                        help="Path to the SavedModel to benchmark")
+    parser.add_argument("--data_path", type=str, default="../Dataset/test",
+                        help="Directory of images to run through the model")
+    parser.add_argument("--batch_size", type=int, default=8,
+                        help="Batch size for the batched comparison")
+    parser.add_argument("--repeats", type=int, default=3,
+                        help="Number of passes over the images")
+
+    args = parser.parse_args()
+
+    benchmark(args.model_path, args.data_path, args.batch_size, args.repeats)
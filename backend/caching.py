@@ -0,0 +1,213 @@
+import hashlib
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import numpy as np
+
+# Rough bookkeeping cost of one entry (key, OrderedDict node, expiry), added to
+# the size of the value when enforcing the memory cap
+ENTRY_OVERHEAD_BYTES = 200
+
+
+def approximate_size(value):
+    """Estimate how many bytes a cached value holds"""
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (str, bytes)):
+        return sys.getsizeof(value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(approximate_size(k) + approximate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(approximate_size(item) for item in value)
+    return sys.getsizeof(value)
+
+
+class TTLCache:
+    """Thread-safe LRU cache with per-entry TTL and an overall memory cap"""
+
+    def __init__(self, max_entries=10000, max_bytes=32 * 1024 * 1024, ttl_seconds=3600, size_fn=approximate_size):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.size_fn = size_fn
+
+        self._entries = OrderedDict()  # key -> (value, expires_at, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        """Return the cached value, or default if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires_at, size = entry
+            if expires_at <= time.monotonic():
+                self._remove(key, size)
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def peek(self, key, default=None):
+        """Like get(), but without touching recency or the hit/miss counters"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.monotonic():
+                return default
+            return entry[0]
+
+    def put(self, key, value, ttl_seconds=None):
+        """Store a value, evicting least recently used entries to stay within limits"""
+        size = self.size_fn(value) + ENTRY_OVERHEAD_BYTES
+        if size > self.max_bytes:
+            return
+        expires_at = time.monotonic() + (self.ttl_seconds if ttl_seconds is None else ttl_seconds)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._entries[key] = (value, expires_at, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    def _remove(self, key, size):
+        del self._entries[key]
+        self._bytes -= size
+
+
+class SingleFlight:
+    """Make concurrent calls for the same key share one execution.
+
+    The first caller for a key runs the function; callers that arrive while it
+    is running wait for and receive the same result (or exception).
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+                self.executions += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "executions": self.executions,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._calls),
+            }
+
+
+class PredictionCache:
+    """Cache model outputs by the hash of the uploaded image bytes and the model version.
+
+    Re-uploads of the same photo are answered without decoding or running the
+    model, and identical uploads that arrive together share one computation.
+    """
+
+    def __init__(self, max_entries=10000, max_bytes=32 * 1024 * 1024, ttl_seconds=3600, enabled=True):
+        self.enabled = enabled
+        self.cache = TTLCache(max_entries=max_entries, max_bytes=max_bytes, ttl_seconds=ttl_seconds)
+        self.single_flight = SingleFlight()
+
+    @staticmethod
+    def key_for(kind, model_version, image_bytes):
+        """Build the cache key for one image under one model"""
+        digest = hashlib.blake2b(image_bytes, digest_size=16).hexdigest()
+        return f"{kind}:{model_version}:{digest}"
+
+    def get(self, key):
+        return self.cache.get(key) if self.enabled else None
+
+    def put(self, key, value):
+        if self.enabled:
+            self.cache.put(key, value)
+
+    def get_or_compute(self, key, compute):
+        """Return the cached prediction for key, computing it at most once across concurrent callers"""
+        if not self.enabled:
+            return compute()
+
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        def compute_and_store():
+            # Another leader may have stored it between our miss and now
+            cached = self.cache.peek(key)
+            if cached is not None:
+                return cached
+            value = compute()
+            self.cache.put(key, value)
+            return value
+
+        return self.single_flight.do(key, compute_and_store)
+
+    def stats(self):
+        stats = self.cache.stats()
+        stats["enabled"] = self.enabled
+        stats["single_flight"] = self.single_flight.stats()
+        return stats
@@ -0,0 +1,282 @@
+import math
+import re
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+import numpy as np
+
+from chat_prompt import stem
+
+# Dropped before matching: they rarely change what is being asked. Question
+# words (how, when, why, ...) and negations are kept on purpose.
+FILLER_WORDS = frozenset("""
+a an the i my me we our you your please can could would should do does did is are am be to of for in on at
+about with some any hi hello hey thanks thank plants crops
+""".split())
+
+NON_WORD = re.compile(r"[^a-z0-9\s]+")
+
+
+def normalize_query(text):
+    """Lowercase, strip punctuation and filler words, and stem what is left"""
+    words = NON_WORD.sub(" ", text.lower()).split()
+    return " ".join(stem(word) for word in words if word not in FILLER_WORDS)
+
+
+# Terms kept per cached question (the heaviest ones); longer questions are rare in chat
+MAX_TERMS = 32
+
+
+class _Postings:
+    """Entries containing one hashed term: parallel slot and entry id arrays, appended to in place"""
+    __slots__ = ("slots", "ids", "live")
+
+    def __init__(self):
+        self.slots = array("i")
+        self.ids = array("q")
+        self.live = 0
+
+
+class SemanticChatCache:
+    """Chat answers reused for questions that mean the same thing.
+
+    Questions are normalized, split into word unigrams and bigrams by
+    scikit-learn's analyzer and hashed into a fixed feature space. Each is
+    weighted by sublinear TF times the IDF of the cached questions at the
+    time it is stored, then L2-normalized. An answer is reused when the
+    cosine similarity to a cached question reaches ``threshold``; identical
+    normalized questions skip the vector math.
+
+    Lookups never scan the whole cache. A cached question that shares none
+    of the query's heaviest terms can score at most the norm of the query's
+    remaining weights (Cauchy-Schwarz), so only the postings of the fewest
+    heaviest terms that push that bound under the threshold are gathered
+    from an inverted index. Those are the rarest terms, with short lists.
+    The candidates' stored vectors (at most MAX_TERMS each, kept in one
+    array) are then scored exactly in a single numpy pass.
+
+    Entries live in fixed slots with an LRU order and a TTL. Evicted
+    entries leave stale postings behind; they are filtered out by entry id
+    and compacted once they make up half of a term's list.
+    """
+
+    def __init__(self, max_entries=20000, ttl_seconds=24 * 3600, threshold=0.85, n_features=2 ** 20, enabled=True):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.threshold = threshold
+        self.n_features = n_features
+        self.enabled = enabled
+
+        self._analyzer = None
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()      # entry id -> (slot, normalized, value, expires_at, features)
+        self._exact = {}                   # normalized question -> entry id
+        self._postings = {}                # hashed term -> _Postings
+        self._document_frequency = {}      # hashed term -> live entries containing it
+        self._slot_entry = np.full(max_entries, -1, dtype=np.int64)
+        # Stored vectors, one row per slot, padded with feature -1 / weight 0
+        self._slot_features = np.full((max_entries, MAX_TERMS), -1, dtype=np.int32)
+        self._slot_weights = np.zeros((max_entries, MAX_TERMS), dtype=np.float32)
+        self._free_slots = list(range(max_entries - 1, -1, -1))
+        self._next_id = 0
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.lookup_seconds = 0.0
+
+    def load(self):
+        """Import scikit-learn and build the analyzer (about a second, so done at warm-up rather than on a request)"""
+        if self._analyzer is None:
+            from sklearn.feature_extraction.text import HashingVectorizer
+            from sklearn.utils import murmurhash3_32
+            analyzer = HashingVectorizer(ngram_range=(1, 2), lowercase=False).build_analyzer()
+            self._hash = murmurhash3_32
+            self._analyzer = analyzer
+
+    def get(self, question):
+        """Return (value, similarity) for the closest cached question, or (None, best candidate's similarity)"""
+        if not self.enabled:
+            return None, 0.0
+        self.load()
+        started = time.perf_counter()
+        normalized = normalize_query(question)
+        counts = self._term_counts(normalized)
+        with self._lock:
+            try:
+                entry_id = self._exact.get(normalized)
+                if entry_id is not None and self._fresh(entry_id):
+                    self.exact_hits += 1
+                    return self._touch(entry_id), 1.0
+
+                slot, similarity = self._best_match(self._weigh(counts))
+                if slot is not None and similarity >= self.threshold and self._fresh(int(self._slot_entry[slot])):
+                    self.semantic_hits += 1
+                    return self._touch(int(self._slot_entry[slot])), round(similarity, 4)
+                self.misses += 1
+                return None, round(similarity, 4)
+            finally:
+                self.lookup_seconds += time.perf_counter() - started
+
+    def put(self, question, value):
+        """Cache an answer, evicting the least recently used entry when full"""
+        if not self.enabled:
+            return
+        normalized = normalize_query(question)
+        counts = self._term_counts(normalized)
+        if not counts:
+            return
+        with self._lock:
+            entry_id = self._exact.get(normalized)
+            if entry_id is not None:
+                self._remove(entry_id)
+            while len(self._entries) >= self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+            if len(counts) > MAX_TERMS:
+                features, weights = self._weigh(counts)
+                counts = {f: counts[f] for _, f in sorted(zip(weights, features), reverse=True)[:MAX_TERMS]}
+            features, weights = self._weigh(counts, adding=True)
+            slot = self._free_slots.pop()
+            entry_id = self._next_id
+            self._next_id += 1
+            self._slot_entry[slot] = entry_id
+            self._slot_features[slot] = -1
+            self._slot_features[slot, :len(features)] = features
+            self._slot_weights[slot] = 0.0
+            self._slot_weights[slot, :len(weights)] = weights
+            self._entries[entry_id] = (slot, normalized, value, time.monotonic() + self.ttl_seconds, features)
+            self._exact[normalized] = entry_id
+            for feature in features:
+                postings = self._postings.get(feature)
+                if postings is None:
+                    postings = self._postings[feature] = _Postings()
+                postings.slots.append(slot)
+                postings.ids.append(entry_id)
+                postings.live += 1
+
+    def clear(self):
+        with self._lock:
+            for entry_id in list(self._entries):
+                self._remove(entry_id)
+
+    def stats(self):
+        with self._lock:
+            hits = self.exact_hits + self.semantic_hits
+            lookups = hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "terms": len(self._postings),
+                "threshold": self.threshold,
+                "ttl_seconds": self.ttl_seconds,
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "mean_lookup_us": round(self.lookup_seconds / lookups * 1e6, 1) if lookups else None,
+            }
+
+    def _term_counts(self, normalized):
+        """Hashed unigram and bigram counts of a normalized question"""
+        self.load()
+        counts = {}
+        for term in self._analyzer(normalized):
+            feature = self._hash(term, positive=True) % self.n_features
+            counts[feature] = counts.get(feature, 0) + 1
+        return counts
+
+    def _weigh(self, counts, adding=False):
+        """TF-IDF weights against the entries cached now, L2-normalized; adding counts the new entry in"""
+        if adding:
+            for feature in counts:
+                self._document_frequency[feature] = self._document_frequency.get(feature, 0) + 1
+        documents = len(self._entries) + (1 if adding else 0)
+        features = list(counts)
+        weights = [(1.0 + math.log(counts[f])) * (math.log((1 + documents) / (1 + self._document_frequency.get(f, 0))) + 1.0)
+                   for f in features]
+        norm = math.sqrt(sum(w * w for w in weights)) or 1.0
+        return features, [w / norm for w in weights]
+
+    def _best_match(self, vector):
+        """Return (slot, cosine similarity) of the best candidate, or (None, 0.0) if no candidate can reach the threshold"""
+        features, weights = vector
+        if not features:
+            return None, 0.0
+        features = np.array(features, dtype=np.int32)
+        weights = np.array(weights, dtype=np.float32)
+        order = np.argsort(-weights)
+        # Squared norm of the query left over after each prefix of its heaviest terms
+        remaining = 1.0 - np.cumsum(weights[order] ** 2)
+        needed = int(np.argmax(remaining < self.threshold ** 2)) + 1 if (remaining < self.threshold ** 2).any() else len(order)
+
+        candidates = []
+        for feature in features[order[:needed]].tolist():
+            postings = self._postings.get(feature)
+            if postings is None:
+                continue
+            slots = np.frombuffer(postings.slots, dtype=np.int32)
+            candidates.append(slots[self._slot_entry[slots] == np.frombuffer(postings.ids, dtype=np.int64)])
+        if not candidates:
+            return None, 0.0
+        candidates = np.unique(np.concatenate(candidates))
+        if not len(candidates):
+            return None, 0.0
+
+        # Dot product of each candidate's stored terms with the query, matched by binary search
+        sorted_at = np.argsort(features)
+        query_features, query_weights = features[sorted_at], weights[sorted_at]
+        stored = self._slot_features[candidates]
+        position = np.minimum(np.searchsorted(query_features, stored), len(query_features) - 1)
+        matched = query_features[position] == stored
+        scores = (self._slot_weights[candidates] * np.where(matched, query_weights[position], 0.0)).sum(axis=1)
+        best = int(np.argmax(scores))
+        return int(candidates[best]), float(scores[best])
+
+    def _fresh(self, entry_id):
+        entry = self._entries.get(entry_id)
+        if entry is None:
+            return False
+        if entry[3] <= time.monotonic():
+            self._remove(entry_id)
+            self.expirations += 1
+            return False
+        return True
+
+    def _touch(self, entry_id):
+        self._entries.move_to_end(entry_id)
+        return self._entries[entry_id][2]
+
+    def _remove(self, entry_id):
+        slot, normalized, _, _, features = self._entries.pop(entry_id)
+        self._slot_entry[slot] = -1
+        self._free_slots.append(slot)
+        if self._exact.get(normalized) == entry_id:
+            del self._exact[normalized]
+        for feature in features:
+            frequency = self._document_frequency[feature] - 1
+            if frequency:
+                self._document_frequency[feature] = frequency
+            else:
+                del self._document_frequency[feature]
+            postings = self._postings[feature]
+            postings.live -= 1
+            if postings.live == 0:
+                del self._postings[feature]
+            elif postings.live * 2 < len(postings.slots):
+                self._compact(postings)
+
+    def _compact(self, postings):
+        slots = np.frombuffer(postings.slots, dtype=np.int32)
+        valid = self._slot_entry[slots] == np.frombuffer(postings.ids, dtype=np.int64)
+        kept = np.flatnonzero(valid)
+        postings.slots = array("i", slots[kept].tobytes())
+        postings.ids = array("q", np.frombuffer(postings.ids, dtype=np.int64)[kept].tobytes())
@@ -0,0 +1,204 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+
+class QueueDeadlineExceeded(Exception):
+    """A queued remote call was dropped because it waited past its deadline"""
+
+
+class ChatOrchestrator:
+    """Bounded, latency-budgeted calls to the remote chatbot with a local fallback.
+
+    Requests are queued by ``respond``. A dispatcher thread starts each one
+    once a slot of the ``max_concurrency`` semaphore is free, oldest first;
+    calls still queued ``queue_timeout`` seconds after they arrived are
+    dropped instead of spending quota on answers nobody may wait for. When
+    the queue is full, or no answer arrives within ``budget_seconds``, the
+    caller gets the fallback answer right away. A call that is already
+    queued or running carries on in the background, and its answer is
+    handed to ``on_result`` (which puts it in the chat cache), so the next
+    person asking the same question gets the remote answer.
+    """
+
+    def __init__(self, remote_fn, fallback_fn, on_result=None, max_concurrency=4, max_queue=32,
+                 queue_timeout=20.0, budget_seconds=5.0):
+        """
+        Args:
+            remote_fn: Callable taking the message and returning a response dict with a ``source``
+            fallback_fn: Callable taking the message and returning the local answer text
+            on_result: Called with (message, response) for every remote answer, even late ones
+            max_concurrency: Most remote calls in flight at once
+            max_queue: Most calls waiting for a slot; more are answered by the fallback
+            queue_timeout: Seconds a call may wait for a slot before it is dropped
+            budget_seconds: Seconds a caller waits for the remote answer before getting the fallback
+        """
+        self.remote_fn = remote_fn
+        self.fallback_fn = fallback_fn
+        self.on_result = on_result
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.max_queue = max(0, int(max_queue))
+        self.queue_timeout = float(queue_timeout)
+        self.budget = float(budget_seconds)
+
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._dispatcher = None
+        self._pool = None
+
+        # Stats
+        self._requests = 0
+        self._remote_answers = 0
+        self._fallbacks = {"budget": 0, "overloaded": 0, "expired": 0, "error": 0}
+        self._background_answers = 0
+        self._expired = 0
+        self._in_flight = 0
+        self._max_queue_depth = 0
+        self._remote_calls = 0
+        self._total_queue_wait = 0.0
+        self._total_remote_time = 0.0
+
+    def respond(self, message):
+        """Return the remote answer if it arrives within the budget, the fallback answer otherwise"""
+        started = time.perf_counter()
+        with self._cond:
+            self._requests += 1
+        future = self.submit(message)
+        if future is None:
+            return self._fallback(message, "overloaded")
+
+        try:
+            response = future.result(timeout=self.budget)
+        except FutureTimeoutError:
+            # Left running: its answer still reaches on_result
+            with self._cond:
+                future.abandoned = True
+            return self._fallback(message, "budget")
+        except QueueDeadlineExceeded:
+            return self._fallback(message, "expired")
+        except Exception as e:
+            print(f"Error generating remote chatbot response: {e}")
+            return self._fallback(message, "error")
+
+        if response.get("source") == "error":
+            return self._fallback(message, "error")
+        with self._cond:
+            self._remote_answers += 1
+        response = dict(response)
+        response["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return response
+
+    def submit(self, message):
+        """Queue one remote call and return a Future for its response, or None if the queue is full"""
+        future = Future()
+        future.abandoned = False
+        with self._cond:
+            if len(self._queue) >= self.max_queue:
+                return None
+            self._ensure_dispatcher()
+            self._queue.append((message, future, time.perf_counter()))
+            self._max_queue_depth = max(self._max_queue_depth, len(self._queue))
+            self._cond.notify()
+        return future
+
+    def acquire_slot(self, timeout):
+        """Take a concurrency slot for a call made outside the queue (streaming); True if one was free in time"""
+        if not self._slots.acquire(timeout=timeout):
+            return False
+        with self._cond:
+            self._in_flight += 1
+        return True
+
+    def release_slot(self):
+        with self._cond:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def stats(self):
+        """Return fallback shares, queue depth and remote call timings"""
+        with self._cond:
+            fallbacks = sum(self._fallbacks.values())
+            answered = self._remote_answers + fallbacks
+            calls = self._remote_calls
+            return {
+                "max_concurrency": self.max_concurrency,
+                "max_queue": self.max_queue,
+                "queue_timeout_s": self.queue_timeout,
+                "budget_s": self.budget,
+                "in_flight": self._in_flight,
+                "queue_depth": len(self._queue),
+                "max_queue_depth": self._max_queue_depth,
+                "requests": self._requests,
+                "remote_answers": self._remote_answers,
+                "fallbacks": dict(self._fallbacks),
+                "fallback_share": round(fallbacks / answered, 4) if answered else None,
+                "background_answers": self._background_answers,
+                "expired": self._expired,
+                "avg_queue_wait_ms": round(self._total_queue_wait / calls * 1000.0, 1) if calls else 0.0,
+                "avg_remote_ms": round(self._total_remote_time / calls * 1000.0, 1) if calls else 0.0,
+            }
+
+    def _fallback(self, message, reason):
+        with self._cond:
+            self._fallbacks[reason] += 1
+        return {"response": self.fallback_fn(message), "source": "simple-chatbot", "fallback_reason": reason}
+
+    def _ensure_dispatcher(self):
+        # Started lazily so that each forked gunicorn worker gets its own threads
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="chat-remote")
+        if self._dispatcher is None or not self._dispatcher.is_alive():
+            self._dispatcher = threading.Thread(target=self._dispatch, name="chat-dispatcher", daemon=True)
+            self._dispatcher.start()
+
+    def _dispatch(self):
+        while True:
+            # Wait for work before taking a slot, so an idle dispatcher holds none.
+            # The oldest call stays queued (and counted) until it gets a slot or
+            # its deadline passes; only this thread ever pops the queue.
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                message, future, enqueued = self._queue[0]
+            remaining = enqueued + self.queue_timeout - time.perf_counter()
+            acquired = remaining > 0 and self._slots.acquire(timeout=remaining)
+            with self._cond:
+                self._queue.popleft()
+                waited = time.perf_counter() - enqueued
+                if acquired:
+                    self._in_flight += 1
+                    self._total_queue_wait += waited
+                else:
+                    self._expired += 1
+            if not acquired:
+                future.set_exception(QueueDeadlineExceeded(f"waited {waited:.1f}s for a chatbot slot"))
+                continue
+            self._pool.submit(self._call, message, future)
+
+    def _call(self, message, future):
+        started = time.perf_counter()
+        try:
+            response = self.remote_fn(message)
+        except Exception as e:
+            response = None
+            future.set_exception(e)
+        finally:
+            with self._cond:
+                self._in_flight -= 1
+                self._remote_calls += 1
+                self._total_remote_time += time.perf_counter() - started
+            self._slots.release()
+
+        if response is None:
+            return
+        future.set_result(response)
+        if self.on_result is not None:
+            try:
+                self.on_result(message, response)
+            except Exception as e:
+                print(f"Error handling remote chatbot response: {e}")
+        with self._cond:
+            if future.abandoned and response.get("source") != "error":
+                self._background_answers += 1
@@ -0,0 +1,195 @@
+import os
+import re
+import threading
+from functools import lru_cache
+
+from knowledge_base import knowledge_base
+
+# Upper bound on the prompt sent to Gemini, in estimated tokens (about 4 characters each)
+PROMPT_MAX_TOKENS = int(os.getenv("CHAT_PROMPT_MAX_TOKENS", 600))
+PROMPT_MAX_CROPS = int(os.getenv("CHAT_PROMPT_MAX_CROPS", 3))
+PROMPT_MAX_TOPICS = int(os.getenv("CHAT_PROMPT_MAX_TOPICS", 2))
+CHARS_PER_TOKEN = 4
+
+PROMPT_HEADER = """You are an agricultural expert assistant for a Crop Monitoring App.
+Your role is to provide helpful advice about crop care, disease identification, and farming practices.
+"""
+
+PROMPT_FOOTER = """
+When responding to users:
+1. Be concise and practical in your advice
+2. Suggest relevant tips for crop health based on the user's question
+3. If you don't know something specific, acknowledge it and provide general best practices
+4. Focus on organic and sustainable farming practices when possible
+
+User Question: {user_input}
+
+Your helpful response:"""
+
+# Words too common to say anything about which crop or topic a question is about
+STOPWORDS = frozenset("""
+a an and are as at be best by can do does for from get how i in is it its keep my of on or should the their
+them they this to what when where which who why will with you your plant plants crop crops grow growing
+""".split())
+
+WORD_PATTERN = re.compile(r"[a-z]+")
+
+# Match weights: naming a crop or a care topic outright counts most
+CROP_NAME_WEIGHT = 3.0
+DISEASE_NAME_WEIGHT = 2.0
+DISEASE_WORD_WEIGHT = 1.0
+TOPIC_NAME_WEIGHT = 3.0
+TOPIC_WORD_WEIGHT = 0.5
+# Matches scoring under MIN_SCORE (one stray word of a care tip), or under
+# RELEVANCE_RATIO of the best match of their kind, are left out
+MIN_SCORE = 1.0
+RELEVANCE_RATIO = 0.5
+
+
+@lru_cache(maxsize=8192)
+def stem(word):
+    """Crude suffix stripping, enough to match "tomatoes" to "tomato" and "fertilizing" to "fertilizer" """
+    if word.endswith(("oes", "sses", "xes", "ches", "shes")):
+        word = word[:-2]
+    elif word.endswith("s") and not word.endswith("ss") and len(word) > 3:
+        word = word[:-1]
+    for suffixes in (("ing", "ed"), ("er",)):
+        for suffix in suffixes:
+            if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+                word = word[:-len(suffix)]
+                break
+    # "prune" and "pruning" both become "prun"
+    if word.endswith("e") and len(word) > 4:
+        word = word[:-1]
+    return word
+
+
+def terms(text):
+    """Stemmed content words of a text"""
+    return [stem(word) for word in WORD_PATTERN.findall(text.lower()) if word not in STOPWORDS]
+
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+class PromptBuilder:
+    """Builds relevance-filtered chat prompts from one KnowledgeSnapshot.
+
+    Every line a prompt can contain is rendered once, up front, together
+    with an inverted index from stemmed terms to the crops and care topics
+    they point at. Building a prompt is then a few dictionary lookups: score
+    the question's terms, keep the best crops and topics, and add their
+    lines while they fit the token budget.
+    """
+
+    def __init__(self, snapshot, max_tokens=PROMPT_MAX_TOKENS, max_crops=PROMPT_MAX_CROPS,
+                 max_topics=PROMPT_MAX_TOPICS):
+        self.snapshot = snapshot
+        self.max_tokens = max_tokens
+        self.max_crops = max_crops
+        self.max_topics = max_topics
+
+        self.crop_lines = {
+            crop: f"- {crop}: Diseases: {', '.join(diseases)}. Care: {snapshot.care_by_crop[crop]}"
+            for crop, diseases in snapshot.diseases_by_crop.items()
+        }
+        self.topic_lines = {
+            topic: f"- {topic.replace('_', ' ').title()}: {info}"
+            for topic, info in snapshot.general_care.items()
+        }
+        self.treatment_lines = {
+            disease: f"- {disease.capitalize()}: {'; '.join(snapshot.treatments(disease))}"
+            for disease in snapshot.crops_by_disease
+        }
+        # Named when no crop matches, so the model still knows what the app covers
+        self.crops_covered = f"Crops covered: {', '.join(self.crop_lines)}"
+        self.fixed_tokens = estimate_tokens(PROMPT_HEADER + PROMPT_FOOTER.format(user_input=""))
+
+        # term -> [(kind, key, weight)]
+        self.index = {}
+        for crop in self.crop_lines:
+            self._add(terms(crop), "crop", crop, CROP_NAME_WEIGHT)
+        for disease, crops in snapshot.crops_by_disease.items():
+            self._add_phrase(disease, "disease", disease, DISEASE_NAME_WEIGHT)
+            for crop in crops:
+                self._add(terms(disease), "crop", crop, DISEASE_WORD_WEIGHT)
+        for topic, info in snapshot.general_care.items():
+            self._add(terms(topic.replace("_", " ")), "topic", topic, TOPIC_NAME_WEIGHT)
+            self._add(set(terms(info)), "topic", topic, TOPIC_WORD_WEIGHT)
+
+    def _add(self, words, kind, key, weight):
+        for word in words:
+            self.index.setdefault(word, []).append((kind, key, weight))
+
+    def _add_phrase(self, phrase, kind, key, weight):
+        # Whole phrases are indexed by their stemmed words joined with spaces
+        self.index.setdefault(" ".join(terms(phrase)), []).append((kind, key, weight))
+
+    def select(self, user_input):
+        """Score crops, care topics and diseases against a question; returns three lists, best first"""
+        words = terms(user_input)
+        # Single words plus every run of two and three words, for multi-word disease names
+        candidates = words + [" ".join(words[i:i + n]) for n in (2, 3) for i in range(len(words) - n + 1)]
+        scores = {"crop": {}, "topic": {}, "disease": {}}
+        for term in candidates:
+            for kind, key, weight in self.index.get(term, ()):
+                scores[kind][key] = scores[kind].get(key, 0.0) + weight
+
+        def best(kind, limit):
+            ranked = sorted(scores[kind].items(), key=lambda item: -item[1])
+            return [key for key, score in ranked[:limit] if score >= max(MIN_SCORE, ranked[0][1] * RELEVANCE_RATIO)]
+
+        diseases = best("disease", self.max_crops)
+        # A named disease also brings in the crops it affects
+        crops = best("crop", self.max_crops)
+        for disease in diseases:
+            crops += [crop for crop in self.snapshot.crops_by_disease[disease] if crop not in crops]
+        return crops[:self.max_crops], best("topic", self.max_topics), diseases
+
+    def build(self, user_input):
+        """Return the prompt for one question, within max_tokens"""
+        crops, topics, diseases = self.select(user_input)
+
+        budget = self.max_tokens - self.fixed_tokens
+        question_budget = max(budget // 2, 0)
+        if estimate_tokens(user_input) > question_budget:
+            user_input = user_input[:question_budget * CHARS_PER_TOKEN]
+        budget -= estimate_tokens(user_input)
+
+        sections = []
+        for title, lines in (("KEY CROP INFORMATION", [self.crop_lines[crop] for crop in crops] or [self.crops_covered]),
+                             ("TREATMENTS", [self.treatment_lines[disease] for disease in diseases]),
+                             ("GENERAL CARE", [self.topic_lines[topic] for topic in topics])):
+            kept = []
+            for line in lines:
+                cost = estimate_tokens(line) + 1
+                if cost > budget:
+                    break
+                kept.append(line)
+                budget -= cost
+            if kept:
+                sections.append(f"\n{title}:\n" + "\n".join(kept) + "\n")
+
+        return PROMPT_HEADER + "".join(sections) + PROMPT_FOOTER.format(user_input=user_input)
+
+
+_builder = None
+_builder_lock = threading.Lock()
+
+
+def prompt_builder():
+    """The PromptBuilder for the current knowledge snapshot, rebuilt only when the knowledge file changes"""
+    global _builder
+    snapshot = knowledge_base.snapshot()
+    builder = _builder
+    if builder is None or builder.snapshot is not snapshot:
+        with _builder_lock:
+            if _builder is None or _builder.snapshot is not snapshot:
+                _builder = PromptBuilder(snapshot)
+            builder = _builder
+    return builder
+
+
+def build_prompt(user_input):
+    return prompt_builder().build(user_input)
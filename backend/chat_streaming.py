@@ -0,0 +1,94 @@
+import json
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+# Keep browsers and reverse proxies (nginx) from caching or buffering the stream
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def sse_event(event, data):
+    """Format one server-sent event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class ChatStreamStats:
+    """Time to first chunk and total duration of streamed chat answers, per answer source"""
+
+    def __init__(self, window=1000):
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples = {}   # source -> deque of (ttft seconds, duration seconds)
+        self._counts = {}
+        self.errors = 0
+
+    def record(self, source, ttft, duration):
+        with self._lock:
+            samples = self._samples.get(source)
+            if samples is None:
+                samples = self._samples[source] = deque(maxlen=self.window)
+            samples.append((ttft, duration))
+            self._counts[source] = self._counts.get(source, 0) + 1
+
+    def record_error(self):
+        with self._lock:
+            self.errors += 1
+
+    def stats(self):
+        with self._lock:
+            samples = {source: np.array(values) for source, values in self._samples.items()}
+            counts = dict(self._counts)
+            errors = self.errors
+
+        def percentiles(values):
+            p50, p95 = np.percentile(values * 1000.0, [50, 95])
+            return {"p50": round(float(p50), 1), "p95": round(float(p95), 1)}
+
+        by_source = {
+            source: {"streams": counts[source], "ttft_ms": percentiles(values[:, 0]),
+                     "duration_ms": percentiles(values[:, 1])}
+            for source, values in samples.items()
+        }
+        return {"window": self.window, "errors": errors, "by_source": by_source}
+
+
+def stream_answer(source, chunks, on_complete=None, started=None):
+    """
+    Turn an iterator of text chunks into SSE events: start, one chunk per piece of text, then done.
+
+    Args:
+        source: Where the answer comes from, reported in the start and done events
+        chunks: Iterator of text pieces; it may raise before or while yielding
+        on_complete: Called with (full text, ttft seconds, duration seconds) once every chunk was sent
+        started: perf_counter() time the request arrived; defaults to now
+
+    Yields:
+        SSE-formatted strings. Exceptions from ``chunks`` propagate, tagged with
+        ``chunks_sent`` so the caller can tell whether the client saw anything yet.
+    """
+    if started is None:
+        started = time.perf_counter()
+    first_chunk = None
+    parts = []
+    try:
+        for text in chunks:
+            if first_chunk is None:
+                first_chunk = time.perf_counter()
+                yield sse_event("start", {"source": source})
+            parts.append(text)
+            yield sse_event("chunk", {"text": text})
+    except Exception as e:
+        e.chunks_sent = len(parts)
+        raise
+
+    finished = time.perf_counter()
+    if first_chunk is None:
+        first_chunk = finished
+        yield sse_event("start", {"source": source})
+    ttft, duration = first_chunk - started, finished - started
+    yield sse_event("done", {"source": source, "chunks": len(parts),
+                             "ttft_ms": round(ttft * 1000, 1), "duration_ms": round(duration * 1000, 1)})
+    if on_complete is not None:
+        on_complete("".join(parts), ttft, duration)
@@ -0,0 +1,89 @@
+import os
+import time
+import argparse
+import numpy as np
+import tensorflow as tf
+from image_preprocessing import IMG_SIZE, decode_image, normalize, prepare_encoded
+from model_serving import serving_signatures
+
+
+def list_images(data_path):
+    """Return every image path under data_path"""
+    paths = []
+    for root, _, files in sorted(os.walk(data_path)):
+        for name in sorted(files):
+            if name.lower().endswith(('.png', '.jpg', '.jpeg')):
+                paths.append(os.path.join(root, name))
+    return paths
+
+
+def time_per_image(fn, batches):
+    started = time.perf_counter()
+    for batch in batches:
+        fn(batch)
+    return (time.perf_counter() - started) * 1000.0 / sum(len(batch) for batch in batches)
+
+
+def export(model_path, output_path, data_path, batch_size):
+    """
+    Re-save a trained model with the serving_default and serving_bytes signatures.
+
+    Models written by the current training scripts already have both; this
+    upgrades ones trained earlier.
+
+    Args:
+        model_path: Path to the trained SavedModel
+        output_path: Where to write the model (may be model_path itself)
+        data_path: Directory of images used to check both signatures agree
+        batch_size: Images per call when timing the two signatures
+    """
+    model = tf.keras.models.load_model(model_path)
+    model.save(output_path, signatures=serving_signatures(model))
+    print(f"Saved {output_path} with signatures: serving_default (float32 pixels), serving_bytes (encoded images)")
+
+    paths = list_images(data_path)
+    if not paths:
+        print(f"No images found under {data_path}; skipping the comparison")
+        return
+
+    loaded = tf.saved_model.load(output_path)
+    serve_pixels = loaded.signatures["serving_default"]
+    serve_bytes = loaded.signatures["serving_bytes"]
+
+    encoded = []
+    for path in paths:
+        with open(path, "rb") as f:
+            encoded.append(prepare_encoded(f.read()))
+    pixels = np.stack([normalize(decode_image(path, size=IMG_SIZE)) for path in paths])
+
+    from_pixels = serve_pixels(images=tf.constant(pixels))["probabilities"].numpy()
+    from_bytes = serve_bytes(image_bytes=tf.constant(encoded))["probabilities"].numpy()
+    agreement = float(np.mean(np.argmax(from_pixels, axis=1) == np.argmax(from_bytes, axis=1)))
+    print(f"\n{len(paths)} images from {data_path}")
+    print(f"  Top-1 agreement, Python vs in-graph preprocessing: {agreement:.2%}")
+    print(f"  Max probability difference:                        {np.max(np.abs(from_pixels - from_bytes)):.4f}")
+
+    # Python preprocessing is timed as part of the pixel path, as the server pays for it
+    byte_batches = [encoded[i:i + batch_size] for i in range(0, len(encoded), batch_size)]
+    path_batches = [paths[i:i + batch_size] for i in range(0, len(paths), batch_size)]
+    pixel_ms = time_per_image(lambda batch: serve_pixels(images=tf.constant(np.stack(
+        [normalize(decode_image(path, size=IMG_SIZE)) for path in batch]))), path_batches)
+    bytes_ms = time_per_image(lambda batch: serve_bytes(image_bytes=tf.constant(batch)), byte_batches)
+    print(f"  Python preprocessing + serving_default: {pixel_ms:7.2f} ms/img")
+    print(f"  serving_bytes:                          {bytes_ms:7.2f} ms/img")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Add an encoded-image serving signature to a trained model")
+    parser.add_argument("--model_path", type=str, default="models/crop_health_model",
+                        help="Path to the trained SavedModel")
+    parser.add_argument("--output_path", type=str, default=None,
+                        help="Where to write the model (defaults to overwriting model_path)")
+    parser.add_argument("--data_path", type=str, default="../Dataset/test",
+                        help="Images used to compare the two signatures")
+    parser.add_argument("--batch_size", type=int, default=8,
+                        help="Images per call when timing the signatures")
+
+    args = parser.parse_args()
+
+    export(args.model_path, args.output_path or args.model_path, args.data_path, args.batch_size)
@@ -0,0 +1,188 @@
+import os
+import json
+import time
+import argparse
+import multiprocessing
+import numpy as np
+import tensorflow as tf
+from image_preprocessing import IMG_SIZE, decode_image, normalize
+from tflite_serving import TFLiteServingModel, TFLITE_MODEL_FILES
+
+CLASS_INDEX_FILES = ["class_indices.json", "soil_class_indices.json"]
+
+
+def load_image(path):
+    """Preprocess one image the same way app.py does"""
+    return normalize(decode_image(path, size=IMG_SIZE))
+
+
+def list_images(data_path):
+    """Return (path, class folder name) pairs for every image under data_path"""
+    images = []
+    for class_name in sorted(os.listdir(data_path)):
+        class_dir = os.path.join(data_path, class_name)
+        if not os.path.isdir(class_dir):
+            continue
+        for name in sorted(os.listdir(class_dir)):
+            if name.lower().endswith(('.png', '.jpg', '.jpeg')):
+                images.append((os.path.join(class_dir, name), class_name))
+    return images
+
+
+def load_class_indices(model_path):
+    """Load the model's class name -> index mapping saved by the training scripts"""
+    for name in CLASS_INDEX_FILES:
+        path = os.path.join(model_path, name)
+        if os.path.exists(path):
+            with open(path) as f:
+                return json.load(f)
+    return {}
+
+
+def convert(model_path, variant, calibration_images):
+    """Convert a SavedModel to a float16 or int8 TFLite flatbuffer"""
+    # Only the float32 pixel signature; serving_bytes uses decode ops TFLite lacks
+    converter = tf.lite.TFLiteConverter.from_saved_model(model_path, signature_keys=["serving_default"])
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+
+    if variant == "tflite-fp16":
+        converter.target_spec.supported_types = [tf.float16]
+    else:
+        def representative_dataset():
+            for path, _ in calibration_images:
+                yield [load_image(path)[np.newaxis]]
+
+        # Weights and activations in int8; input and output stay float32 so
+        # the server feeds both variants the same tensors
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+
+    return converter.convert()
+
+
+def _measure_rss(kind, path, results):
+    """Report how much resident memory loading a model and running it once adds"""
+    def rss_mb():
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.0
+        return 0.0
+
+    if kind == "keras":
+        before = rss_mb()
+        model = tf.keras.models.load_model(path)
+        model(np.zeros((1, IMG_SIZE, IMG_SIZE, 3), dtype=np.float32), training=False)
+    else:
+        from tflite_serving import load_interpreter_class
+        Interpreter = load_interpreter_class()
+        before = rss_mb()
+        interpreter = Interpreter(model_path=path)
+        interpreter.allocate_tensors()
+        interpreter.invoke()
+    results.put(rss_mb() - before)
+
+
+def measure_rss(kind, path):
+    """Measure model memory in a fresh process so earlier loads don't skew it"""
+    if not os.path.exists("/proc/self/status"):
+        return None
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=_measure_rss, args=(kind, path, results))
+    process.start()
+    process.join()
+    return results.get() if not results.empty() else None
+
+
+def evaluate(predict, test_images, class_indices):
+    """Return (predicted class indices, accuracy or None, mean latency per image in ms)"""
+    predictions = []
+    latencies = []
+    for path, _ in test_images:
+        image = load_image(path)[np.newaxis]
+        started = time.perf_counter()
+        probabilities = predict(image)
+        latencies.append((time.perf_counter() - started) * 1000.0)
+        predictions.append(int(np.argmax(probabilities[0])))
+
+    predictions = np.array(predictions)
+    # Accuracy only makes sense when the test folders are this model's classes
+    labels = [class_indices.get(class_name) for _, class_name in test_images]
+    accuracy = None
+    if labels and all(label is not None for label in labels):
+        accuracy = float(np.mean(predictions == np.array(labels)))
+    return predictions, accuracy, float(np.mean(latencies[1:] or latencies))
+
+
+def export(model_path, output_dir, calibration_path, test_path, num_calibration):
+    """
+    Export float16 and int8 TFLite versions of a SavedModel and report what they cost in accuracy.
+
+    Args:
+        model_path: Path to the trained SavedModel
+        output_dir: Where to write the .tflite files (defaults to model_path, where app.py looks)
+        calibration_path: Image folder used to calibrate int8 activation ranges
+        test_path: Image folder used to compare the variants
+        num_calibration: Number of calibration images
+    """
+    output_dir = output_dir or model_path
+    os.makedirs(output_dir, exist_ok=True)
+
+    calibration_images = list_images(calibration_path)
+    rng = np.random.default_rng(0)
+    rng.shuffle(calibration_images)
+    calibration_images = calibration_images[:num_calibration]
+    test_images = list_images(test_path)
+    class_indices = load_class_indices(model_path)
+    print(f"Calibrating with {len(calibration_images)} images from {calibration_path}")
+    print(f"Evaluating on {len(test_images)} images from {test_path}")
+
+    keras_model = tf.keras.models.load_model(model_path)
+    reference, reference_accuracy, reference_latency = evaluate(
+        lambda batch: keras_model(batch, training=False).numpy(), test_images, class_indices)
+    saved_model_size = sum(os.path.getsize(os.path.join(root, name))
+                           for root, _, files in os.walk(model_path) for name in files
+                           if not name.endswith(".tflite"))
+
+    rows = [("float32 (Keras)", saved_model_size, reference_accuracy, 1.0, reference_latency,
+             measure_rss("keras", model_path))]
+
+    for variant, file_name in TFLITE_MODEL_FILES.items():
+        print(f"Converting {variant}...")
+        output_path = os.path.join(output_dir, file_name)
+        with open(output_path, "wb") as f:
+            f.write(convert(model_path, variant, calibration_images))
+        print(f"Saved {output_path}")
+
+        tflite_model = TFLiteServingModel(output_path, name=variant)
+        predictions, accuracy, latency = evaluate(tflite_model.predict, test_images, class_indices)
+        rows.append((variant, os.path.getsize(output_path), accuracy,
+                     float(np.mean(predictions == reference)), latency, measure_rss("tflite", output_path)))
+
+    print(f"\n{'variant':<18}{'size MB':>9}{'accuracy':>10}{'delta':>8}{'agree':>8}{'ms/img':>9}{'RSS MB':>9}")
+    for name, size, accuracy, agreement, latency, rss in rows:
+        accuracy_text = f"{accuracy:.3f}" if accuracy is not None else "n/a"
+        delta_text = f"{accuracy - reference_accuracy:+.3f}" if accuracy is not None else "n/a"
+        rss_text = f"{rss:.0f}" if rss is not None else "n/a"
+        print(f"{name:<18}{size / 1e6:>9.1f}{accuracy_text:>10}{delta_text:>8}{agreement:>8.3f}"
+              f"{latency:>9.2f}{rss_text:>9}")
+    print("\n'agree' is the share of test images where the variant picks the same class as float32.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export quantized TFLite models for serving")
+    parser.add_argument("--model_path", type=str, default="models/soil_classification_model",
+                        help="Path to the trained SavedModel")
+    parser.add_argument("--output_dir", type=str, default=None,
+                        help="Where to write the .tflite files (defaults to the model directory)")
+    parser.add_argument("--calibration_path", type=str, default="../Dataset/Train",
+                        help="Images used to calibrate int8 quantization")
+    parser.add_argument("--test_path", type=str, default="../Dataset/test",
+                        help="Images used to compare accuracy and latency")
+    parser.add_argument("--num_calibration", type=int, default=100,
+                        help="Number of calibration images")
+
+    args = parser.parse_args()
+
+    export(args.model_path, args.output_dir, args.calibration_path, args.test_path, args.num_calibration)
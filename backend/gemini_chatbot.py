@@ -1,15 +1,94 @@
 import os
 import json
-import google.generativeai as genai
+import time
+import hashlib
+import tempfile
+import threading
+import importlib.util
 from dotenv import load_dotenv
 import gc
 import atexit
 import signal
 import sys
 
+from chat_prompt import build_prompt, prompt_builder
+
 # Load environment variables
 load_dotenv()
 
+# The model picked from genai.list_models() is remembered here, so later
+# boots skip the listing round trip. GEMINI_MODEL pins a model outright.
+MODEL_CACHE_PATH = os.getenv("GEMINI_MODEL_CACHE", os.path.join(tempfile.gettempdir(), "agrointel-gemini-model.json"))
+MODEL_CACHE_TTL = float(os.getenv("GEMINI_MODEL_CACHE_TTL", 7 * 24 * 3600))
+
+# Sending a test prompt at startup costs a full generation round trip; off unless asked for
+SELF_TEST = os.getenv("GEMINI_SELF_TEST", "0") == "1"
+
+# Send requests to another endpoint over REST, e.g. stub_server.py for offline load tests
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT")
+
+# Define preferred models in order of preference
+PREFERRED_MODELS = [
+    "models/gemini-1.5-pro",
+    "models/gemini-1.5-flash",
+    "models/gemini-1.5-pro-latest",
+    "models/gemini-1.5-flash-latest",
+    "models/gemini-2.0-pro-exp",
+    "models/gemini-2.0-flash"
+]
+
+
+def _genai_available():
+    """Check that google-generativeai is installed without importing it (the import is slow)"""
+    try:
+        return importlib.util.find_spec("google.generativeai") is not None
+    except ModuleNotFoundError:
+        return False
+
+
+GENAI_AVAILABLE = _genai_available()
+
+
+def _api_key_fingerprint(api_key):
+    # Different keys can see different models; never store the key itself
+    return hashlib.blake2b(api_key.encode(), digest_size=8).hexdigest()
+
+
+def read_cached_model(api_key):
+    """Return the model name cached for this API key, or None if missing or stale"""
+    try:
+        with open(MODEL_CACHE_PATH) as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if cached.get("api_key") != _api_key_fingerprint(api_key):
+        return None
+    if time.time() - cached.get("selected_at", 0) > MODEL_CACHE_TTL:
+        return None
+    return cached.get("model_name")
+
+
+def write_cached_model(api_key, model_name):
+    try:
+        tmp_path = f"{MODEL_CACHE_PATH}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "model_name": model_name,
+                "api_key": _api_key_fingerprint(api_key),
+                "selected_at": time.time()
+            }, f)
+        os.replace(tmp_path, MODEL_CACHE_PATH)
+    except OSError as e:
+        # A read-only filesystem only means the next boot lists models again
+        print(f"Could not cache Gemini model selection: {e}")
+
+
+def forget_cached_model():
+    try:
+        os.remove(MODEL_CACHE_PATH)
+    except OSError:
+        pass
+
 class GeminiCropChatbot:
     def __init__(self):
         self._cleanup_handler = lambda signum, frame: self.cleanup()
@@ -24,45 +103,23 @@ class GeminiCropChatbot:
         try:
             print(f"Initializing Gemini API with key: {self.api_key[:5]}...")
             
+            # Imported here: loading the client library takes longer than everything else at boot
+            import google.generativeai as genai
+            
             # Configure the Gemini API
-            genai.configure(api_key=self.api_key)
+            if GEMINI_API_ENDPOINT:
+                print(f"Using Gemini API endpoint: {GEMINI_API_ENDPOINT}")
+                genai.configure(api_key=self.api_key, transport="rest",
+                                client_options={"api_endpoint": GEMINI_API_ENDPOINT})
+            else:
+                genai.configure(api_key=self.api_key)
             
-            # Load crop knowledge
-            self.crop_knowledge = self._load_crop_knowledge()
+            # Load crop knowledge and render the prompt sections once
+            prompt_builder()
             
-            # List available models and select an appropriate one
+            # Select a model: pinned, remembered from an earlier boot, or listed now
             try:
-                print("Listing available models...")
-                models = genai.list_models()
-                model_names = [model.name for model in models]
-                
-                # Define preferred models in order of preference
-                preferred_models = [
-                    "models/gemini-1.5-pro",
-                    "models/gemini-1.5-flash",
-                    "models/gemini-1.5-pro-latest",
-                    "models/gemini-1.5-flash-latest",
-                    "models/gemini-2.0-pro-exp",
-                    "models/gemini-2.0-flash"
-                ]
-                
-                # Try to find one of our preferred models
-                self.model_name = None
-                for preferred in preferred_models:
-                    if preferred in model_names:
-                        self.model_name = preferred
-                        print(f"Found preferred model: {self.model_name}")
-                        break
-                
-                # If no preferred model found, use the first available Gemini model
-                if not self.model_name:
-                    gemini_models = [name for name in model_names if "gemini" in name.lower()]
-                    if gemini_models:
-                        self.model_name = gemini_models[0]
-                        print(f"Using available model: {self.model_name}")
-                    else:
-                        raise ValueError("No Gemini models found in your account")
-                
+                self.model_name = self._select_model(genai)
             except Exception as e:
                 print(f"Error selecting model: {e}")
                 raise
@@ -71,77 +128,57 @@ class GeminiCropChatbot:
             print(f"Creating model with name: {self.model_name}")
             self.model = genai.GenerativeModel(self.model_name)
             
-            # Test with a simple prompt
-            print("Testing model with simple prompt...")
-            test_response = self.model.generate_content("Hello, how are you?")
-            print(f"Test response: {test_response.text[:50]}...")
+            if SELF_TEST:
+                print("Testing model with simple prompt...")
+                test_response = self.model.generate_content("Hello, how are you?")
+                print(f"Test response: {test_response.text[:50]}...")
             
             self.api_key_error = False
             print("Gemini API initialized successfully!")
 
-            # Register cleanup handlers
-            signal.signal(signal.SIGINT, self._cleanup_handler)
-            signal.signal(signal.SIGTERM, self._cleanup_handler)
+            # Register cleanup handlers (signals can only be set from the main thread)
+            if threading.current_thread() is threading.main_thread():
+                signal.signal(signal.SIGINT, self._cleanup_handler)
+                signal.signal(signal.SIGTERM, self._cleanup_handler)
             atexit.register(self.cleanup)
             
         except Exception as e:
             print(f"Error initializing Gemini API: {e}")
             self.api_key_error = True
     
-    def _load_crop_knowledge(self):
-        """Load crop-specific knowledge base"""
-        knowledge_path = os.path.join(os.path.dirname(__file__), 'crop_knowledge.json')
+    def _select_model(self, genai):
+        """Return the Gemini model to use, listing the account's models only when nothing is cached"""
+        pinned = os.getenv("GEMINI_MODEL")
+        if pinned:
+            print(f"Using pinned model: {pinned}")
+            return pinned
+        
+        cached = read_cached_model(self.api_key)
+        if cached:
+            print(f"Using cached model selection: {cached}")
+            return cached
+        
+        print("Listing available models...")
+        model_names = [model.name for model in genai.list_models()]
         
-        if os.path.exists(knowledge_path):
-            with open(knowledge_path, 'r') as f:
-                return json.load(f)
+        # Try to find one of our preferred models
+        model_name = next((preferred for preferred in PREFERRED_MODELS if preferred in model_names), None)
+        if model_name:
+            print(f"Found preferred model: {model_name}")
         else:
-            print("Warning: crop_knowledge.json not found. Using default knowledge.")
-            # Return a minimal default knowledge base
-            return {
-                "crops": {
-                    "tomato": {
-                        "diseases": ["early blight", "late blight"],
-                        "care": "Water regularly, provide full sun."
-                    }
-                },
-                "general_care": {
-                    "watering": "Most crops need 1-2 inches of water per week."
-                }
-            }
+            # If no preferred model found, use the first available Gemini model
+            gemini_models = [name for name in model_names if "gemini" in name.lower()]
+            if not gemini_models:
+                raise ValueError("No Gemini models found in your account")
+            model_name = gemini_models[0]
+            print(f"Using available model: {model_name}")
+        
+        write_cached_model(self.api_key, model_name)
+        return model_name
     
     def _create_system_prompt(self, user_input):
-        """Create a system prompt with agricultural knowledge and user input"""
-        # Extract key information from knowledge base
-        crops_info = "\n".join([
-            f"- {crop}: Diseases: {', '.join(info['diseases'])}. Care: {info['care']}"
-            for crop, info in self.crop_knowledge["crops"].items()
-        ])
-        
-        general_care = "\n".join([
-            f"- {topic.replace('_', ' ').title()}: {info}"
-            for topic, info in self.crop_knowledge["general_care"].items()
-        ])
-        
-        # Create the prompt with system instructions and user query
-        return f"""You are an agricultural expert assistant for a Crop Monitoring App. 
-Your role is to provide helpful advice about crop care, disease identification, and farming practices.
-
-KEY CROP INFORMATION:
-{crops_info}
-
-GENERAL CARE:
-{general_care}
-
-When responding to users:
-1. Be concise and practical in your advice
-2. Suggest relevant tips for crop health based on the user's question
-3. If you don't know something specific, acknowledge it and provide general best practices
-4. Focus on organic and sustainable farming practices when possible
-
-User Question: {user_input}
-
-Your helpful response:"""
+        """Create a prompt with the agricultural knowledge relevant to the user input"""
+        return build_prompt(user_input)
     
     def get_response(self, user_input):
         """Generate a response to the user input using Gemini"""
@@ -169,6 +206,10 @@ Your helpful response:"""
             print(f"Error generating Gemini chatbot response: {e}")
             error_message = str(e)
             
+            # A cached model that has since been retired is listed afresh on the next boot
+            if "not found" in error_message.lower():
+                forget_cached_model()
+            
             # Provide a more helpful error message
             if "quota" in error_message.lower():
                 error_msg = "I'm sorry, we've exceeded our quota for AI requests. Please try again later."
@@ -184,6 +225,29 @@ Your helpful response:"""
                 "source": "error"
             }
     
+    def stream_response(self, user_input):
+        """Yield the Gemini answer in text chunks as they are generated.
+
+        Unlike get_response, errors are raised rather than turned into a
+        message, so the caller can switch to the fallback chatbot while
+        nothing has been sent yet.
+        """
+        if self.api_key_error:
+            raise RuntimeError("Gemini API is not configured")
+        
+        prompt = self._create_system_prompt(user_input)
+        print(f"Streaming prompt to Gemini: {user_input[:30]}...")
+        try:
+            for chunk in self.model.generate_content(prompt, stream=True):
+                # Chunks without text parts (e.g. only safety ratings) carry nothing to show
+                text = chunk.text if chunk.parts else ""
+                if text:
+                    yield text
+        except Exception as e:
+            if "not found" in str(e).lower():
+                forget_cached_model()
+            raise
+    
     def cleanup(self):
         """Clean up resources to prevent gRPC shutdown warnings"""
         print("Cleaning up Gemini API resources...")
@@ -194,25 +258,40 @@ Your helpful response:"""
         # Explicit cleanup when object is destroyed
         self.cleanup()
 
-# Create a singleton instance
-chatbot = GeminiCropChatbot()
+# The singleton is created on first use (or by app.py's background warm-up),
+# so importing this module costs no network round trips
+chatbot = None
+_chatbot_lock = threading.Lock()
+
+def get_chatbot():
+    """Return the shared chatbot, initializing it on the first call"""
+    global chatbot
+    if chatbot is None:
+        with _chatbot_lock:
+            if chatbot is None:
+                chatbot = GeminiCropChatbot()
+    return chatbot
+
+def chatbot_status():
+    """Describe the chatbot without initializing it"""
+    if chatbot is None:
+        return "initializing" if _chatbot_lock.locked() else "not initialized"
+    return "unavailable" if chatbot.api_key_error else "ready"
 
 # Set up signal handlers
 def signal_handler(sig, frame):
     print('Received shutdown signal, cleaning up...')
-    chatbot.cleanup()
+    if chatbot is not None:
+        chatbot.cleanup()
     sys.exit(0)
 
 signal.signal(signal.SIGINT, signal_handler)
 signal.signal(signal.SIGTERM, signal_handler)
 
-# Register cleanup function
-atexit.register(chatbot.cleanup)
-
 # Example usage
 if __name__ == "__main__":
     # Test the chatbot
     print("Testing chatbot...")
-    response = chatbot.get_response("How do I care for tomato plants?")
+    response = get_chatbot().get_response("How do I care for tomato plants?")
     print(f"Response: {response['response']}")
     print(f"Source: {response['source']}")
\ No newline at end of file
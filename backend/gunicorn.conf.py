@@ -0,0 +1,22 @@
+import os
+
+from inference_server import DEFAULT_SOCKET_PATH, launch
+
+# gunicorn reads this file automatically. With INFERENCE_SERVER=1 the model
+# replicas are started next to the master, before any worker forks, and are
+# stopped when the master exits. Workers connect to them on first use.
+
+
+def on_starting(server):
+    if os.environ.get('INFERENCE_SERVER', '0') == '1':
+        server.inference_pool = launch(
+            os.environ.get('INFERENCE_SERVER_SOCKET', DEFAULT_SOCKET_PATH),
+            int(os.environ.get('INFERENCE_REPLICAS', 1))
+        )
+
+
+def on_exit(server):
+    pool = getattr(server, 'inference_pool', None)
+    if pool is not None:
+        pool.terminate()
+        pool.wait(timeout=30)
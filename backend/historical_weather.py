@@ -0,0 +1,294 @@
+import os
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+
+import numpy as np
+
+from caching import SingleFlight
+
+# Rows of the daily array and of the prefix-sum array
+SERIES = ("temp_max_c", "temp_min_c", "precipitation_mm")
+PREFIX_ROWS = ("temp_max_c", "temp_min_c", "precipitation_mm", "rainy_days")
+RAINY_DAY_MM = 1.0
+# Part of the file names; bumped when the loader's output for a given date changes
+HISTORY_FORMAT = 2
+
+# Rows of the sparse table: range maximum of daily highs, range minimum of daily lows
+SPARSE_ROWS = ("max_temp_c", "min_temp_c")
+
+
+# Day 0 of the seasonal cycle
+SEASON_EPOCH = date(2000, 1, 1)
+# Noise days before the window that feed the first days' weekly anomaly
+ANOMALY_LEAD_DAYS = 6
+
+
+def _year_draws(seed, year):
+    """Random draws for every day of one calendar year, from a generator seeded by the cell and the year.
+
+    Returns:
+        float64 array of shape (4, days in year): anomaly noise, diurnal range noise, rain roll, rain amount
+    """
+    days = (date(year + 1, 1, 1) - date(year, 1, 1)).days
+    rng = np.random.default_rng([seed, year])
+    return np.stack([rng.normal(0.0, 2.5, days), rng.normal(0.0, 1.5, days), rng.random(days), rng.gamma(0.8, 9.0, days)])
+
+
+def synthetic_history(cell, start, days):
+    """Deterministic stand-in for a historical weather API.
+
+    Builds a plausible climate for the cell's latitude (seasonal cycle,
+    day-to-day persistence, seasonal rain). Random draws come one calendar
+    year at a time from generators seeded by the cell and the year, so a
+    day's weather depends only on its cell and date: extending the range
+    never changes the days already built.
+
+    Returns:
+        float32 array of shape (3, days): daily max temperature, min temperature, precipitation
+    """
+    seed = int.from_bytes(hashlib.blake2b(cell.key.encode(), digest_size=8).digest(), "little")
+    rng = np.random.default_rng(seed)
+    diurnal_offset = 3.0 * rng.random()
+    rain_offset = 0.1 * rng.random()
+
+    first = start - timedelta(days=ANOMALY_LEAD_DAYS)
+    last = start + timedelta(days=days - 1)
+    draws = np.concatenate([_year_draws(seed, year) for year in range(first.year, last.year + 1)], axis=1)
+    offset = (first - date(first.year, 1, 1)).days
+    anomaly_noise = draws[0, offset:offset + ANOMALY_LEAD_DAYS + days]
+    diurnal_noise, rain_roll, rain_amount = draws[1:, offset + ANOMALY_LEAD_DAYS:offset + ANOMALY_LEAD_DAYS + days]
+
+    day_of_year = (np.arange(days) + (start - SEASON_EPOCH).days) % 365.25
+    abs_lat = abs(cell.lat)
+    # Northern summers peak around day 200, southern ones half a year later
+    phase = 2 * np.pi * (day_of_year - (200 if cell.lat >= 0 else 17)) / 365.25
+    season = np.cos(phase)
+
+    mean_temp = 30.0 - 0.4 * abs_lat + min(abs_lat, 60.0) * 0.18 * season
+    # Weather anomalies persist for a few days: smooth white noise over a week
+    anomaly = np.convolve(anomaly_noise, np.ones(7) / np.sqrt(7), mode="valid")
+    diurnal_range = 7.0 + diurnal_offset + diurnal_noise
+    temp_max = mean_temp + anomaly + diurnal_range / 2
+    temp_min = temp_max - np.clip(diurnal_range, 2.0, None)
+
+    # Wetter season aligned with the warm half of the year (monsoon-like in the tropics)
+    rain_chance = np.clip(0.18 + 0.15 * season + rain_offset, 0.02, 0.8)
+    precipitation = np.where(rain_roll < rain_chance, rain_amount, 0.0)
+
+    return np.round(np.stack([temp_max, temp_min, precipitation]), 1).astype(np.float32)
+
+
+def build_sparse_table(values, reduce):
+    """Sparse table for O(1) range min/max: level k holds reduce() over [i, i + 2**k)"""
+    levels = [values]
+    width = 1
+    while width * 2 <= len(values):
+        previous = levels[-1]
+        levels.append(reduce(previous[:len(previous) - width], previous[width:]))
+        width *= 2
+    table = np.full((len(levels), len(values)), np.nan, dtype=np.float32)
+    for k, level in enumerate(levels):
+        table[k, :len(level)] = level
+    return table
+
+
+def summary_rows(stats, starts, ends):
+    """Turn the arrays returned by HistoricalWeatherStore.summaries() into one summary dict per window"""
+    columns = {name: np.round(values, 1).tolist() for name, values in stats.items()}
+    for name in ("period_days", "rainy_days"):
+        columns[name] = stats[name].astype(np.int64).tolist()
+
+    rows = []
+    for i, (start, end) in enumerate(zip(starts, ends)):
+        row = {"start": start.isoformat(), "end": end.isoformat()}
+        row.update((name, column[i]) for name, column in columns.items())
+        row["data_points"] = row["period_days"]
+        rows.append(row)
+    return rows
+
+
+class CellHistory:
+    """Daily series of one grid cell, with prefix sums and sparse tables for constant-time window summaries"""
+
+    def __init__(self, start, daily, prefix, sparse):
+        self.start = start
+        self.daily = daily      # (3, days) float32
+        self.prefix = prefix    # (4, days + 1) float64 running totals, prefix[:, 0] == 0
+        self.sparse = sparse    # (2, levels, days) float32
+        self.days = daily.shape[1]
+        # floor(log2(n)) for every window length, so queries never call log()
+        self.log2 = np.zeros(self.days + 1, dtype=np.int64)
+        self.log2[2:] = np.floor(np.log2(np.arange(2, self.days + 1))).astype(np.int64)
+
+    @property
+    def end(self):
+        return self.start + timedelta(days=self.days - 1)
+
+    def index(self, day):
+        return (day - self.start).days
+
+    def window(self, first, last):
+        """Summarize days [first, last] (day indexes, inclusive); scalars or equal-length arrays"""
+        first = np.asarray(first, dtype=np.int64)
+        stop = np.asarray(last, dtype=np.int64) + 1
+        length = stop - first
+        totals = self.prefix[:, stop] - self.prefix[:, first]
+        k = self.log2[length]
+        upper = stop - (1 << k)
+        return {
+            "period_days": length,
+            "avg_max_temp_c": totals[0] / length,
+            "avg_min_temp_c": totals[1] / length,
+            "total_precipitation_mm": totals[2],
+            "rainy_days": totals[3],
+            "max_temp_c": np.maximum(self.sparse[0, k, first], self.sparse[0, k, upper]),
+            "min_temp_c": np.minimum(self.sparse[1, k, first], self.sparse[1, k, upper]),
+        }
+
+    def summary(self, start, end):
+        """Summary of the dates start..end inclusive, in the /api/historical-weather format"""
+        stats = self.window(self.index(start), self.index(end))
+        return {
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "period_days": int(stats["period_days"]),
+            "avg_max_temp_c": round(float(stats["avg_max_temp_c"]), 1),
+            "avg_min_temp_c": round(float(stats["avg_min_temp_c"]), 1),
+            "max_temp_c": round(float(stats["max_temp_c"]), 1),
+            "min_temp_c": round(float(stats["min_temp_c"]), 1),
+            "total_precipitation_mm": round(float(stats["total_precipitation_mm"]), 1),
+            "rainy_days": int(stats["rainy_days"]),
+            "data_points": int(stats["period_days"]),
+        }
+
+
+class HistoricalWeatherStore:
+    """Historical daily weather per grid cell, persisted as memory-mapped .npy files.
+
+    Each cell is built once from the loader: the daily series, their prefix
+    sums and min/max sparse tables are written to disk and then mapped
+    read-only, so every process shares the same pages and any window summary
+    costs a handful of array lookups regardless of its length.
+    """
+
+    def __init__(self, directory, start, loader=synthetic_history, max_open_cells=256):
+        self.directory = directory
+        self.start = start
+        self.loader = loader
+        self.max_open_cells = max_open_cells
+        os.makedirs(directory, exist_ok=True)
+
+        self._cells = OrderedDict()  # cell key -> CellHistory
+        self._lock = threading.Lock()
+        self._single_flight = SingleFlight()
+        self.builds = 0
+
+    def history(self, cell, through=None):
+        """Return the CellHistory for a cell, covering at least self.start..through (default today)"""
+        through = through or date.today()
+        with self._lock:
+            history = self._cells.get(cell.key)
+            if history is not None and history.end >= through:
+                self._cells.move_to_end(cell.key)
+                return history
+
+        history = self._load(cell, through)
+        if history is None:
+            history = self._single_flight.do(cell.key, lambda: self._load(cell, through) or self._build(cell, through))
+        with self._lock:
+            self._cells[cell.key] = history
+            self._cells.move_to_end(cell.key)
+            while len(self._cells) > self.max_open_cells:
+                self._cells.popitem(last=False)
+        return history
+
+    def summaries(self, cells, starts, ends):
+        """Summarize many (cell, start, end) windows at once.
+
+        Windows are grouped by cell and each group is answered with one
+        vectorized window() call, so the cost grows with the number of
+        distinct cells, not with the number of windows or their length.
+
+        Returns:
+            dict of arrays aligned with the inputs, keyed like CellHistory.window()
+        """
+        through = max(ends)
+        groups = OrderedDict()
+        for position, cell in enumerate(cells):
+            groups.setdefault(cell.key, (cell, []))[1].append(position)
+
+        results = {}
+        for cell, positions in groups.values():
+            history = self.history(cell, through)
+            positions = np.array(positions)
+            firsts = np.array([history.index(starts[i]) for i in positions])
+            lasts = np.array([history.index(ends[i]) for i in positions])
+            for name, values in history.window(firsts, lasts).items():
+                if name not in results:
+                    results[name] = np.empty(len(cells), dtype=np.float64)
+                results[name][positions] = values
+        return results
+
+    def daily_series(self, cells, start, end):
+        """Daily arrays of many cells over one date range, shape (len(cells), 3, days); each distinct cell is read once"""
+        positions = OrderedDict()
+        blocks = []
+        for cell in cells:
+            if cell.key not in positions:
+                history = self.history(cell, end)
+                positions[cell.key] = len(blocks)
+                blocks.append(history.daily[:, history.index(start):history.index(end) + 1])
+        return np.stack(blocks)[[positions[cell.key] for cell in cells]]
+
+    def stats(self):
+        with self._lock:
+            open_cells = len(self._cells)
+        return {
+            "directory": self.directory,
+            "start": self.start.isoformat(),
+            "open_cells": open_cells,
+            "builds": self.builds,
+        }
+
+    def _paths(self, cell):
+        base = os.path.join(self.directory, f"{cell.key}.v{HISTORY_FORMAT}")
+        return {name: f"{base}.{name}.npy" for name in ("daily", "prefix", "sparse")}
+
+    def _load(self, cell, through):
+        """Map a cell's files, or return None if they are missing, stale or mid-rewrite"""
+        days = (through - self.start).days + 1
+        try:
+            arrays = {name: np.load(path, mmap_mode="r") for name, path in self._paths(cell).items()}
+        except (OSError, ValueError):
+            return None
+        stored = arrays["daily"].shape[1]
+        if stored < days or arrays["prefix"].shape[1] != stored + 1 or arrays["sparse"].shape[2] != stored:
+            return None
+        return CellHistory(self.start, arrays["daily"], arrays["prefix"], arrays["sparse"])
+
+    def _build(self, cell, through):
+        days = (through - self.start).days + 1
+        daily = self.loader(cell, self.start, days).astype(np.float32)
+
+        prefix = np.zeros((len(PREFIX_ROWS), days + 1), dtype=np.float64)
+        np.cumsum(daily, axis=1, out=prefix[:3, 1:])
+        np.cumsum(daily[2] >= RAINY_DAY_MM, out=prefix[3, 1:])
+        sparse = np.stack([build_sparse_table(daily[0], np.maximum),
+                           build_sparse_table(daily[1], np.minimum)])
+
+        # Write every file under a temporary name first, daily last, so a
+        # concurrent reader never maps a mix of old and new arrays
+        for name, array in (("sparse", sparse), ("prefix", prefix), ("daily", daily)):
+            path = self._paths(cell)[name]
+            fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, array)
+            os.replace(temp_path, path)
+
+        with self._lock:
+            self.builds += 1
+        print(f"Built historical weather for cell {cell.key}: {days} days from {self.start.isoformat()}")
+        return self._load(cell, through) or CellHistory(self.start, daily, prefix, sparse)
@@ -0,0 +1,106 @@
+import io
+import threading
+
+import numpy as np
+from PIL import Image
+
+IMG_SIZE = 224
+MIN_IMAGE_SIZE = 50
+
+# One resampling filter everywhere so the same photo always produces the same
+# tensor. BICUBIC is what Image.resize() used by default when the models were
+# put into service.
+RESAMPLE = Image.BICUBIC
+
+# Let the JPEG decoder scale down by 1/2, 1/4 or 1/8 as long as the result
+# stays at least this many times the target size, leaving enough pixels for
+# the final resize to anti-alias properly
+DRAFT_OVERSAMPLE = 2
+
+
+# Pillow reports many phone photos as MPO (JPEG with extra embedded frames); both support draft mode
+JPEG_FORMATS = ('JPEG', 'MPO')
+
+
+def decode_image(source, size=IMG_SIZE, min_size=MIN_IMAGE_SIZE):
+    """Decode an image file or stream into a size x size RGB uint8 array.
+
+    JPEGs much larger than the target are decoded at reduced resolution
+    (draft mode), which skips most of the IDCT work and never materializes
+    the full multi-megapixel bitmap.
+
+    Raises:
+        ValueError: If the image is smaller than min_size in either dimension
+    """
+    img = Image.open(source)
+
+    # Validate image dimensions on the original size, before any draft scaling
+    if img.size[0] < min_size or img.size[1] < min_size:
+        raise ValueError(f'Image dimensions too small. Minimum size: {min_size}x{min_size} pixels')
+
+    if img.format in JPEG_FORMATS:
+        img.draft('RGB', (size * DRAFT_OVERSAMPLE, size * DRAFT_OVERSAMPLE))
+    img = img.convert('RGB').resize((size, size), RESAMPLE)
+    return np.asarray(img, dtype=np.uint8)
+
+
+# Formats TensorFlow's image decoders can read inside the graph
+GRAPH_DECODABLE_FORMATS = {'JPEG', 'PNG', 'GIF', 'BMP'}
+
+
+def prepare_encoded(data, size=IMG_SIZE, min_size=MIN_IMAGE_SIZE):
+    """Validate an uploaded file for in-graph decoding and return the bytes to send.
+
+    Only the header is parsed. Formats TensorFlow cannot decode (WebP, TIFF,
+    ...) are decoded here and passed on as a size x size PNG instead.
+
+    Raises:
+        ValueError: If the image is smaller than min_size in either dimension
+    """
+    img = Image.open(io.BytesIO(data))
+    if img.size[0] < min_size or img.size[1] < min_size:
+        raise ValueError(f'Image dimensions too small. Minimum size: {min_size}x{min_size} pixels')
+    if img.format in GRAPH_DECODABLE_FORMATS:
+        return data
+
+    buffer = io.BytesIO()
+    Image.fromarray(decode_image(io.BytesIO(data), size=size, min_size=min_size)).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def normalize(image, out=None):
+    """Scale a uint8 image or batch to float32 in [0, 1], writing into out if given"""
+    if out is None:
+        out = np.empty(image.shape, dtype=np.float32)
+    np.divide(image, np.float32(255.0), out=out, casting='unsafe')
+    return out
+
+
+class BatchBuffer:
+    """Collate uint8 images into a reused float32 batch buffer.
+
+    Used as a MicroBatcher ``collate_fn``: each calling thread gets its own
+    buffer, grown on demand, so building a batch allocates nothing once the
+    buffer has reached the largest batch size seen. The returned array is a
+    view that stays valid until the same thread collates its next batch.
+    """
+
+    def __init__(self, image_shape=(IMG_SIZE, IMG_SIZE, 3)):
+        self.image_shape = tuple(image_shape)
+        self._local = threading.local()
+
+    def __call__(self, images):
+        count = len(images)
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is None or len(buffer) < count:
+            capacity = 1 << (count - 1).bit_length()
+            buffer = np.empty((capacity,) + self.image_shape, dtype=np.float32)
+            self._local.buffer = buffer
+
+        batch = buffer[:count]
+        for row, image in zip(batch, images):
+            if image.dtype == np.uint8:
+                normalize(image, out=row)
+            else:
+                row[...] = image
+        return batch
@@ -0,0 +1,196 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class MicroBatcher:
+    """Collect concurrent single-image requests into batched forward passes.
+
+    Requests are queued by ``submit``. A background worker takes the oldest
+    request, waits up to ``max_wait_ms`` for more to arrive (or until
+    ``max_batch_size`` are queued), runs ``predict_fn`` once on the stacked
+    batch and hands each row of the output back to its caller.
+    """
+
+    def __init__(self, predict_fn, name="model", max_batch_size=16, max_wait_ms=5.0, collate_fn=None):
+        """
+        Args:
+            predict_fn: Callable taking a batch and returning an array (or a
+                list/tuple of arrays for multi-output models) with one row per item
+            name: Name used in log messages and stats
+            max_batch_size: Largest batch handed to ``predict_fn``
+            max_wait_ms: Longest time the oldest request waits for company
+            collate_fn: Callable turning a list of items into a batch
+                (defaults to ``np.stack``)
+        """
+        self.predict_fn = predict_fn
+        self.name = name
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.collate_fn = collate_fn or np.stack
+
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._worker = None
+        self._closed = False
+
+        # Stats
+        self._requests = 0
+        self._batches = 0
+        self._errors = 0
+        self._max_queue_depth = 0
+        self._batch_size_counts = {}
+        self._total_queue_wait = 0.0
+        self._queued_served = 0
+        self._total_inference_time = 0.0
+
+    def submit(self, item):
+        """Queue one item for inference and return a Future for its result"""
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError(f"{self.name} batcher is closed")
+            self._ensure_worker()
+            self._queue.append((item, future, time.perf_counter()))
+            self._requests += 1
+            self._max_queue_depth = max(self._max_queue_depth, len(self._queue))
+            self._cond.notify()
+        return future
+
+    def predict(self, item, timeout=None):
+        """Run inference on a single item, blocking until its batch completes"""
+        return self.submit(item).result(timeout=timeout)
+
+    def predict_many(self, items):
+        """Run one forward pass over a caller-assembled batch, bypassing the queue.
+
+        Used by bulk uploads, which already have a full batch in hand.
+        """
+        started = time.perf_counter()
+        outputs = self.predict_fn(self.collate_fn(items))
+        with self._cond:
+            self._requests += len(items)
+            self._record_batch(len(items), time.perf_counter() - started)
+        return self._split(outputs, len(items))
+
+    def close(self):
+        """Stop the worker after the queued requests have been served"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._worker is not None:
+            self._worker.join()
+
+    def stats(self):
+        """Return queue depth and batch-size statistics"""
+        with self._cond:
+            batches = self._batches
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "queue_depth": len(self._queue),
+                "max_queue_depth": self._max_queue_depth,
+                "requests": self._requests,
+                "batches": batches,
+                "errors": self._errors,
+                "avg_batch_size": round(self._served() / batches, 2) if batches else 0.0,
+                "batch_size_histogram": {str(k): v for k, v in sorted(self._batch_size_counts.items())},
+                "avg_queue_wait_ms": round(self._total_queue_wait / self._queued_served * 1000.0, 3) if self._queued_served else 0.0,
+                "avg_inference_ms": round(self._total_inference_time / batches * 1000.0, 3) if batches else 0.0,
+            }
+
+    def _record_batch(self, size, inference_time):
+        self._batches += 1
+        self._batch_size_counts[size] = self._batch_size_counts.get(size, 0) + 1
+        self._total_inference_time += inference_time
+
+    @staticmethod
+    def _split(outputs, size):
+        """Split batched model output into one result per item.
+
+        Rows are copied: a view would keep the whole batch array alive for as
+        long as any one result is held (e.g. in the prediction cache, whose
+        size accounting only sees the row).
+        """
+        if isinstance(outputs, (list, tuple)):
+            return [tuple(np.array(output[i]) for output in outputs) for i in range(size)]
+        return [np.array(outputs[i]) for i in range(size)]
+
+    def _served(self):
+        return sum(size * count for size, count in self._batch_size_counts.items())
+
+    def _ensure_worker(self):
+        # Started lazily so that each forked gunicorn worker gets its own thread
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name=f"{self.name}-batcher", daemon=True)
+            self._worker.start()
+
+    def _next_batch(self):
+        """Block until a batch is ready and pop it from the queue"""
+        with self._cond:
+            while not self._queue:
+                if self._closed:
+                    return None
+                self._cond.wait()
+
+            deadline = self._queue[0][2] + self.max_wait
+            while len(self._queue) < self.max_batch_size and not self._closed:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            size = min(len(self._queue), self.max_batch_size)
+            return [self._queue.popleft() for _ in range(size)]
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+
+            items = [item for item, _, _ in batch]
+            futures = [future for _, future, _ in batch]
+            started = time.perf_counter()
+            try:
+                outputs = self.predict_fn(self.collate_fn(items))
+            except Exception as e:
+                print(f"Error in {self.name} batch inference: {e}")
+                with self._cond:
+                    self._errors += 1
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            finished = time.perf_counter()
+
+            with self._cond:
+                self._record_batch(len(batch), finished - started)
+                self._total_queue_wait += sum(started - enqueued for _, _, enqueued in batch)
+                self._queued_served += len(batch)
+
+            for future, result in zip(futures, self._split(outputs, len(batch))):
+                future.set_result(result)
+
+
+class BatcherOutput:
+    """One output of a multi-output MicroBatcher, used like a batcher of its own.
+
+    Lets several endpoints share one multi-head model (and its batches)
+    while each still sees only its own head's predictions.
+    """
+
+    def __init__(self, batcher, index):
+        self.batcher = batcher
+        self.index = index
+
+    def predict(self, item, timeout=None):
+        return self.batcher.predict(item, timeout=timeout)[self.index]
+
+    def predict_many(self, items):
+        return [outputs[self.index] for outputs in self.batcher.predict_many(items)]
+
+    def stats(self):
+        return self.batcher.stats()
@@ -0,0 +1,451 @@
+import os
+import sys
+import json
+import time
+import signal
+import socket
+import struct
+import argparse
+import itertools
+import threading
+import subprocess
+import multiprocessing
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+# Replica i listens on f"{socket_path}.{i}"
+DEFAULT_SOCKET_PATH = "/tmp/agrointel-inference.sock"
+
+# Every message is: header length, payload length, JSON header, payload
+FRAME = struct.Struct("!II")
+
+# Smallest shared-memory segment a connection allocates: a few 224x224x3 uint8 images
+MIN_SEGMENT_BYTES = 1024 * 1024
+
+
+class InferenceServerError(RuntimeError):
+    """The inference server could not be reached or failed to run a request"""
+
+
+def replica_socket_path(socket_path, index):
+    return f"{socket_path}.{index}"
+
+
+def send_message(sock, header, payload=b""):
+    header_bytes = json.dumps(header).encode()
+    sock.sendall(FRAME.pack(len(header_bytes), len(payload)) + header_bytes + payload)
+
+
+def recv_message(sock):
+    header_size, payload_size = FRAME.unpack(_recv_exactly(sock, FRAME.size))
+    header = json.loads(_recv_exactly(sock, header_size))
+    return header, _recv_exactly(sock, payload_size)
+
+
+def _recv_exactly(sock, size):
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:])
+        if count == 0:
+            raise ConnectionError("Connection closed by peer")
+        received += count
+    return bytes(buffer)
+
+
+def attach_segment(name):
+    """Open a segment created by another process without taking ownership of it.
+
+    Python's resource tracker would otherwise unlink the segment when this
+    process exits, pulling it out from under its creator.
+    """
+    segment = SharedMemory(name=name)
+    resource_tracker.unregister(segment._name, "shared_memory")
+    return segment
+
+
+def pack_outputs(results):
+    """Stack per-item results (arrays, or tuples of arrays for multi-output models) for sending"""
+    multi_output = isinstance(results[0], tuple)
+    outputs = [np.stack(column) for column in zip(*results)] if multi_output else [np.stack(results)]
+    outputs = [np.ascontiguousarray(output, dtype=np.float32) for output in outputs]
+    header = {"shapes": [list(output.shape) for output in outputs], "multi_output": multi_output}
+    return header, b"".join(output.tobytes() for output in outputs)
+
+
+def unpack_outputs(header, payload):
+    """Inverse of pack_outputs: return one result per item"""
+    outputs = []
+    offset = 0
+    for shape in header["shapes"]:
+        output = np.frombuffer(payload, dtype=np.float32, count=int(np.prod(shape)), offset=offset).reshape(shape)
+        outputs.append(output)
+        offset += output.nbytes
+    if header["multi_output"]:
+        return [tuple(output[i] for output in outputs) for i in range(len(outputs[0]))]
+    return list(outputs[0])
+
+
+class _Connection:
+    """One client connection to a replica, with its own shared-memory segment for inputs"""
+
+    def __init__(self, path, timeout, connect_timeout):
+        self.path = path
+        self.segment = None
+        self.sock = None
+
+        deadline = time.monotonic() + connect_timeout
+        while True:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(path)
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                # The replica only binds its socket once its models are loaded
+                sock.close()
+                if time.monotonic() >= deadline:
+                    raise InferenceServerError(f"Inference server not available at {path}")
+                time.sleep(0.5)
+        sock.settimeout(timeout)
+        self.sock = sock
+
+    def request(self, header, items=None):
+        if items:
+            header = dict(header, **self._write_items(items))
+        send_message(self.sock, header)
+        reply, payload = recv_message(self.sock)
+        if "error" in reply:
+            if reply.get("type") == "ValueError":
+                raise ValueError(reply["error"])
+            raise InferenceServerError(reply["error"])
+        return reply, payload
+
+    def _write_items(self, items):
+        """Copy request inputs into shared memory and describe their layout"""
+        if isinstance(items[0], (bytes, bytearray)):
+            lengths = [len(item) for item in items]
+            self._ensure_capacity(sum(lengths))
+            offset = 0
+            for item in items:
+                self.segment.buf[offset:offset + len(item)] = item
+                offset += len(item)
+            return {"segment": self.segment.name, "encoding": "bytes", "lengths": lengths}
+
+        first = np.asarray(items[0])
+        shape = (len(items),) + first.shape
+        self._ensure_capacity(int(np.prod(shape)) * first.dtype.itemsize)
+        batch = np.ndarray(shape, dtype=first.dtype, buffer=self.segment.buf)
+        for row, item in zip(batch, items):
+            row[...] = item
+        del batch
+        return {"segment": self.segment.name, "encoding": "array", "dtype": first.dtype.str, "shape": list(shape)}
+
+    def _ensure_capacity(self, size):
+        if self.segment is not None and self.segment.size >= size:
+            return
+        capacity = max(size, MIN_SEGMENT_BYTES, 2 * self.segment.size if self.segment else 0)
+        self._release_segment()
+        self.segment = SharedMemory(create=True, size=capacity)
+
+    def _release_segment(self):
+        if self.segment is not None:
+            self.segment.close()
+            self.segment.unlink()
+            self.segment = None
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+        self._release_segment()
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class InferenceClient:
+    """Send inference requests from an HTTP worker to the replica pool.
+
+    Each thread keeps one persistent connection, assigned to replicas round
+    robin. Inputs travel through the connection's shared-memory segment;
+    only a small JSON header and the output probabilities go over the socket.
+    """
+
+    def __init__(self, socket_path=DEFAULT_SOCKET_PATH, replicas=1, timeout=60.0, connect_timeout=60.0):
+        self.socket_path = socket_path
+        self.replicas = max(1, int(replicas))
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self._local = threading.local()
+        self._next_replica = itertools.count()
+
+    def predict(self, kind, item):
+        return self.predict_many(kind, [item])[0]
+
+    def predict_many(self, kind, items):
+        reply, payload = self._request({"op": "predict", "kind": kind}, items)
+        return unpack_outputs(reply, payload)
+
+    def status(self, kind):
+        """Return (loaded, message) for one model as reported by a replica"""
+        reply, _ = self._request({"op": "status"})
+        status = reply["status"].get(kind, {"ok": False, "message": f"Unknown model '{kind}'"})
+        return status["ok"], status["message"]
+
+    def stats(self):
+        """Collect inference statistics from every replica"""
+        replicas = []
+        for index in range(self.replicas):
+            try:
+                connection = _Connection(replica_socket_path(self.socket_path, index), self.timeout, 0)
+                try:
+                    reply, _ = connection.request({"op": "stats"})
+                finally:
+                    connection.close()
+                replicas.append(reply)
+            except (OSError, InferenceServerError) as e:
+                replicas.append({"index": index, "error": str(e)})
+        return {"socket": self.socket_path, "replicas": replicas}
+
+    def _request(self, header, items=None):
+        # A replica that was restarted drops its connections; reconnect once
+        for attempt in range(2):
+            connection = self._connection()
+            try:
+                return connection.request(header, items)
+            except socket.timeout:
+                self._drop_connection()
+                raise InferenceServerError("Inference server timed out")
+            except (ConnectionError, OSError) as e:
+                self._drop_connection()
+                if attempt:
+                    raise InferenceServerError(f"Lost connection to inference server: {e}")
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            index = next(self._next_replica) % self.replicas
+            connection = _Connection(replica_socket_path(self.socket_path, index), self.timeout, self.connect_timeout)
+            self._local.connection = connection
+        return connection
+
+    def _drop_connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+
+class RemoteModel:
+    """One model in the replica pool, used like a local batcher.
+
+    Stands in for both the loaded model and its batcher in app.py when
+    INFERENCE_SERVER is on.
+    """
+
+    def __init__(self, client, kind):
+        self.client = client
+        self.kind = kind
+
+    def ensure_loaded(self):
+        """Wait for the replicas to come up and raise if they could not load this model"""
+        ok, message = self.client.status(self.kind)
+        if not ok:
+            raise InferenceServerError(message)
+
+    def predict(self, item, timeout=None):
+        return self.client.predict(self.kind, item)
+
+    def predict_many(self, items):
+        return self.client.predict_many(self.kind, items)
+
+    def stats(self):
+        return self.client.stats()
+
+
+class ReplicaHandler:
+    """Serve requests from HTTP workers using the models loaded into this process by app.py"""
+
+    def __init__(self, app_module, status):
+        self.app = app_module
+        self.status = status
+        self.index = None
+
+    def serve_connection(self, conn):
+        segment = None
+        try:
+            while True:
+                try:
+                    header, _ = recv_message(conn)
+                except (ConnectionError, OSError):
+                    return
+                if header.get("segment") and (segment is None or segment.name != header["segment"]):
+                    segment = self._swap_segment(segment, header["segment"])
+                try:
+                    reply, payload = self.handle(header, segment)
+                except ValueError as e:
+                    reply, payload = {"error": str(e), "type": "ValueError"}, b""
+                except Exception as e:
+                    print(f"Error serving {header.get('op')} request: {e}")
+                    reply, payload = {"error": str(e), "type": type(e).__name__}, b""
+                send_message(conn, reply, payload)
+        finally:
+            conn.close()
+            self._swap_segment(segment, None)
+
+    def handle(self, header, segment):
+        op = header.get("op")
+        if op == "status":
+            return {"status": self.status}, b""
+        if op == "stats":
+            return self.stats(), b""
+        if op != "predict":
+            raise ValueError(f"Unknown operation: {op}")
+
+        kind = header["kind"]
+        for required in (("crop", "soil") if kind == "all" else (kind,)):
+            if not self.status.get(required, {}).get("ok"):
+                raise InferenceServerError(self.status.get(required, {}).get("message", f"Unknown model '{kind}'"))
+
+        items = self.read_items(header, segment)
+        predict_one, predict_many = self.predictors(kind)
+        # Single images go through the micro-batcher so requests from all HTTP workers share batches
+        results = [predict_one(items[0])] if len(items) == 1 else predict_many(items)
+        return pack_outputs(results)
+
+    def predictors(self, kind):
+        app = self.app
+        if kind == "all" and app.shared_batcher is not None:
+            return app.shared_batcher.predict, app.shared_batcher.predict_many
+        if kind == "all":
+            return (lambda item: (app.crop_batcher.predict(item), app.soil_batcher.predict(item)),
+                    lambda items: list(zip(app.crop_batcher.predict_many(items), app.soil_batcher.predict_many(items))))
+        batcher = {"crop": app.crop_batcher, "soil": app.soil_batcher}[kind]
+        return batcher.predict, batcher.predict_many
+
+    @staticmethod
+    def read_items(header, segment):
+        """Return the request inputs as views into (or, for encoded files, copies out of) shared memory"""
+        if header["encoding"] == "bytes":
+            items = []
+            offset = 0
+            for length in header["lengths"]:
+                items.append(bytes(segment.buf[offset:offset + length]))
+                offset += length
+            return items
+        batch = np.ndarray(tuple(header["shape"]), dtype=np.dtype(header["dtype"]), buffer=segment.buf)
+        return list(batch)
+
+    def stats(self):
+        app = self.app
+        return {
+            "index": self.index,
+            "pid": os.getpid(),
+            "crop": app.crop_batcher.stats() if app.crop_batcher is not None else None,
+            "soil": app.soil_batcher.stats() if app.soil_batcher is not None else None,
+            "shared_backbone": app.shared_backbone_status,
+        }
+
+    @staticmethod
+    def _swap_segment(segment, name):
+        if segment is not None:
+            try:
+                segment.close()
+            except BufferError:
+                # A view is still referenced somewhere; the mapping goes away with it
+                pass
+        return attach_segment(name) if name else None
+
+
+def run_replica(socket_path, index):
+    """Load the models through app.py, then serve requests on this replica's socket"""
+    # This process owns the models, so app.py must load them itself, right here
+    os.environ["INFERENCE_SERVER"] = "0"
+    os.environ["STARTUP_MODE"] = "lazy"
+    import app as app_module
+
+    started = time.perf_counter()
+    status = {}
+    for kind, load in (("crop", app_module.load_model_if_needed), ("soil", app_module.load_soil_model_if_needed)):
+        ok, message = load()
+        status[kind] = {"ok": ok, "message": message}
+        if not ok:
+            print(f"Replica {index}: {kind} model unavailable: {message}")
+
+    handler = ReplicaHandler(app_module, status)
+    handler.index = index
+    path = replica_socket_path(socket_path, index)
+    if os.path.exists(path):
+        os.unlink(path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen(128)
+    print(f"Inference replica {index} (pid {os.getpid()}) ready on {path} "
+          f"after {time.perf_counter() - started:.1f}s")
+
+    while True:
+        conn, _ = server.accept()
+        threading.Thread(target=handler.serve_connection, args=(conn,), daemon=True,
+                         name=f"replica-{index}-connection").start()
+
+
+def serve(socket_path=DEFAULT_SOCKET_PATH, replicas=1):
+    """Run a fixed pool of replica processes, restarting any that die"""
+    context = multiprocessing.get_context("spawn")
+    stopping = threading.Event()
+
+    def start(index):
+        process = context.Process(target=run_replica, args=(socket_path, index),
+                                  name=f"inference-replica-{index}", daemon=True)
+        process.start()
+        return process
+
+    def stop(signum, frame):
+        stopping.set()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    print(f"Starting {replicas} inference replica(s) on {socket_path}.*")
+    processes = [start(index) for index in range(replicas)]
+    try:
+        while not stopping.wait(1.0):
+            for index, process in enumerate(processes):
+                if not process.is_alive():
+                    print(f"Inference replica {index} exited with code {process.exitcode}; restarting")
+                    processes[index] = start(index)
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join(timeout=10)
+        for index in range(replicas):
+            path = replica_socket_path(socket_path, index)
+            if os.path.exists(path):
+                os.unlink(path)
+        print("Inference server stopped")
+
+
+def launch(socket_path=DEFAULT_SOCKET_PATH, replicas=1):
+    """Start the replica pool as a child process (used by gunicorn.conf.py)"""
+    script = os.path.abspath(__file__)
+    return subprocess.Popen([sys.executable, script, "--socket", socket_path, "--replicas", str(replicas)],
+                            cwd=os.path.dirname(script))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the crop and soil models to HTTP workers from a pool of processes")
+    parser.add_argument("--socket", type=str, default=os.environ.get("INFERENCE_SERVER_SOCKET", DEFAULT_SOCKET_PATH),
+                        help="Base path of the replicas' Unix sockets")
+    parser.add_argument("--replicas", type=int, default=int(os.environ.get("INFERENCE_REPLICAS", 1)),
+                        help="Number of model-owning processes")
+
+    args = parser.parse_args()
+
+    serve(args.socket, args.replicas)
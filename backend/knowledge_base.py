@@ -0,0 +1,120 @@
+import os
+import json
+import threading
+import time
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+KNOWLEDGE_PATH = os.getenv("CROP_KNOWLEDGE_PATH", os.path.join(os.path.dirname(__file__), "crop_knowledge.json"))
+
+# How often (seconds) the file's mtime is checked; a changed file is parsed
+# again and swapped in without a restart
+RELOAD_CHECK_INTERVAL = float(os.getenv("CROP_KNOWLEDGE_RELOAD_INTERVAL", 5))
+
+# Used when crop_knowledge.json is missing at startup
+DEFAULT_KNOWLEDGE = {
+    "crops": {
+        "tomato": {
+            "diseases": ["early blight", "late blight"],
+            "care": "Water regularly, provide full sun."
+        }
+    },
+    "general_care": {
+        "watering": "Most crops need 1-2 inches of water per week."
+    }
+}
+DEFAULT_TREATMENTS = ["Apply appropriate fungicide", "Remove affected plant parts", "Improve growing conditions"]
+DEFAULT_CARE = "Provide proper water and nutrients."
+
+
+class KnowledgeSnapshot:
+    """One parsed version of the knowledge file and its lookup indexes; never modified after it is built"""
+
+    def __init__(self, data, mtime=None):
+        self.mtime = mtime
+        self.crops = data.get("crops", {})
+        self.general_care = data.get("general_care", {})
+        self.default_treatments = tuple(data.get("default_treatments", DEFAULT_TREATMENTS))
+
+        self.diseases_by_crop = {crop: tuple(info.get("diseases", [])) for crop, info in self.crops.items()}
+        self.care_by_crop = {crop: info.get("care", DEFAULT_CARE) for crop, info in self.crops.items()}
+        self.treatments_by_disease = {disease: tuple(steps) for disease, steps in data.get("treatments", {}).items()}
+        self.crops_by_disease = {}
+        for crop, diseases in self.diseases_by_crop.items():
+            for disease in diseases:
+                self.crops_by_disease.setdefault(disease, []).append(crop)
+        self.crops_by_disease = {disease: tuple(crops) for disease, crops in self.crops_by_disease.items()}
+
+    def treatments(self, disease):
+        """Treatment steps for a disease, or the generic ones if it has none listed"""
+        return self.treatments_by_disease.get(disease, self.default_treatments)
+
+
+class KnowledgeBase:
+    """crop_knowledge.json, parsed once per process and reloaded when the file changes.
+
+    snapshot() is what request handlers call: between mtime checks it is a
+    plain attribute read, so no request pays for file I/O or for building
+    the indexes. A file that fails to parse, or has the wrong shape, is
+    logged once and the previous version (or the built-in default) stays in
+    use until the file changes again.
+    """
+
+    def __init__(self, path=KNOWLEDGE_PATH, check_interval=RELOAD_CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._next_check = 0.0
+        self._rejected_mtime = None
+        self.reloads = 0
+
+    def snapshot(self):
+        """Return the current KnowledgeSnapshot, loading or reloading it if due"""
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() < self._next_check:
+            return snapshot
+        with self._lock:
+            if self._snapshot is None or time.monotonic() >= self._next_check:
+                self._refresh()
+                self._next_check = time.monotonic() + self.check_interval
+            return self._snapshot
+
+    def _refresh(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            if self._snapshot is None:
+                print(f"Warning: {self.path} not found. Using default knowledge.")
+                self._snapshot = KnowledgeSnapshot(DEFAULT_KNOWLEDGE)
+            return
+        if self._snapshot is not None and self._snapshot.mtime == mtime:
+            return
+        if mtime == self._rejected_mtime:
+            # Already found broken; wait for the file to change again
+            return
+
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            # Valid JSON of the wrong shape (a list, "crops": [], ...) fails here
+            snapshot = KnowledgeSnapshot(data, mtime)
+        except (OSError, ValueError, AttributeError, TypeError, KeyError) as e:
+            print(f"Error loading {self.path}: {e}")
+            self._rejected_mtime = mtime
+            if self._snapshot is None:
+                self._snapshot = KnowledgeSnapshot(DEFAULT_KNOWLEDGE)
+            return
+
+        reloaded = self._snapshot is not None
+        self._snapshot = snapshot
+        if reloaded:
+            self.reloads += 1
+            print(f"Reloaded crop knowledge from {self.path}")
+
+
+# Shared by the disease endpoint and the Gemini chatbot
+knowledge_base = KnowledgeBase()
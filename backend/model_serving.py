@@ -0,0 +1,245 @@
+import time
+
+import numpy as np
+import tensorflow as tf
+
+from image_preprocessing import DRAFT_OVERSAMPLE
+
+# Batch sizes that get their own pre-traced graph. Larger requests are split
+# into chunks of the biggest bucket; smaller ones are zero-padded up to the
+# next bucket so no request ever triggers a retrace.
+DEFAULT_BATCH_BUCKETS = (1, 4, 8, 16, 32)
+
+# Last layer of the frozen MobileNetV2 feature extractor that train_model.py
+# and train_soil_model.py both put under their classification heads
+BACKBONE_OUTPUT_LAYER = "out_relu"
+
+
+def parse_batch_buckets(value):
+    """Parse a comma-separated list of batch sizes such as "1,4,8,16,32" """
+    if not value:
+        return DEFAULT_BATCH_BUCKETS
+    return tuple(sorted({int(size) for size in value.split(",") if size.strip()}))
+
+
+class ServingModel:
+    """Fixed-signature inference path for a Keras model.
+
+    ``Model.predict`` builds a data pipeline and a fresh execution loop on every
+    call, which costs more than the forward pass itself for a single image.
+    This wrapper traces the model once per batch-size bucket with
+    ``tf.function`` and calls the resulting concrete functions directly.
+    """
+
+    def __init__(self, keras_model, name="model", batch_buckets=DEFAULT_BATCH_BUCKETS):
+        self.model = keras_model
+        self.name = name
+        self.input_shape = tuple(keras_model.input_shape[1:])
+        self.batch_buckets = sorted({int(size) for size in batch_buckets if int(size) > 0})
+        self.max_bucket = self.batch_buckets[-1]
+
+        forward = tf.function(lambda images: keras_model(images, training=False), autograph=False)
+
+        started = time.perf_counter()
+        self._functions = {
+            size: forward.get_concrete_function(tf.TensorSpec((size,) + self.input_shape, tf.float32))
+            for size in self.batch_buckets
+        }
+        print(f"Traced {name} serving graphs for batch sizes {self.batch_buckets} "
+              f"in {time.perf_counter() - started:.2f}s")
+
+    def warmup(self, rounds=1):
+        """Run every bucket once so graph optimization happens before the first request"""
+        started = time.perf_counter()
+        for size, function in self._functions.items():
+            zeros = tf.zeros((size,) + self.input_shape, tf.float32)
+            for _ in range(rounds):
+                function(zeros)
+        print(f"Warmed up {self.name} serving graphs in {time.perf_counter() - started:.2f}s")
+
+    def predict(self, batch):
+        """Return model outputs for a batch of preprocessed images as NumPy arrays"""
+        batch = np.asarray(batch, dtype=np.float32)
+        chunks = [self._run_chunk(batch[start:start + self.max_bucket])
+                  for start in range(0, len(batch), self.max_bucket)]
+
+        if len(chunks) == 1:
+            return chunks[0]
+        if isinstance(chunks[0], list):
+            return [np.concatenate(outputs) for outputs in zip(*chunks)]
+        return np.concatenate(chunks)
+
+    __call__ = predict
+
+    def _run_chunk(self, chunk):
+        size = len(chunk)
+        bucket = next(b for b in self.batch_buckets if b >= size)
+        if bucket != size:
+            padding = np.zeros((bucket - size,) + self.input_shape, dtype=np.float32)
+            chunk = np.concatenate([chunk, padding])
+
+        outputs = self._functions[bucket](tf.constant(chunk))
+        if isinstance(outputs, (list, tuple)):
+            return [output.numpy()[:size] for output in outputs]
+        return outputs.numpy()[:size]
+
+
+def decode_images(image_bytes, size):
+    """Decode, resize and rescale a batch of encoded JPEG/PNG images inside the graph.
+
+    Mirrors image_preprocessing.decode_image: large JPEGs are decoded with DCT
+    scaling (1/2, 1/4 or 1/8) while staying at least DRAFT_OVERSAMPLE times
+    the target size, then resized with antialiased bicubic filtering and
+    scaled to [0, 1]. ``tf.map_fn`` runs the images on TensorFlow's own
+    thread pool rather than under the GIL.
+    """
+    def decode_jpeg(data):
+        shape = tf.image.extract_jpeg_shape(data)
+        scale = tf.minimum(shape[0], shape[1]) // (size * DRAFT_OVERSAMPLE)
+        branch = tf.reduce_sum(tf.cast(scale >= tf.constant([2, 4, 8]), tf.int32))
+        return tf.switch_case(branch, [
+            lambda ratio=ratio: tf.io.decode_jpeg(data, channels=3, ratio=ratio) for ratio in (1, 2, 4, 8)
+        ])
+
+    def decode_one(data):
+        image = tf.cond(
+            tf.io.is_jpeg(data),
+            lambda: decode_jpeg(data),
+            lambda: tf.io.decode_image(data, channels=3, expand_animations=False)
+        )
+        image.set_shape([None, None, 3])
+        image = tf.image.resize(image, (size, size), method="bicubic", antialias=True)
+        return tf.clip_by_value(image, 0.0, 255.0) / 255.0
+
+    return tf.map_fn(decode_one, image_bytes, fn_output_signature=tf.TensorSpec((size, size, 3), tf.float32))
+
+
+def serving_signatures(keras_model):
+    """Signatures to save with a trained model.
+
+    ``serving_default`` takes preprocessed float32 images, ``serving_bytes``
+    takes a batch of encoded JPEG/PNG files and does the preprocessing
+    itself. Both return ``{"probabilities": ...}``.
+    """
+    input_shape = tuple(keras_model.input_shape[1:])
+
+    @tf.function(input_signature=[tf.TensorSpec((None,) + input_shape, tf.float32, name="images")])
+    def serve_pixels(images):
+        return {"probabilities": keras_model(images, training=False)}
+
+    @tf.function(input_signature=[tf.TensorSpec((None,), tf.string, name="image_bytes")])
+    def serve_bytes(image_bytes):
+        return {"probabilities": keras_model(decode_images(image_bytes, input_shape[0]), training=False)}
+
+    return {"serving_default": serve_pixels, "serving_bytes": serve_bytes}
+
+
+class BytesServingModel:
+    """Serve a Keras model on raw uploaded files with preprocessing done in the graph.
+
+    Built from the loaded Keras model with the same ``decode_images`` used by
+    the ``serving_bytes`` signature, so it also works for the shared-backbone
+    model, which is assembled at load time and never exported. The input has
+    no fixed batch size, so one trace covers every batch.
+    """
+
+    def __init__(self, keras_model, name="model"):
+        self.model = keras_model
+        self.name = name
+        self.image_size = int(keras_model.input_shape[1])
+
+        forward = tf.function(
+            lambda image_bytes: keras_model(decode_images(image_bytes, self.image_size), training=False),
+            autograph=False
+        )
+        started = time.perf_counter()
+        self._function = forward.get_concrete_function(tf.TensorSpec((None,), tf.string))
+        print(f"Traced {name} bytes serving graph in {time.perf_counter() - started:.2f}s")
+
+    def warmup(self, rounds=1):
+        """Decode and classify a blank JPEG and PNG so the first request skips graph optimization"""
+        started = time.perf_counter()
+        blank = tf.zeros((self.image_size, self.image_size, 3), tf.uint8)
+        samples = [tf.io.encode_jpeg(blank).numpy(), tf.io.encode_png(blank).numpy()]
+        for _ in range(rounds):
+            self._function(tf.constant(samples))
+        print(f"Warmed up {self.name} bytes serving graph in {time.perf_counter() - started:.2f}s")
+
+    def predict(self, batch):
+        """Return model outputs for a list of encoded images.
+
+        An image that fails to decode gets a row of NaN instead of failing
+        the other images in its batch.
+        """
+        batch = list(batch)
+        try:
+            return self._run(batch)
+        except tf.errors.InvalidArgumentError:
+            if len(batch) == 1:
+                return self._failed_rows(1)
+        rows = []
+        for item in batch:
+            try:
+                rows.append(self._run([item]))
+            except tf.errors.InvalidArgumentError:
+                rows.append(self._failed_rows(1))
+        if isinstance(rows[0], list):
+            return [np.concatenate(outputs) for outputs in zip(*rows)]
+        return np.concatenate(rows)
+
+    __call__ = predict
+
+    def _run(self, batch):
+        outputs = self._function(tf.constant(batch, dtype=tf.string))
+        if isinstance(outputs, (list, tuple)):
+            return [output.numpy() for output in outputs]
+        return outputs.numpy()
+
+    def _failed_rows(self, count):
+        outputs = self._function.structured_outputs
+        if isinstance(outputs, (list, tuple)):
+            return [np.full((count,) + tuple(output.shape[1:]), np.nan, dtype=np.float32) for output in outputs]
+        return np.full((count,) + tuple(outputs.shape[1:]), np.nan, dtype=np.float32)
+
+
+def split_backbone(keras_model, layer_name=BACKBONE_OUTPUT_LAYER):
+    """Split a transfer-learning model into a (backbone, head) pair of Keras models.
+
+    The head is rebuilt on a fresh input by re-applying, in order, the layers
+    that follow ``layer_name``; this relies on the head being a simple chain,
+    which holds for both training scripts.
+    """
+    layer_names = [layer.name for layer in keras_model.layers]
+    split_index = layer_names.index(layer_name)
+    features = keras_model.get_layer(layer_name).output
+    backbone = tf.keras.Model(keras_model.input, features, name=f"{keras_model.name}_backbone")
+
+    head_input = tf.keras.Input(shape=features.shape[1:])
+    x = head_input
+    for layer in keras_model.layers[split_index + 1:]:
+        x = layer(x)
+    head = tf.keras.Model(head_input, x, name=f"{keras_model.name}_head")
+    return backbone, head
+
+
+def build_shared_model(models, layer_name=BACKBONE_OUTPUT_LAYER):
+    """Combine models with identical frozen backbones into one model with several heads.
+
+    The combined model runs the backbone once and returns one output per
+    input model, in the same order. Returns None if the backbones differ (for
+    example if one was fine-tuned), in which case the models must be served
+    separately.
+    """
+    splits = [split_backbone(keras_model, layer_name) for keras_model in models]
+    backbone = splits[0][0]
+    reference_weights = backbone.get_weights()
+
+    for other_backbone, _ in splits[1:]:
+        other_weights = other_backbone.get_weights()
+        if len(other_weights) != len(reference_weights) or not all(
+                np.array_equal(a, b) for a, b in zip(reference_weights, other_weights)):
+            return None
+
+    features = backbone.output
+    outputs = [head(features) for _, head in splits]
+    return tf.keras.Model(backbone.input, outputs, name="shared_backbone")
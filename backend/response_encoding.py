@@ -0,0 +1,190 @@
+import gzip
+import hashlib
+import threading
+from decimal import Decimal
+from functools import wraps
+
+from flask import g, request
+from flask.json.provider import DefaultJSONProvider
+
+from caching import TTLCache
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Only text formats shrink enough to be worth compressing
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "image/svg+xml")
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson, falling back to the standard encoder if it is not installed.
+
+    Keys are sorted like Flask's default, numpy arrays and scalars are
+    serialized natively, and anything else orjson does not know goes
+    through DefaultJSONProvider.default (Decimal, __html__, ...).
+    """
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return self._encode(obj).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        # Indented in debug mode, like the default provider
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        # Skip the bytes -> str -> bytes round trip of dumps()
+        return self._app.response_class(self._encode(obj, indent) + b"\n", mimetype=self.mimetype)
+
+    def _encode(self, obj, indent=False):
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=_json_default, option=option)
+
+
+def _json_default(o):
+    if isinstance(o, Decimal):
+        return str(o)
+    return DefaultJSONProvider.default(o)
+
+
+def negotiate_encoding(accept_encodings, available):
+    """Pick the encoding the client weights highest among `available` (in server preference order), or None"""
+    best, best_quality = None, 0
+    for encoding in available:
+        quality = accept_encodings[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(body, encoding, gzip_level=6, brotli_quality=5):
+    if encoding == "br":
+        return brotli.compress(body, quality=brotli_quality)
+    # mtime=0 keeps the output identical for identical input
+    return gzip.compress(body, compresslevel=gzip_level, mtime=0)
+
+
+class ResponseEncoder:
+    """App-wide response post-processing: content-encoding negotiation, strong ETags and 304 replies.
+
+    Responses larger than ``min_bytes`` in a text format are compressed
+    with brotli (when installed) or gzip, whichever the client's
+    Accept-Encoding prefers. Views wrapped with ``etag`` get a strong ETag
+    derived from their uncompressed body, with the encoding appended as
+    for any other representation, and are answered with 304 Not Modified
+    when the client already holds that version. Compressed bodies of
+    ETagged responses are cached, since the same bytes are requested over
+    and over.
+    """
+
+    def __init__(self, min_bytes=500, gzip_level=6, brotli_quality=5, compression_enabled=True,
+                 cache_max_entries=256, cache_max_bytes=8 * 1024 * 1024):
+        self.min_bytes = min_bytes
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.compression_enabled = compression_enabled
+        self.encodings = ("br", "gzip") if brotli is not None else ("gzip",)
+        self._compressed = TTLCache(max_entries=cache_max_entries, max_bytes=cache_max_bytes, ttl_seconds=24 * 3600)
+
+        self._lock = threading.Lock()
+        self.compressed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.not_modified = 0
+
+    def init_app(self, app):
+        app.after_request(self.process)
+
+    def etag(self, view):
+        """Decorator for views whose body only changes when the data behind them does"""
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            g.strong_etag = True
+            return view(*args, **kwargs)
+        return wrapper
+
+    def process(self, response):
+        if response.direct_passthrough or response.is_streamed or response.status_code != 200:
+            return response
+        if "Content-Encoding" in response.headers:
+            return response
+
+        compressible = response.mimetype.startswith(COMPRESSIBLE_TYPES) if response.mimetype else False
+        encoding = None
+        if self.compression_enabled and compressible:
+            encoding = negotiate_encoding(request.accept_encodings, self.encodings)
+            response.vary.add("Accept-Encoding")
+
+        body = response.get_data()
+        if len(body) < self.min_bytes:
+            encoding = None
+
+        digest = None
+        if g.get("strong_etag"):
+            digest = hashlib.blake2b(body, digest_size=16).hexdigest()
+            tag = f"{digest}-{encoding}" if encoding else digest
+            response.set_etag(tag)
+            # Only the representation negotiated for this request counts: a client holding
+            # the brotli body that no longer accepts br must get the body again
+            if request.method in ("GET", "HEAD") and request.if_none_match.contains_weak(tag):
+                with self._lock:
+                    self.not_modified += 1
+                return self._not_modified(response)
+
+        if encoding is None:
+            return response
+
+        key = (digest, encoding) if digest else None
+        compressed = self._compressed.get(key) if key else None
+        if compressed is None:
+            compressed = compress(body, encoding, self.gzip_level, self.brotli_quality)
+            if key:
+                self._compressed.put(key, compressed)
+
+        response.set_data(compressed)
+        response.headers["Content-Encoding"] = encoding
+        with self._lock:
+            self.compressed += 1
+            self.bytes_in += len(body)
+            self.bytes_out += len(compressed)
+        return response
+
+    def stats(self):
+        with self._lock:
+            stats = {
+                "encodings": list(self.encodings),
+                "compressed_responses": self.compressed,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "not_modified": self.not_modified,
+            }
+        stats["compression_ratio"] = round(stats["bytes_out"] / stats["bytes_in"], 3) if stats["bytes_in"] else None
+        stats["cache"] = self._compressed.stats()
+        return stats
+
+    @staticmethod
+    def _not_modified(response):
+        response.status_code = 304
+        response.set_data(b"")
+        # A 304 carries the validators and Vary, but no entity headers
+        for header in ("Content-Type", "Content-Length"):
+            response.headers.pop(header, None)
+        return response
@@ -1,3 +1,8 @@
+import re
+
+# Split after sentence-ending punctuation, keeping the space with the next sentence
+SENTENCE_END = re.compile(r"(?<=[.!?])(?= )")
+
 class SimpleCropChatbot:
     """A simple rule-based fallback chatbot for when the API is unavailable"""
     
@@ -31,5 +36,11 @@ class SimpleCropChatbot:
             "source": "fallback"
         }
 
+    def stream_response(self, user_input):
+        """Yield the same answer as get_response, one sentence at a time, for the streaming chat endpoint"""
+        response = self.get_response(user_input)["response"]
+        for sentence in SENTENCE_END.split(response):
+            yield sentence
+
 # Create a singleton instance
 simple_chatbot = SimpleCropChatbot()
\ No newline at end of file
@@ -0,0 +1,358 @@
+import json
+import math
+import time
+import random
+import hashlib
+import argparse
+import threading
+from datetime import datetime, timezone
+from flask import Flask, Response, jsonify, request
+
+# Models returned by the fake list_models(); the first matches PREFERRED_MODELS in gemini_chatbot.py
+STUB_MODELS = ["models/gemini-1.5-pro", "models/gemini-1.5-flash", "models/gemini-2.0-flash"]
+
+CONDITIONS = [
+    (800, "clear sky", "01d"),
+    (801, "few clouds", "02d"),
+    (803, "broken clouds", "04d"),
+    (500, "light rain", "10d"),
+    (501, "moderate rain", "10d"),
+    (211, "thunderstorm", "11d"),
+]
+
+
+class Latency:
+    """Latency distribution parsed from a spec such as 'fixed:100', 'uniform:50:200',
+    'normal:120:30' or 'lognormal:120:0.5' (median ms, sigma). Samples are in seconds."""
+
+    def __init__(self, spec):
+        self.spec = spec
+        parts = spec.split(":")
+        self.kind = parts[0]
+        self.params = [float(value) for value in parts[1:]]
+        expected = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2}
+        if expected.get(self.kind) != len(self.params):
+            raise ValueError(f"Bad latency spec {spec!r}; use fixed:MS, uniform:LOW:HIGH, normal:MEAN:SD or lognormal:MEDIAN:SIGMA")
+
+    def sample(self, rng):
+        if self.kind == "fixed":
+            ms = self.params[0]
+        elif self.kind == "uniform":
+            ms = rng.uniform(*self.params)
+        elif self.kind == "normal":
+            ms = rng.gauss(*self.params)
+        else:
+            ms = self.params[0] * math.exp(rng.gauss(0.0, self.params[1]))
+        return max(ms, 0.0) / 1000.0
+
+
+class TokenBucket:
+    """Requests-per-second limit; rate 0 means unlimited"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self):
+        if self.rate <= 0:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+class StubState:
+    """Fault-injection settings and request counters, shared by all handler threads"""
+
+    def __init__(self, weather_latency, gemini_latency, error_rate, throttle_rate, rate_limit_rps,
+                 gemini_words, gemini_chunk_ms, seed):
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counts = {}
+        self.configure(weather_latency=weather_latency, gemini_latency=gemini_latency, error_rate=error_rate,
+                       throttle_rate=throttle_rate, rate_limit_rps=rate_limit_rps, gemini_words=gemini_words,
+                       gemini_chunk_ms=gemini_chunk_ms)
+
+    def configure(self, **settings):
+        """Change settings at runtime (also exposed as POST /__stub/config)"""
+        with self.lock:
+            for name, value in settings.items():
+                if name in ("weather_latency", "gemini_latency"):
+                    setattr(self, name, Latency(value))
+                elif name == "rate_limit_rps":
+                    self.buckets = {"weather": TokenBucket(float(value)), "gemini": TokenBucket(float(value))}
+                    self.rate_limit_rps = float(value)
+                elif name in ("error_rate", "throttle_rate", "gemini_chunk_ms"):
+                    setattr(self, name, float(value))
+                elif name == "gemini_words":
+                    self.gemini_words = int(value)
+                else:
+                    raise ValueError(f"Unknown setting {name!r}")
+
+    def settings(self):
+        with self.lock:
+            return {
+                "weather_latency": self.weather_latency.spec,
+                "gemini_latency": self.gemini_latency.spec,
+                "error_rate": self.error_rate,
+                "throttle_rate": self.throttle_rate,
+                "rate_limit_rps": self.rate_limit_rps,
+                "gemini_words": self.gemini_words,
+                "gemini_chunk_ms": self.gemini_chunk_ms,
+            }
+
+    def draw(self, service):
+        """Decide one request's fate: (latency seconds, None | 'throttled' | 'error')"""
+        with self.lock:
+            latency = (self.weather_latency if service == "weather" else self.gemini_latency).sample(self.rng)
+            roll = self.rng.random()
+            if not self.buckets[service].take() or roll < self.throttle_rate:
+                fault = "throttled"
+            elif roll < self.throttle_rate + self.error_rate:
+                fault = "error"
+            else:
+                fault = None
+        return latency, fault
+
+    def count(self, endpoint, status):
+        with self.lock:
+            key = f"{endpoint} {status}"
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+
+def location_rng(lat, lon, salt=""):
+    """Random generator seeded by the coordinates, so a location always gets the same weather"""
+    digest = hashlib.blake2b(f"{lat:.4f},{lon:.4f},{salt}".encode(), digest_size=8).digest()
+    return random.Random(int.from_bytes(digest, "little"))
+
+
+def fake_conditions(rng, temp):
+    weather_id, description, icon = rng.choice(CONDITIONS)
+    return {
+        "main": {
+            "temp": round(temp, 2),
+            "feels_like": round(temp + rng.uniform(-2, 3), 2),
+            "temp_min": round(temp - rng.uniform(0, 3), 2),
+            "temp_max": round(temp + rng.uniform(0, 3), 2),
+            "pressure": rng.randint(1000, 1025),
+            "humidity": rng.randint(30, 95),
+        },
+        "weather": [{"id": weather_id, "main": description.split()[-1].title(), "description": description, "icon": icon}],
+        "wind": {"speed": round(rng.uniform(0, 9), 2), "deg": rng.randint(0, 359)},
+        "clouds": {"all": rng.randint(0, 100)},
+    }
+
+
+def fake_current(lat, lon, now):
+    rng = location_rng(lat, lon, now // 600)
+    base = 30.0 - 0.4 * abs(lat)
+    payload = fake_conditions(rng, base + rng.uniform(-4, 4))
+    payload.update({
+        "coord": {"lon": lon, "lat": lat},
+        "base": "stations",
+        "visibility": 10000,
+        "dt": now,
+        "sys": {"country": "IN", "sunrise": now - 6 * 3600, "sunset": now + 6 * 3600},
+        "timezone": 19800,
+        "id": int(abs(lat * 1000 + lon)),
+        "name": f"Stub {lat:.2f},{lon:.2f}",
+        "cod": 200,
+    })
+    return payload
+
+
+def fake_forecast(lat, lon, now):
+    rng = location_rng(lat, lon, now // 10800)
+    start = now - now % 10800 + 10800
+    base = 30.0 - 0.4 * abs(lat)
+    items = []
+    for step in range(40):
+        dt = start + step * 10800
+        hour = datetime.fromtimestamp(dt, timezone.utc).hour
+        item = fake_conditions(rng, base + 4 * math.sin((hour - 9) / 24 * 2 * math.pi) + rng.uniform(-2, 2))
+        item.update({"dt": dt, "pop": round(rng.random(), 2),
+                     "dt_txt": datetime.fromtimestamp(dt, timezone.utc).strftime("%Y-%m-%d %H:%M:%S")})
+        items.append(item)
+    return {
+        "cod": "200",
+        "message": 0,
+        "cnt": len(items),
+        "list": items,
+        "city": {"id": int(abs(lat * 1000 + lon)), "name": f"Stub {lat:.2f},{lon:.2f}",
+                 "coord": {"lat": lat, "lon": lon}, "country": "IN", "timezone": 19800},
+    }
+
+
+def fake_answer(prompt, words):
+    """Deterministic farming-flavoured text of roughly the requested length"""
+    question = prompt.rsplit("User Question:", 1)[-1].split("\n")[0].strip() or "your question"
+    rng = random.Random(hashlib.blake2b(prompt.encode(), digest_size=8).digest())
+    vocabulary = ("soil moisture nitrogen irrigation mulch compost rotation seedlings canopy yield pests "
+                  "fungicide drainage humidity rainfall harvest spacing pruning roots leaves sunlight").split()
+    body = " ".join(rng.choice(vocabulary) for _ in range(max(words - 12, 0)))
+    return f"Here is some advice about {question[:80]}: {body}."
+
+
+def create_app(state):
+    app = Flask(__name__)
+
+    def inject(service, endpoint):
+        """Sleep for the drawn latency and return a fault response, or None to proceed"""
+        latency, fault = state.draw(service)
+        time.sleep(latency)
+        if fault is None:
+            return None
+        state.count(endpoint, 429 if fault == "throttled" else 503)
+        if service == "weather":
+            if fault == "throttled":
+                return jsonify({"cod": 429, "message": "Your account is temporary blocked due to exceeding of requests limitation"}), 429
+            return jsonify({"cod": 503, "message": "Service temporarily unavailable"}), 503
+        if fault == "throttled":
+            return jsonify({"error": {"code": 429, "message": "Resource has been exhausted (e.g. check quota).",
+                                      "status": "RESOURCE_EXHAUSTED"}}), 429
+        return jsonify({"error": {"code": 503, "message": "The model is overloaded. Please try again later.",
+                                  "status": "UNAVAILABLE"}}), 503
+
+    def weather_request(endpoint, build):
+        if not request.args.get("appid"):
+            state.count(endpoint, 401)
+            return jsonify({"cod": 401, "message": "Invalid API key. Please see https://openweathermap.org/faq#error401 for more info."}), 401
+        fault = inject("weather", endpoint)
+        if fault is not None:
+            return fault
+        try:
+            lat, lon = float(request.args["lat"]), float(request.args["lon"])
+            if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+                raise ValueError
+        except (KeyError, ValueError):
+            state.count(endpoint, 400)
+            return jsonify({"cod": "400", "message": "wrong latitude"}), 400
+        state.count(endpoint, 200)
+        return jsonify(build(lat, lon, int(time.time())))
+
+    @app.route("/data/2.5/weather")
+    def weather():
+        return weather_request("weather", fake_current)
+
+    @app.route("/data/2.5/forecast")
+    def forecast():
+        return weather_request("forecast", fake_forecast)
+
+    @app.route("/<version>/models", methods=["GET"])
+    def list_models(version):
+        state.count("list_models", 200)
+        return jsonify({"models": [{
+            "name": name,
+            "displayName": name.split("/")[-1],
+            "supportedGenerationMethods": ["generateContent", "streamGenerateContent", "countTokens"],
+        } for name in STUB_MODELS]})
+
+    @app.route("/<version>/models/<model>:generateContent", methods=["POST"])
+    def generate_content(version, model):
+        fault = inject("gemini", "generateContent")
+        if fault is not None:
+            return fault
+        text = fake_answer(prompt_text(), state.gemini_words)
+        state.count("generateContent", 200)
+        return jsonify(candidate_response(text))
+
+    @app.route("/<version>/models/<model>:streamGenerateContent", methods=["POST"])
+    def stream_generate_content(version, model):
+        fault = inject("gemini", "streamGenerateContent")
+        if fault is not None:
+            return fault
+        words = fake_answer(prompt_text(), state.gemini_words).split(" ")
+        chunks = [" ".join(words[i:i + 8]) + (" " if i + 8 < len(words) else "") for i in range(0, len(words), 8)]
+        chunk_delay = state.gemini_chunk_ms / 1000.0
+        sse = request.args.get("alt") == "sse"
+        state.count("streamGenerateContent", 200)
+
+        def generate():
+            # alt=sse streams server-sent events; otherwise a JSON array is streamed element by element
+            if not sse:
+                yield "["
+            for i, chunk in enumerate(chunks):
+                if i:
+                    time.sleep(chunk_delay)
+                body = json.dumps(candidate_response(chunk, final=i == len(chunks) - 1))
+                yield f"data: {body}\r\n\r\n" if sse else ("," if i else "") + body
+            if not sse:
+                yield "]"
+
+        return Response(generate(), mimetype="text/event-stream" if sse else "application/json")
+
+    @app.route("/__stub/stats", methods=["GET"])
+    def stub_stats():
+        with state.lock:
+            counts = dict(state.counts)
+        return jsonify({"settings": state.settings(), "requests": counts})
+
+    @app.route("/__stub/config", methods=["POST"])
+    def stub_config():
+        try:
+            state.configure(**(request.get_json(silent=True) or {}))
+        except (ValueError, TypeError) as e:
+            return jsonify({"error": str(e)}), 400
+        return jsonify(state.settings())
+
+    @app.route("/__stub/reset", methods=["POST"])
+    def stub_reset():
+        with state.lock:
+            state.counts.clear()
+        return jsonify({"status": "ok"})
+
+    return app
+
+
+def prompt_text():
+    """Concatenate the text parts of a generateContent request"""
+    body = request.get_json(silent=True) or {}
+    return "\n".join(part.get("text", "") for content in body.get("contents", []) for part in content.get("parts", []))
+
+
+def candidate_response(text, final=True):
+    response = {"candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "index": 0}]}
+    if final:
+        response["candidates"][0]["finishReason"] = "STOP"
+        response["usageMetadata"] = {"promptTokenCount": 0, "candidatesTokenCount": len(text.split())}
+    return response
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for OpenWeatherMap and the Gemini API, with latency and fault injection")
+    parser.add_argument("--host", type=str, default="127.0.0.1",
+                        help="Interface to listen on")
+    parser.add_argument("--port", type=int, default=8090,
+                        help="Port to listen on")
+    parser.add_argument("--weather_latency", type=str, default="lognormal:120:0.4",
+                        help="OpenWeatherMap latency: fixed:MS, uniform:LOW:HIGH, normal:MEAN:SD or lognormal:MEDIAN:SIGMA")
+    parser.add_argument("--gemini_latency", type=str, default="lognormal:900:0.5",
+                        help="Gemini time to first token, same format")
+    parser.add_argument("--gemini_chunk_ms", type=float, default=60,
+                        help="Delay between chunks of a streamed Gemini answer")
+    parser.add_argument("--gemini_words", type=int, default=120,
+                        help="Approximate length of Gemini answers")
+    parser.add_argument("--error_rate", type=float, default=0.0,
+                        help="Share of requests answered with 503")
+    parser.add_argument("--throttle_rate", type=float, default=0.0,
+                        help="Share of requests answered with 429")
+    parser.add_argument("--rate_limit_rps", type=float, default=0,
+                        help="Requests per second per service before answering 429 (0 = unlimited)")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Seed for latency and fault draws")
+
+    args = parser.parse_args()
+
+    stub_state = StubState(args.weather_latency, args.gemini_latency, args.error_rate, args.throttle_rate,
+                           args.rate_limit_rps, args.gemini_words, args.gemini_chunk_ms, args.seed)
+    print(f"Stub server on http://{args.host}:{args.port}")
+    print(f"  OPENWEATHERMAP_BASE_URL=http://{args.host}:{args.port}/data/2.5")
+    print(f"  GEMINI_API_ENDPOINT=http://{args.host}:{args.port}")
+    create_app(stub_state).run(host=args.host, port=args.port, threaded=True)
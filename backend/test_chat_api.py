@@ -0,0 +1,62 @@
+import os
+
+# Models and the chatbot are loaded on first use, so importing the app stays fast
+os.environ.setdefault("STARTUP_MODE", "lazy")
+
+import pytest
+
+import app as app_module
+from chat_cache import SemanticChatCache
+from chat_orchestrator import ChatOrchestrator
+
+QUESTION = "How often should I water my tomatoes?"
+
+
+@pytest.fixture
+def client(monkeypatch):
+    # No Gemini calls and no cached answers from other tests
+    monkeypatch.setattr(app_module, "chat_cache", SemanticChatCache(max_entries=16, enabled=False))
+    return app_module.app.test_client()
+
+
+def failing_remote(message):
+    raise RuntimeError("Gemini unavailable")
+
+
+def assert_chat_schema(body, source):
+    assert isinstance(body["response"], str) and body["response"]
+    assert body["source"] == source
+
+
+def test_chatbot_disabled(client, monkeypatch):
+    monkeypatch.setattr(app_module, "CHATBOT_ENABLED", False)
+    response = client.post("/api/chat", json={"message": QUESTION})
+    assert response.status_code == 200
+    assert_chat_schema(response.get_json(), "simple-chatbot")
+
+
+def test_orchestrator_fallback(client, monkeypatch):
+    monkeypatch.setattr(app_module, "CHATBOT_ENABLED", True)
+    monkeypatch.setattr(app_module, "chat_orchestrator",
+                        ChatOrchestrator(failing_remote, lambda message: app_module.simple_chat_answer(message)["response"]))
+    response = client.post("/api/chat", json={"message": QUESTION})
+    assert response.status_code == 200
+    assert_chat_schema(response.get_json(), "simple-chatbot")
+    assert response.get_json()["fallback_reason"] == "error"
+
+
+def test_exception_fallback(client, monkeypatch):
+    monkeypatch.setattr(app_module, "CHATBOT_ENABLED", True)
+    monkeypatch.setattr(app_module.chat_cache, "get", failing_remote)
+    response = client.post("/api/chat", json={"message": QUESTION})
+    assert response.status_code == 200
+    assert_chat_schema(response.get_json(), "simple-chatbot")
+
+
+def test_remote_answer(client, monkeypatch):
+    monkeypatch.setattr(app_module, "CHATBOT_ENABLED", True)
+    monkeypatch.setattr(app_module, "chat_orchestrator", ChatOrchestrator(
+        lambda message: {"response": "Water deeply twice a week.", "source": "gemini"}, lambda message: "unused"))
+    response = client.post("/api/chat", json={"message": QUESTION})
+    assert response.status_code == 200
+    assert_chat_schema(response.get_json(), "gemini")
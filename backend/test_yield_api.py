@@ -0,0 +1,39 @@
+import math
+import os
+
+# Models and the chatbot are loaded on first use, so importing the app stays fast
+os.environ.setdefault("STARTUP_MODE", "lazy")
+
+import pytest
+
+from app import app
+
+BODY = {
+    "crop_type": "wheat",
+    "location": {"lat": 28.6, "lon": 77.2},
+    "health_status": "good",
+    "weather_summary": {"days": 90},
+}
+
+
+@pytest.fixture
+def client():
+    return app.test_client()
+
+
+def test_null_weather_values_fall_back_to_ideal(client):
+    missing = client.post("/api/yield-prediction", json=BODY)
+    nulls = client.post("/api/yield-prediction", json={
+        **BODY, "weather_summary": {"days": 90, "avg_max_temp_c": None, "total_precipitation_mm": None}})
+
+    assert missing.status_code == nulls.status_code == 200
+    predicted = nulls.get_json()["predicted_yield_tons_per_hectare"]
+    assert math.isfinite(predicted)
+    assert predicted == missing.get_json()["predicted_yield_tons_per_hectare"]
+    assert "nan" not in nulls.get_json()["storage_recommendation"]
+
+
+def test_non_numeric_weather_values_are_rejected(client):
+    for value in ([30, 31], "hot"):
+        response = client.post("/api/yield-prediction", json={**BODY, "weather_summary": {"avg_max_temp_c": value}})
+        assert response.status_code == 400
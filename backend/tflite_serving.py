@@ -0,0 +1,85 @@
+import threading
+
+import numpy as np
+
+# File names written by export_tflite.py next to each SavedModel
+TFLITE_MODEL_FILES = {
+    "tflite-fp16": "model_fp16.tflite",
+    "tflite-int8": "model_int8.tflite",
+}
+
+
+def load_interpreter_class():
+    """Return the TFLite Interpreter class.
+
+    Imported on first use so that importing this module never loads
+    TensorFlow. The standalone runtime is preferred: it is a few MB instead
+    of all of TensorFlow.
+    """
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        import tensorflow as tf
+        Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+
+class TFLiteServingModel:
+    """Run a converted .tflite model with the same predict() interface as ServingModel.
+
+    The interpreter is not thread-safe, so calls are serialized with a lock.
+    Images are run one at a time: the TFLite CPU kernels gain little from
+    batching and this avoids re-allocating tensors for every batch size.
+    """
+
+    def __init__(self, model_file, name="model", num_threads=None):
+        self.name = name
+        self.model_file = model_file
+        self.interpreter = load_interpreter_class()(model_path=model_file, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+
+        input_details = self.interpreter.get_input_details()[0]
+        self._input_index = input_details["index"]
+        self._input_dtype = input_details["dtype"]
+        self._input_scale, self._input_zero_point = input_details["quantization"]
+        self.input_shape = tuple(input_details["shape"][1:])
+
+        output_details = self.interpreter.get_output_details()[0]
+        self._output_index = output_details["index"]
+        self._output_scale, self._output_zero_point = output_details["quantization"]
+        self.num_classes = int(output_details["shape"][-1])
+        self._lock = threading.Lock()
+
+        print(f"Loaded {name} TFLite model from {model_file} (input dtype: {np.dtype(self._input_dtype).name})")
+
+    def warmup(self, rounds=1):
+        """Run a few zero inputs so kernels are prepared before the first request"""
+        if rounds <= 0:
+            return
+        self.predict(np.zeros((rounds,) + self.input_shape, dtype=np.float32))
+
+    def predict(self, batch):
+        """Return class probabilities for a batch of preprocessed images"""
+        batch = np.asarray(batch, dtype=np.float32)
+        if not len(batch):
+            return np.zeros((0, self.num_classes), dtype=np.float32)
+        outputs = []
+        with self._lock:
+            for image in batch:
+                self.interpreter.set_tensor(self._input_index, self._quantize(image[np.newaxis]))
+                self.interpreter.invoke()
+                outputs.append(self._dequantize(self.interpreter.get_tensor(self._output_index)[0]))
+        return np.stack(outputs)
+
+    __call__ = predict
+
+    def _quantize(self, image):
+        if self._input_dtype == np.float32:
+            return image
+        # Fully integer models take quantized input
+        return np.round(image / self._input_scale + self._input_zero_point).astype(self._input_dtype)
+
+    def _dequantize(self, output):
+        if output.dtype == np.float32:
+            return output.copy()
+        return (output.astype(np.float32) - self._output_zero_point) * self._output_scale
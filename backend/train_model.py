@@ -6,6 +6,7 @@ from tensorflow.keras.preprocessing.image import ImageDataGenerator
 from tensorflow.keras.applications import MobileNetV2
 from tensorflow.keras.layers import Dense, GlobalAveragePooling2D, Dropout
 from tensorflow.keras.models import Model
+from model_serving import serving_signatures
 
 def train_model(data_path, model_save_path, epochs=3, batch_size=4):
     """
@@ -44,6 +45,7 @@ def train_model(data_path, model_save_path, epochs=3, batch_size=4):
     train_generator = train_datagen.flow_from_directory(
         os.path.join(data_path, "Train"),
         target_size=(IMG_SIZE, IMG_SIZE),
+        interpolation='bicubic',
         batch_size=batch_size,
         class_mode='categorical'
     )
@@ -51,6 +53,7 @@ def train_model(data_path, model_save_path, epochs=3, batch_size=4):
     validation_generator = val_datagen.flow_from_directory(
         os.path.join(data_path, "Validation"),
         target_size=(IMG_SIZE, IMG_SIZE),
+        interpolation='bicubic',
         batch_size=batch_size,
         class_mode='categorical'
     )
@@ -91,8 +94,8 @@ def train_model(data_path, model_save_path, epochs=3, batch_size=4):
         epochs=epochs
     )
     
-    # Save model
-    model.save(model_save_path)
+    # Save model with a pixel signature and one that takes encoded image bytes
+    model.save(model_save_path, signatures=serving_signatures(model))
     print(f"Model saved to {model_save_path}")
     
     # Save class indices mapping
@@ -0,0 +1,115 @@
+from datetime import datetime, timedelta, timezone
+
+ICAL_PRODUCT_ID = "-//AgroIntel//Treatment Plan//EN"
+
+
+def treatment_phases(treatments, duration_days, start_date):
+    """
+    Split a treatment period into phases that each repeat one action.
+
+    Day 1 is diagnosis plus the first treatment, then the first, second and
+    third treatment steps each take a third of the period. Consecutive days
+    with the same action form one phase, so a plan is at most four entries
+    however long it runs.
+
+    Args:
+        treatments: Treatment steps for the disease, in order
+        duration_days: Length of the treatment period
+        start_date: date of day 1
+
+    Returns:
+        list of dicts with phase, start_day, end_day (1-based, inclusive), start_date, end_date, days and action
+    """
+    last_step = len(treatments) - 1
+    # Day index (0-based) at which each step starts; day 0 is always diagnosis
+    starts = [0, 1, duration_days // 3, duration_days * 2 // 3]
+    actions = ["Diagnose and " + treatments[0]] + [treatments[min(step, last_step)] for step in range(3)]
+
+    phases = []
+    for index, (first, action) in enumerate(zip(starts, actions)):
+        first = max(first, 1) if index else 0
+        stop = starts[index + 1] if index + 1 < len(starts) else duration_days
+        stop = min(max(stop, 1), duration_days)
+        if first >= stop:
+            continue
+        if phases and phases[-1]["action"] == action:
+            phases[-1]["end_day"] = stop
+            continue
+        phases.append({"start_day": first + 1, "end_day": stop, "action": action})
+
+    for number, phase in enumerate(phases, 1):
+        phase["phase"] = number
+        phase["days"] = phase["end_day"] - phase["start_day"] + 1
+        phase["start_date"] = (start_date + timedelta(days=phase["start_day"] - 1)).isoformat()
+        phase["end_date"] = (start_date + timedelta(days=phase["end_day"] - 1)).isoformat()
+    return phases
+
+
+def expand_phases(phases, start_date):
+    """The day-by-day timeline (one entry per day) covered by a list of phases"""
+    timeline = []
+    for phase in phases:
+        for day in range(phase["start_day"], phase["end_day"] + 1):
+            timeline.append({
+                "date": (start_date + timedelta(days=day - 1)).isoformat(),
+                "day": day,
+                "action": phase["action"],
+                "completed": False
+            })
+    return timeline
+
+
+def _ical_escape(text):
+    return text.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+
+def _ical_fold(line):
+    """Fold a content line at 75 octets, continuation lines starting with a space (RFC 5545 3.1)"""
+    encoded = line.encode("utf-8")
+    if len(encoded) <= 75:
+        return line
+    parts = []
+    while encoded:
+        limit = 75 if not parts else 74
+        cut = min(limit, len(encoded))
+        # Never split inside a multi-byte character
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode("utf-8"))
+        encoded = encoded[cut:]
+    return "\r\n ".join(parts)
+
+
+def phases_to_ical(crop_type, diseases):
+    """
+    Render treatment phases as an iCalendar file with one all-day event per phase.
+
+    Args:
+        crop_type: Crop the plan is for
+        diseases: list of (disease, phases) pairs, phases as returned by treatment_phases()
+
+    Returns:
+        str with CRLF line endings
+    """
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    lines = ["BEGIN:VCALENDAR", "VERSION:2.0", f"PRODID:{ICAL_PRODUCT_ID}", "CALSCALE:GREGORIAN"]
+    for disease, phases in diseases:
+        slug = "-".join(f"{crop_type} {disease}".split())
+        for phase in phases:
+            start = phase["start_date"].replace("-", "")
+            # DTEND of an all-day event is exclusive
+            end = (datetime.strptime(phase["end_date"], "%Y-%m-%d") + timedelta(days=1)).strftime("%Y%m%d")
+            summary = f"{disease.title()}: {phase['action']}"
+            description = f"{crop_type.title()} treatment, phase {phase['phase']} of {len(phases)}"
+            lines += [
+                "BEGIN:VEVENT",
+                f"UID:{start}-{slug}-{phase['phase']}@agrointel",
+                f"DTSTAMP:{stamp}",
+                f"DTSTART;VALUE=DATE:{start}",
+                f"DTEND;VALUE=DATE:{end}",
+                f"SUMMARY:{_ical_escape(summary)}",
+                f"DESCRIPTION:{_ical_escape(description)}",
+                "END:VEVENT",
+            ]
+    lines.append("END:VCALENDAR")
+    return "\r\n".join(_ical_fold(line) for line in lines) + "\r\n"
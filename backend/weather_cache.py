@@ -0,0 +1,97 @@
+from collections import namedtuple
+
+from caching import TTLCache, SingleFlight
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+# Approximate cell size (height x width at the equator) for each geohash precision
+GEOHASH_CELL_KM = {3: "156 x 156", 4: "39 x 20", 5: "4.9 x 4.9", 6: "1.2 x 0.6", 7: "0.15 x 0.15"}
+
+GridCell = namedtuple("GridCell", ["key", "lat", "lon"])
+
+
+def grid_cell(lat, lon, precision=5):
+    """Snap a coordinate to its geohash cell; returns the geohash and the cell's centre"""
+    lat, lon = float(lat), float(lon)
+    if not (-90.0 <= lat <= 90.0 and -180.0 <= lon <= 180.0):
+        raise ValueError("Latitude must be within [-90, 90] and longitude within [-180, 180]")
+
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True  # geohash interleaves bits, longitude first
+    while len(chars) < precision:
+        bounds, value = (lon_range, lon) if even else (lat_range, lat)
+        mid = (bounds[0] + bounds[1]) / 2
+        if value >= mid:
+            bits = bits * 2 + 1
+            bounds[0] = mid
+        else:
+            bits = bits * 2
+            bounds[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(GEOHASH_ALPHABET[bits])
+            bits = 0
+            bit_count = 0
+
+    return GridCell("".join(chars),
+                    round((lat_range[0] + lat_range[1]) / 2, 5),
+                    round((lon_range[0] + lon_range[1]) / 2, 5))
+
+
+class WeatherCache:
+    """Cache formatted weather per geohash grid cell.
+
+    Nearby users share one upstream fetch: coordinates are snapped to a grid
+    cell and everything inside the cell gets the cell's data. Current
+    conditions and the forecast are cached separately with their own TTLs,
+    and concurrent misses for the same cell share one fetch.
+    """
+
+    def __init__(self, precision=5, current_ttl=600, forecast_ttl=1800, max_entries=20000,
+                 max_bytes=32 * 1024 * 1024, enabled=True):
+        self.precision = precision
+        self.ttls = {"current": current_ttl, "forecast": forecast_ttl}
+        self.enabled = enabled
+        self.cache = TTLCache(max_entries=max_entries, max_bytes=max_bytes, ttl_seconds=current_ttl)
+        self.single_flight = SingleFlight()
+
+    def cell(self, lat, lon):
+        return grid_cell(lat, lon, self.precision)
+
+    def get(self, kind, cell):
+        """Return the cached payload of one kind ('current' or 'forecast') for a cell, or None"""
+        return self.cache.get(f"{kind}:{cell.key}") if self.enabled else None
+
+    def get_or_fetch(self, kind, cell, fetch):
+        """Return the cached payload for a cell, fetching it at most once across concurrent callers"""
+        if not self.enabled:
+            return fetch()
+
+        key = f"{kind}:{cell.key}"
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        def fetch_and_store():
+            cached = self.cache.peek(key)
+            if cached is not None:
+                return cached
+            value = fetch()
+            self.cache.put(key, value, ttl_seconds=self.ttls[kind])
+            return value
+
+        return self.single_flight.do(key, fetch_and_store)
+
+    def stats(self):
+        stats = self.cache.stats()
+        stats["enabled"] = self.enabled
+        stats["precision"] = self.precision
+        stats["cell_size_km"] = GEOHASH_CELL_KM.get(self.precision)
+        stats["ttl_seconds"] = self.ttls
+        stats["single_flight"] = self.single_flight.stats()
+        return stats
@@ -0,0 +1,205 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_BASE_URL = "https://api.openweathermap.org/data/2.5"
+
+
+class WeatherServiceError(Exception):
+    """OpenWeatherMap answered, but with an error (bad coordinates, invalid key, ...)"""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class WeatherUnavailableError(WeatherServiceError):
+    """OpenWeatherMap could not be reached in time, or the circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """Fail fast while an upstream service keeps failing.
+
+    After ``failure_threshold`` consecutive failures the breaker opens and
+    every call is refused for ``reset_timeout`` seconds. Then one trial call
+    is let through: success closes the breaker, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+
+        self.rejected = 0
+        self.times_opened = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def allow(self):
+        """Return True if a call may go ahead"""
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or (self._opened_at is None and self._failures >= self.failure_threshold):
+                self._opened_at = time.monotonic()
+                self.times_opened += 1
+            self._trial_in_flight = False
+
+    def stats(self):
+        with self._lock:
+            return {
+                "state": self._state(),
+                "consecutive_failures": self._failures,
+                "times_opened": self.times_opened,
+                "rejected": self.rejected,
+            }
+
+    def _state(self):
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+
+class OpenWeatherMapClient:
+    """OpenWeatherMap client with pooled keep-alive connections, timeouts, retries and a circuit breaker"""
+
+    def __init__(self, api_key, base_url=DEFAULT_BASE_URL, connect_timeout=3.05, read_timeout=5.0,
+                 deadline=8.0, max_retries=2, backoff=0.2, pool_size=32, breaker=None):
+        """
+        Args:
+            api_key: OpenWeatherMap API key
+            base_url: API root, overridable to point at a local stand-in server
+            connect_timeout: Seconds to wait for a connection
+            read_timeout: Seconds to wait for a response once connected
+            deadline: Total seconds one call may take, retries included
+            max_retries: Extra attempts after a timeout, connection error, 429 or 5xx
+            backoff: Base delay for exponential backoff with full jitter
+            pool_size: Keep-alive connections kept open to the API
+            breaker: CircuitBreaker shared by all calls (one is created if omitted)
+        """
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="weather")
+
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+
+    def current(self, lat, lon):
+        """Return the /weather payload for a location"""
+        data = self._get("weather", lat, lon)
+        # OpenWeatherMap reports errors in the body as well as the status code
+        if "cod" in data and data["cod"] != 200:
+            raise WeatherServiceError(data.get("message", "Error fetching weather data"), data.get("cod"))
+        return data
+
+    def forecast(self, lat, lon):
+        """Return the 5 day / 3 hour /forecast payload for a location"""
+        data = self._get("forecast", lat, lon)
+        if "cod" in data and data["cod"] != "200":
+            raise WeatherServiceError(data.get("message", "Error fetching forecast data"), data.get("cod"))
+        return data
+
+    def submit(self, fn, *args):
+        """Run fn(*args) on the client's I/O threads and return a Future"""
+        return self._executor.submit(fn, *args)
+
+    def stats(self):
+        with self._lock:
+            stats = {"calls": self.calls, "retries": self.retries, "failures": self.failures}
+        stats["circuit_breaker"] = self.breaker.stats()
+        return stats
+
+    def _get(self, endpoint, lat, lon):
+        """GET one endpoint, retrying transient failures until the deadline"""
+        if not self.breaker.allow():
+            raise WeatherUnavailableError("Weather service temporarily unavailable", 503)
+
+        url = f"{self.base_url}/{endpoint}"
+        params = {"lat": lat, "lon": lon, "appid": self.api_key, "units": "metric"}
+        started = time.monotonic()
+        with self._lock:
+            self.calls += 1
+
+        error = None
+        for attempt in range(self.max_retries + 1):
+            remaining = self.deadline - (time.monotonic() - started)
+            if remaining <= 0:
+                break
+            if attempt:
+                with self._lock:
+                    self.retries += 1
+
+            try:
+                response = self.session.get(url, params=params,
+                                            timeout=(self.connect_timeout, min(self.read_timeout, remaining)))
+            except (requests.Timeout, requests.ConnectionError) as e:
+                error = f"Weather service unreachable: {e.__class__.__name__}"
+            except requests.RequestException as e:
+                # Redirect loops, broken responses, ...: retrying will not help, but the
+                # failure still counts, so a half-open trial cannot leave the breaker stuck
+                error = f"Weather service request failed: {e.__class__.__name__}"
+                break
+            else:
+                if response.status_code != 429 and response.status_code < 500:
+                    # Any deliberate answer, errors included, means the service itself is up
+                    self.breaker.record_success()
+                    try:
+                        return response.json()
+                    except ValueError:
+                        raise WeatherServiceError("Invalid response from weather service", response.status_code)
+                error = f"Weather service returned HTTP {response.status_code}"
+
+            if attempt < self.max_retries:
+                # Full jitter keeps many workers from retrying in lockstep
+                delay = random.uniform(0, self.backoff * (2 ** attempt))
+                if time.monotonic() - started + delay >= self.deadline:
+                    break
+                time.sleep(delay)
+
+        self.breaker.record_failure()
+        with self._lock:
+            self.failures += 1
+        print(f"OpenWeatherMap {endpoint} failed after {time.monotonic() - started:.2f}s: {error}")
+        raise WeatherUnavailableError(error or "Weather service timed out", 503)
@@ -0,0 +1,150 @@
+import numpy as np
+
+# Base yield estimate (example values in tons/hectare)
+BASE_YIELDS = {'wheat': 4.5, 'corn': 11.0, 'rice': 6.0, 'soybean': 3.0}
+DEFAULT_BASE_YIELD = 5.0  # Default if crop unknown
+
+HEALTH_FACTORS = {'good': 1.0, 'average': 0.85, 'poor': 0.6}
+DEFAULT_HEALTH_FACTOR = 0.8
+
+# Ideal temp ~25C, ideal precip ~300mm for 90 days
+IDEAL_MAX_TEMP_C = 25.0
+TEMP_TOLERANCE_C = 15.0
+IDEAL_PRECIPITATION_MM = 300.0
+PRECIPITATION_SCALE_MM = 500.0
+WEATHER_ADJUSTMENT_RANGE = (0.5, 1.5)
+
+# Predictions this far above or below the crop's base yield change the storage advice
+HIGH_YIELD_RATIO = 1.1
+LOW_YIELD_RATIO = 0.8
+STORAGE_FLAGS = np.array(['normal', 'high', 'low'])
+
+
+def lookup(keys, table, default, transform=None):
+    """Map an array of strings through a dict, touching each distinct string only once"""
+    keys = np.asarray(keys, dtype=str)
+    unique, inverse = np.unique(keys, return_inverse=True)
+    values = np.array([table.get(transform(key) if transform else key, default) for key in unique.tolist()],
+                      dtype=np.float64)
+    return values[inverse].reshape(keys.shape)
+
+
+def weather_adjustment(avg_max_temp_c, total_precipitation_mm):
+    """Clamped weather factor; works on scalars and arrays alike"""
+    temp_factor = 1.0 - np.abs(np.asarray(avg_max_temp_c, dtype=np.float64) - IDEAL_MAX_TEMP_C) / TEMP_TOLERANCE_C
+    precip_factor = 1.0 + (np.asarray(total_precipitation_mm, dtype=np.float64) - IDEAL_PRECIPITATION_MM) / PRECIPITATION_SCALE_MM
+    return np.clip(temp_factor * precip_factor, *WEATHER_ADJUSTMENT_RANGE)
+
+
+def storage_flags(predicted_yield, base_yield):
+    """0 = normal, 1 = high yield (plan extra storage), 2 = low yield (less storage needed)"""
+    return np.select([predicted_yield > base_yield * HIGH_YIELD_RATIO, predicted_yield < base_yield * LOW_YIELD_RATIO],
+                     [1, 2], default=0).astype(np.int8)
+
+
+def predict_yields(crop_types, health_statuses, avg_max_temp_c, total_precipitation_mm, agro_adjustment=1.0):
+    """
+    Score many crop / health / weather combinations in one vectorized pass.
+
+    Args:
+        crop_types: Crop names (case-insensitive)
+        health_statuses: 'good', 'average' or 'poor'; anything else gets DEFAULT_HEALTH_FACTOR
+        avg_max_temp_c: Average daily maximum temperature over the season
+        total_precipitation_mm: Total precipitation over the season
+        agro_adjustment: Heat stress / drought factor from agro_metrics.yield_adjustment (1.0 = none)
+
+    Returns:
+        dict of equal-length arrays: base_yield, weather_adjustment, health_adjustment, agro_adjustment,
+        predicted_yield (tons/hectare, rounded to 2 places) and storage_flag (see storage_flags)
+    """
+    base_yield = lookup(crop_types, BASE_YIELDS, DEFAULT_BASE_YIELD, transform=str.lower)
+    health_adjustment = lookup(health_statuses, HEALTH_FACTORS, DEFAULT_HEALTH_FACTOR)
+    weather = weather_adjustment(avg_max_temp_c, total_precipitation_mm)
+    agro_adjustment = np.broadcast_to(np.asarray(agro_adjustment, dtype=np.float64), base_yield.shape)
+    predicted_yield = np.round(base_yield * weather * health_adjustment * agro_adjustment, 2)
+    return {
+        'base_yield': base_yield,
+        'weather_adjustment': weather,
+        'health_adjustment': health_adjustment,
+        'agro_adjustment': agro_adjustment,
+        'predicted_yield': predicted_yield,
+        'storage_flag': storage_flags(predicted_yield, base_yield),
+    }
+
+
+# Default input uncertainty for simulate_yield
+TEMP_SD_C = 1.5                    # Spread of the season's average max temperature
+PRECIPITATION_CV = 0.3             # Relative spread of seasonal precipitation (lognormal)
+HEALTH_DECLINE_PROBABILITY = 0.1   # Chance the crop's health drops one level before harvest
+HEALTH_FACTOR_SD = 0.05            # Relative noise around each health level's factor
+HEALTH_LEVELS = ['good', 'average', 'poor']
+
+
+def simulate_yield(crop_type, health_status, avg_max_temp_c, total_precipitation_mm, samples=100000, seed=None,
+                   threshold=None, bins=20, temp_sd_c=TEMP_SD_C, precipitation_cv=PRECIPITATION_CV,
+                   health_decline_probability=HEALTH_DECLINE_PROBABILITY, agro_adjustment=1.0):
+    """
+    Monte Carlo yield risk for one crop: perturb the weather summary and health, then apply the
+    same clamp-and-multiply model as predict_yields() to every sample at once.
+
+    Args:
+        crop_type, health_status, avg_max_temp_c, total_precipitation_mm: As for predict_yields, one value each
+        samples: Number of simulated seasons
+        seed: Seed for reproducible results (a random one is chosen and returned if omitted)
+        threshold: Yield (tons/hectare) whose shortfall probability is reported; defaults to the
+            low-yield storage threshold (LOW_YIELD_RATIO x base yield)
+        bins: Number of histogram bins
+        temp_sd_c: Standard deviation of the average max temperature
+        precipitation_cv: Coefficient of variation of precipitation
+        health_decline_probability: Chance that health drops one level (good -> average -> poor)
+        agro_adjustment: Heat stress / drought factor from agro_metrics.yield_adjustment (1.0 = none),
+            applied to every sample as predict_yields applies it to the point estimate
+
+    Returns:
+        dict with the point estimate, mean, standard deviation, P10/P50/P90, the shortfall
+        probability and a histogram
+    """
+    if seed is None:
+        seed = int(np.random.SeedSequence().entropy % (2 ** 32))
+    rng = np.random.default_rng(seed)
+
+    base_yield = BASE_YIELDS.get(crop_type.lower(), DEFAULT_BASE_YIELD)
+    if threshold is None:
+        threshold = base_yield * LOW_YIELD_RATIO
+
+    temperature = avg_max_temp_c + temp_sd_c * rng.standard_normal(samples)
+    # Lognormal noise with mean 1 keeps precipitation positive and its average unchanged
+    sigma = np.sqrt(np.log1p(precipitation_cv ** 2))
+    precipitation = total_precipitation_mm * rng.lognormal(-sigma ** 2 / 2, sigma, samples)
+
+    if health_status in HEALTH_LEVELS:
+        level = HEALTH_LEVELS.index(health_status) + (rng.random(samples) < health_decline_probability)
+        factors = np.array([HEALTH_FACTORS[name] for name in HEALTH_LEVELS])
+        health = factors[np.minimum(level, len(HEALTH_LEVELS) - 1)]
+    else:
+        health = np.full(samples, DEFAULT_HEALTH_FACTOR)
+    health = np.clip(health * (1.0 + HEALTH_FACTOR_SD * rng.standard_normal(samples)), 0.0, 1.0)
+
+    yields = base_yield * weather_adjustment(temperature, precipitation) * health * agro_adjustment
+    p10, p50, p90 = np.percentile(yields, [10, 50, 90])
+    counts, edges = np.histogram(yields, bins=bins)
+    point = base_yield * float(weather_adjustment(avg_max_temp_c, total_precipitation_mm)) * \
+        HEALTH_FACTORS.get(health_status, DEFAULT_HEALTH_FACTOR) * agro_adjustment
+
+    return {
+        'samples': samples,
+        'seed': seed,
+        'point_estimate': round(point, 2),
+        'agro_adjustment_factor': round(float(agro_adjustment), 3),
+        'mean': round(float(yields.mean()), 3),
+        'std': round(float(yields.std()), 3),
+        'p10': round(float(p10), 3),
+        'p50': round(float(p50), 3),
+        'p90': round(float(p90), 3),
+        'threshold': round(float(threshold), 3),
+        'probability_below_threshold': round(float(np.mean(yields < threshold)), 4),
+        'histogram': {
+            'bin_edges': np.round(edges, 3).tolist(),
+            'counts': counts.tolist()
+        }
+    }